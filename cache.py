@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire `ttl` seconds after being stored.
+    Not thread-safe; meant to be used from the bot's event loop only.
+
+    Read-through callers take generation(key) before an awaited read and pass it to
+    set(); if the key was invalidated meanwhile, the (possibly stale) value is dropped.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at, value)
+        # key -> counter value at its last invalidation, bounded like the data
+        self._generations: OrderedDict = OrderedDict()
+        self._counter = 0
+        self._cleared_at = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Returns the cached value, or MISSING if absent or expired."""
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def generation(self, key: Hashable) -> int:
+        return max(self._generations.get(key, 0), self._cleared_at)
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        if generation is not None and generation != self.generation(key):
+            return  # invalidated while the value was being read
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+        self._counter += 1
+        self._generations[key] = self._counter
+        self._generations.move_to_end(key)
+        while len(self._generations) > self.maxsize:
+            self._generations.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self._counter += 1
+        self._cleared_at = self._counter
+        self._generations.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,136 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring matcher (Aho-Corasick automaton).
+
+    Patterns are compiled once into a deterministic automaton: every state has a
+    full transition table over the patterns' alphabet, so scanning a message is a
+    single pass with one dict lookup per character, regardless of pattern count.
+    Characters outside the alphabet always lead back to the root.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: Tuple[str, ...] = tuple(dict.fromkeys(p for p in patterns if p))
+        self._delta: List[Dict[str, int]] = [{}]
+        self._out: List[Tuple[str, ...]] = [()]
+        self._build()
+
+    def _build(self):
+        goto = self._delta
+        out = [[]]
+
+        # 1. Trie
+        for pattern in self.patterns:
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(pattern)
+
+        # 2. Failure links in BFS order, folded into the transition tables
+        alphabet = {ch for pattern in self.patterns for ch in pattern}
+        fail = [0] * len(goto)
+        queue = deque()
+        for ch in alphabet:
+            nxt = goto[0].get(ch)
+            if nxt is None:
+                goto[0][ch] = 0
+            else:
+                queue.append(nxt)
+
+        while queue:
+            state = queue.popleft()
+            out[state].extend(out[fail[state]])
+            for ch in alphabet:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    goto[state][ch] = goto[fail[state]][ch]
+                else:
+                    fail[nxt] = goto[fail[state]][ch]
+                    queue.append(nxt)
+
+        # Root transitions to itself are implied by the lookup default
+        goto[0] = {ch: nxt for ch, nxt in goto[0].items() if nxt}
+        for state in range(1, len(goto)):
+            goto[state] = {ch: nxt for ch, nxt in goto[state].items() if nxt}
+        self._out = [tuple(o) for o in out]
+
+    def search(self, text: str) -> Optional[str]:
+        """Returns the first pattern found in `text` (by end position), or None."""
+        delta = self._delta
+        out = self._out
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                return out[state][0]
+        return None
+
+    def matches(self, text: str) -> Set[str]:
+        """Returns the distinct patterns occurring in `text` (one full pass)."""
+        delta = self._delta
+        out = self._out
+        state = 0
+        found = set()
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        """Returns every (end_index, pattern) occurrence in `text`."""
+        delta = self._delta
+        out = self._out
+        state = 0
+        found = []
+        for i, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            for pattern in out[state]:
+                found.append((i, pattern))
+        return found
+
+    def __len__(self):
+        return len(self.patterns)
+
+
+class SubstringMatcher:
+    """
+    Plain `pattern in text` checks. For a handful of patterns the C substring
+    search beats walking the automaton in Python (see tests/bench_scam_matcher.py).
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: Tuple[str, ...] = tuple(dict.fromkeys(p for p in patterns if p))
+
+    def search(self, text: str) -> Optional[str]:
+        for pattern in self.patterns:
+            if pattern in text:
+                return pattern
+        return None
+
+    def matches(self, text: str) -> Set[str]:
+        return {pattern for pattern in self.patterns if pattern in text}
+
+    def __len__(self):
+        return len(self.patterns)
+
+
+# Below this many patterns SubstringMatcher is faster than the automaton
+AUTOMATON_MIN_PATTERNS = 64
+
+
+def compile_patterns(patterns: Iterable[str]):
+    """Builds the fastest matcher for the pattern set. Both expose `search(text)` and `matches(text)`."""
+    patterns = tuple(dict.fromkeys(p for p in patterns if p))
+    if len(patterns) >= AUTOMATON_MIN_PATTERNS:
+        return AhoCorasick(patterns)
+    return SubstringMatcher(patterns)
@@ -0,0 +1,40 @@
+import time
+from typing import Iterable, List, Optional
+
+from cache import TTLCache, MISSING
+
+COOLDOWN_CACHE_SIZE = 5000  # (trigger, channel/user) entries
+
+
+class AutoReplyCooldowns:
+    """
+    Per-channel and per-user cooldowns for auto-reply triggers.
+    Bounded: old entries fall out of an LRU, and every entry expires after the
+    longest configured cooldown.
+    """
+
+    def __init__(self, triggers: Iterable[dict], maxsize: int = COOLDOWN_CACHE_SIZE):
+        longest = max([max(t.get('cooldown', 0), t.get('user_cooldown', 0)) for t in triggers] or [0])
+        self._until = TTLCache(maxsize, max(longest, 1))  # key -> monotonic time the cooldown ends
+
+    def _active(self, key: tuple, now: float) -> bool:
+        until = self._until.get(key)
+        return until is not MISSING and until > now
+
+    def take(self, trigger: dict, channel_id: int, user_id: int, now: Optional[float] = None) -> bool:
+        """Returns True (and starts the cooldowns) if the trigger may reply now."""
+        now = time.monotonic() if now is None else now
+        channel_key = (trigger['pattern'], 'channel', channel_id)
+        user_key = (trigger['pattern'], 'user', user_id)
+        if self._active(channel_key, now) or self._active(user_key, now):
+            return False
+
+        if trigger.get('cooldown'):
+            self._until.set(channel_key, now + trigger['cooldown'])
+        if trigger.get('user_cooldown'):
+            self._until.set(user_key, now + trigger['user_cooldown'])
+        return True
+
+
+def triggers_for_channel(triggers: List[dict], channel_id: int) -> List[dict]:
+    return [t for t in triggers if not t.get('channels') or channel_id in t['channels']]
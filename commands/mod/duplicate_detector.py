@@ -0,0 +1,143 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from commands.mod.scam_detection import normalize
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4  # 4 x 16 bits: fingerprints within 3 bits always share a band
+MAX_HAMMING_DISTANCE = 3
+
+_MASK = (1 << SIMHASH_BITS) - 1
+_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+_TOKEN_RE = re.compile(r"\w+")
+_URL_RE = re.compile(r"https?://[^\s]+")
+
+
+def simhash(tokens: List[str]) -> int:
+    """64-bit SimHash: near-identical token lists give fingerprints a few bits apart."""
+    if not tokens:
+        return 0
+    bits = [format(hash(t) & _MASK, "064b") for t in tokens]
+    half = len(bits) / 2
+    fingerprint = 0
+    for column in zip(*bits):
+        fingerprint = (fingerprint << 1) | (column.count("1") > half)
+    return fingerprint
+
+
+class _Cluster:
+    __slots__ = ("fingerprint", "bands", "users", "last_seen", "flagged")
+
+    def __init__(self, fingerprint: int, bands: tuple):
+        self.fingerprint = fingerprint
+        self.bands = bands
+        self.users: Dict[int, tuple] = {}  # user_id -> (seen_at, item)
+        self.last_seen = 0.0
+        self.flagged = False
+
+
+class DuplicateDetector:
+    """
+    Flags near-identical messages posted by `min_users` different accounts within
+    `window` seconds - the usual shape of a scam wave from fresh accounts.
+
+    Messages are reduced to a SimHash of their normalized words outside links, plus
+    the exact set of links: replays or clips shared from one site never match unless
+    the links are identical. Clusters are found through exact lookups on fingerprint
+    bands, so each message costs a few dict operations. At most `max_clusters` clusters are kept, each holding at most
+    `min_users` entries; expired clusters are dropped from the front of an LRU.
+    """
+
+    def __init__(self, min_users: int = 4, window: float = 60, max_clusters: int = 5000,
+                 min_tokens: int = 4, require_link: bool = True):
+        self.min_users = min_users
+        self.window = window
+        self.max_clusters = max_clusters
+        self.min_tokens = min_tokens
+        self.require_link = require_link
+        self._clusters: OrderedDict = OrderedDict()  # id -> _Cluster, least recently seen first
+        self._bands: Dict[tuple, int] = {}  # (band index, band value) -> cluster id
+        self._next_id = 0
+
+    def observe(self, user_id: int, text: str, item: Any = None, now: Optional[float] = None) -> List[Any]:
+        """
+        Records a message. Returns the items that should be handled as spam: every
+        stored item of a cluster when it first reaches `min_users` users, then each
+        new item of that cluster. Empty list otherwise.
+        """
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+
+        normalized = normalize(text)
+        if self.require_link and "://" not in normalized:
+            return []
+        # Words outside links must be long enough to be a "message", not just a shared link
+        words = _TOKEN_RE.findall(_URL_RE.sub(" ", normalized))
+        if len(words) < self.min_tokens:
+            return []
+
+        # Full links, paths included: only the same link posted by many accounts counts
+        links = hash(tuple(sorted(set(_URL_RE.findall(normalized)))))
+        fingerprint = simhash(words)
+        bands = tuple((i, (fingerprint >> (i * _BAND_BITS)) & _BAND_MASK, links) for i in range(SIMHASH_BANDS))
+        cluster_id = self._find(fingerprint, bands)
+        if cluster_id is None:
+            cluster_id = self._add(fingerprint, bands)
+        cluster = self._clusters[cluster_id]
+        self._clusters.move_to_end(cluster_id)
+        cluster.last_seen = now
+
+        if cluster.flagged:
+            return [item]
+
+        for uid in [uid for uid, (seen_at, _) in cluster.users.items() if now - seen_at > self.window]:
+            del cluster.users[uid]
+        cluster.users[user_id] = (now, item)
+
+        if len(cluster.users) >= self.min_users:
+            cluster.flagged = True
+            flagged = [stored for _, stored in cluster.users.values()]
+            cluster.users.clear()
+            return flagged
+        return []
+
+    def _find(self, fingerprint: int, bands: tuple) -> Optional[int]:
+        for band in bands:
+            cluster_id = self._bands.get(band)
+            if cluster_id is None:
+                continue
+            cluster = self._clusters.get(cluster_id)
+            if cluster and (cluster.fingerprint ^ fingerprint).bit_count() <= MAX_HAMMING_DISTANCE:
+                return cluster_id
+        return None
+
+    def _add(self, fingerprint: int, bands: tuple) -> int:
+        if len(self._clusters) >= self.max_clusters:
+            self._drop(next(iter(self._clusters)))
+
+        cluster_id = self._next_id
+        self._next_id += 1
+        self._clusters[cluster_id] = _Cluster(fingerprint, bands)
+        for band in bands:
+            # Newest cluster wins a shared band; older ones stay reachable through their other bands
+            self._bands[band] = cluster_id
+        return cluster_id
+
+    def _drop(self, cluster_id: int):
+        cluster = self._clusters.pop(cluster_id)
+        for band in cluster.bands:
+            if self._bands.get(band) == cluster_id:
+                del self._bands[band]
+
+    def _expire(self, now: float):
+        while self._clusters:
+            cluster_id, cluster = next(iter(self._clusters.items()))
+            if now - cluster.last_seen <= self.window:
+                break
+            self._drop(cluster_id)
+
+    def __len__(self):
+        return len(self._clusters)
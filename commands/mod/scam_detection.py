@@ -0,0 +1,193 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from commands.mod.aho_corasick import compile_patterns
+
+# Legit domains scammers imitate. Lookalikes within a small edit distance are flagged.
+SCAM_TARGET_DOMAINS = [
+    "steamcommunity.com",
+    "steampowered.com",
+    "discord.com",
+    "discord.gift",
+    "discordapp.com",
+]
+
+ZERO_WIDTH_CHARS = "\u00ad\u180e\u200b\u200c\u200d\u200e\u200f\u2060\u2061\u2062\u2063\u2064\ufeff"
+
+# Lookalike letters from other scripts (mostly Cyrillic and Greek) -> Latin
+HOMOGLYPHS = {
+    "а": "a", "в": "b", "с": "c", "ԁ": "d", "е": "e", "ё": "e", "һ": "h", "і": "i", "ї": "i",
+    "ј": "j", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p", "ԛ": "q", "ѕ": "s", "т": "t",
+    "у": "y", "х": "x", "ԝ": "w", "ɡ": "g", "ı": "i", "ɩ": "i", "ɑ": "a", "ο": "o", "α": "a",
+    "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v", "ρ": "p", "τ": "t", "υ": "u",
+    "χ": "x", "ω": "w",
+}
+
+LEET = {
+    "4": "a", "@": "a", "8": "b", "3": "e", "6": "g", "1": "l", "|": "l", "!": "i",
+    "0": "o", "5": "s", "$": "s", "7": "t", "2": "z",
+}
+
+_TRANSLATION = str.maketrans({**{c: None for c in ZERO_WIDTH_CHARS}, **HOMOGLYPHS, **LEET})
+
+# Letter pairs that render like one letter; only folded inside hostnames,
+# since in ordinary words they are far too common ("learn", "clan")
+HOST_CONFUSABLES = (("rn", "m"), ("cl", "d"), ("vv", "w"))
+
+# Hostname-like tokens: "label(.label)*" after normalization
+_HOST_RE = re.compile(r"[a-z0-9-]+(?:\.[a-z0-9-]+)*")
+
+# Dotless tokens are only compared with long target labels ("steamcommunity"),
+# otherwise ordinary words ("discords") would look like typos of short ones.
+MIN_DOTLESS_LABEL = 12
+
+# Edit distance per host is the slow part; most tokens repeat across messages
+HOST_CACHE_SIZE = 8192
+
+
+@lru_cache(maxsize=4096)
+def normalize(text: str) -> str:
+    """
+    Folds text to a canonical form for scam matching: Unicode NFKC, case folding,
+    diacritics, zero-width characters, homoglyphs and leetspeak.
+    Cached, since raids repeat the same content many times.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = "".join(c for c in unicodedata.normalize("NFD", text) if not unicodedata.combining(c))
+    return text.translate(_TRANSLATION)
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance between `a` and `b`, or `limit + 1` once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _fold_host(host: str) -> str:
+    for pair, letter in HOST_CONFUSABLES:
+        host = host.replace(pair, letter)
+    return host
+
+
+def _max_distance(label: str) -> int:
+    """Allowed typos for a target, by the length of its name (TLDs don't count)."""
+    return 3 if len(label) >= 12 else 1
+
+
+class ScamDetector:
+    """
+    Checks messages against blocked phrases and lookalike domains.
+
+    Phrases and messages go through the same `normalize()` pipeline, so one entry
+    covers its leetspeak/homoglyph variants. Hostnames in the message are compared
+    with SCAM_TARGET_DOMAINS by edit distance.
+
+    Auto-reply triggers (dicts like const.AUTO_REPLIES) are compiled into the same
+    matcher, so `scan()` finds scams and triggers in one pass over the message.
+    """
+
+    def __init__(self, phrases: Iterable[str], target_domains: Iterable[str] = SCAM_TARGET_DOMAINS,
+                 triggers: Iterable[dict] = ()):
+        self.phrases = tuple(phrases)
+        self.triggers = tuple(triggers)
+        self._phrase_set = {normalize(p) for p in self.phrases if p}
+        self._triggers_by_pattern: Dict[str, List[dict]] = {}
+        for trigger in self.triggers:
+            self._triggers_by_pattern.setdefault(normalize(trigger['pattern']), []).append(trigger)
+        self.phrase_matcher = compile_patterns([*self._phrase_set, *self._triggers_by_pattern])
+
+        self.target_domains = tuple(normalize(d) for d in target_domains)
+        self.target_labels = tuple(d.split(".")[0] for d in self.target_domains)
+        self._host_cache: Dict[str, Optional[str]] = {}
+
+        # Shortest text that could match anything: a phrase, a trigger, a lookalike host or a dotless label.
+        # Folding only shortens hosts, so a lookalike is at least len(domain) - allowed typos.
+        self.min_length = min(
+            [len(p) for p in self.phrase_matcher.patterns]
+            + [len(d) - _max_distance(label) for d, label in zip(self.target_domains, self.target_labels)]
+            + [MIN_DOTLESS_LABEL]
+        )
+
+    def might_match(self, text: str) -> bool:
+        """
+        Cheap pre-check before normalize(). ASCII text keeps its length through
+        normalization, so ASCII shorter than min_length can never match.
+        """
+        return len(text) >= self.min_length or not text.isascii()
+
+    def check(self, text: str) -> Optional[str]:
+        """Returns a short reason if `text` looks like a scam, otherwise None."""
+        return self.scan(text)[0]
+
+    def scan(self, text: str) -> Tuple[Optional[str], List[dict]]:
+        """Returns (scam reason or None, triggers found in `text`)."""
+        normalized = normalize(text)
+
+        if self._triggers_by_pattern:
+            found = self.phrase_matcher.matches(normalized)
+            phrase = next((p for p in found if p in self._phrase_set), None)
+            triggers = [t for p in found for t in self._triggers_by_pattern.get(p, ())]
+        else:
+            phrase = self.phrase_matcher.search(normalized)
+            triggers = []
+        if phrase:
+            return phrase, triggers
+
+        for host in _HOST_RE.findall(normalized):
+            if host not in self._host_cache:
+                if len(self._host_cache) >= HOST_CACHE_SIZE:
+                    self._host_cache.clear()
+                self._host_cache[host] = self._lookalike_domain(host)
+            domain = self._host_cache[host]
+            if domain:
+                return f"~{domain}", triggers
+        return None, triggers
+
+    def _lookalike_domain(self, host: str) -> Optional[str]:
+        """Returns the target domain `host` imitates, or None if it is unrelated (or the real one)."""
+        if "." not in host:
+            if len(host) < MIN_DOTLESS_LABEL or host in self.target_labels:
+                return None
+            return self._lookalike_label(_fold_host(host))
+
+        # The real sites and their subdomains (go.steampowered.com, m.steamcommunity.com).
+        # Checked before folding: "stearncommunity.com" folds into the real name.
+        if any(host == domain or host.endswith("." + domain) for domain in self.target_domains):
+            return None
+
+        labels = _fold_host(host).split(".")
+        # Only the registrable part (name + TLD) is compared with the targets, so subdomains
+        # don't add to the distance and long hosts don't fail the length check
+        registrable = ".".join(labels[-2:])
+        for domain, target_label in zip(self.target_domains, self.target_labels):
+            limit = _max_distance(target_label)
+            if edit_distance(registrable, domain, limit) <= limit:
+                return domain
+
+        # A target name elsewhere in the host: steamcommunity.ru, steamcommunity.com.example.ru
+        for label in labels[:-1]:
+            if len(label) >= MIN_DOTLESS_LABEL:
+                domain = self._lookalike_label(label)
+                if domain:
+                    return domain
+        return None
+
+    def _lookalike_label(self, label: str) -> Optional[str]:
+        """Compares one (folded) label with the long target names."""
+        for domain, target_label in zip(self.target_domains, self.target_labels):
+            limit = _max_distance(target_label)
+            if len(target_label) >= MIN_DOTLESS_LABEL and edit_distance(label, target_label, limit) <= limit:
+                return domain
+        return None
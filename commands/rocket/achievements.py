@@ -1,143 +1,202 @@
+import asyncio
 import datetime
-from typing import List, Dict, Any, Tuple
-from commands.rocket.achievements_config import ACHIEVEMENTS
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from commands.rocket.achievements_config import ACHIEVEMENTS, ACHIEVEMENT_BITS
 from database import (
-    get_user_leaderboard_stats,
-    get_user_matches_history,
-    add_user_achievement,
-    get_user_achievements
+    ACHIEVEMENT_STATE_COLUMNS,
+    get_achievement_state,
+    save_achievement_state,
+    is_achievement_state_backfilled,
+    get_achievement_backfill_data,
+    replace_achievement_states,
+    get_user_leaderboard_stats
 )
 
-async def check_achievements(user_id: int, current_match: Dict[str, Any]) -> List[Dict[str, str]]:
-    """
-    Checks and awards achievements for a user after a match.
-    current_match expects: {'result': 'WIN'/'LOSS', 'timestamp': int, 'game_mode': int}
-    Returns a list of unlocked achievement objects (name, description).
-    """
-    unlocked = []
+# Game modes with their own win counter (wins_1, wins_2, wins_3)
+MODES = (1, 2, 3)
+ALL_MODES_MASK = sum(1 << mode for mode in MODES)
 
-    # Fetch data
-    stats = await get_user_leaderboard_stats(user_id) # Dict of stats
-    history = await get_user_matches_history(user_id, limit=50) # List of rows
-    existing_achievements = await get_user_achievements(user_id) # List of (id, date)
-    existing_ids = set(r[0] for r in existing_achievements)
-
-    if not stats:
-        # Should at least have current match stats if updated correctly
-        return []
-
-    # Calculate Totals from Leaderboard (Reliable for lifetime counts)
-    total_wins = sum(stats[k] for k in stats if k.endswith('_W'))
-    total_losses = sum(stats[k] for k in stats if k.endswith('_L'))
-    total_games = total_wins + total_losses
-
-    # Parse current match info
-    is_win = current_match['result'] == 'WIN'
-    mode = current_match['game_mode'] # 1, 2, 3
-    current_ts = current_match['timestamp']
-
-    # --- Checks ---
-
-    # 1. First Match Checks
-    if total_games == 1:
-        if "rookie" not in existing_ids:
-            if await _grant(user_id, "rookie", unlocked): existing_ids.add("rookie")
-
-        if is_win and "first_blood" not in existing_ids:
-             if await _grant(user_id, "first_blood", unlocked): existing_ids.add("first_blood")
-
-        if not is_win and "humble" not in existing_ids:
-             if await _grant(user_id, "humble", unlocked): existing_ids.add("humble")
-
-    # 2. Counts
-    if total_games >= 5 and "warmup" not in existing_ids:
-        await _grant(user_id, "warmup", unlocked)
-    if total_games >= 50 and "regular" not in existing_ids:
-        await _grant(user_id, "regular", unlocked)
-    if total_games >= 100 and "veteran" not in existing_ids:
-        await _grant(user_id, "veteran", unlocked)
-    if total_games >= 500 and "legend" not in existing_ids:
-        await _grant(user_id, "legend", unlocked)
-
-    # 3. Streaks (Need history)
-    # History from DB: 0:id, 1:ts, 2:mode, 3:stake, 4:winner, 5:b_s, 6:o_s, 7:det, 8:result, 9:team
-    streak = 0
-    if history:
-        for match in history:
-            # match[8] is result ('WIN'/'LOSS')
-            if match[8] == 'WIN':
-                streak += 1
-            else:
-                break
+# One read-modify-write of a user's counters at a time (a player can be in two matches)
+_user_locks: Dict[int, asyncio.Lock] = {}
 
-    if is_win:
-        if streak >= 3 and "heating_up" not in existing_ids: await _grant(user_id, "heating_up", unlocked)
-        if streak >= 5 and "on_fire" not in existing_ids: await _grant(user_id, "on_fire", unlocked)
-        if streak >= 10 and "unstoppable" not in existing_ids: await _grant(user_id, "unstoppable", unlocked)
-
-    # Breakthrough: Win after >= 3 losses
-    # We need to look at history BEFORE the current win (which is history[0])
-    if is_win and len(history) >= 2:
-        loss_streak = 0
-        for match in history[1:]: # Skip current match (index 0)
-            if match[8] == 'LOSS':
-                loss_streak += 1
-            else:
-                break
-        if loss_streak >= 3 and "breakthrough" not in existing_ids:
-            await _grant(user_id, "breakthrough", unlocked)
-
-    # 4. Mode Specific (from Leaderboard)
-    mode_wins = stats.get(f"{mode}v{mode}_W", 0)
-
-    if mode == 1:
-        if mode_wins >= 10 and "lone_wolf" not in existing_ids: await _grant(user_id, "lone_wolf", unlocked)
-        if mode_wins >= 50 and "king_1v1" not in existing_ids: await _grant(user_id, "king_1v1", unlocked)
-    elif mode == 2:
-        if mode_wins >= 10 and "perfect_duo" not in existing_ids: await _grant(user_id, "perfect_duo", unlocked)
-    elif mode == 3:
-        if mode_wins >= 10 and "team_player" not in existing_ids: await _grant(user_id, "team_player", unlocked)
-
-    # 5. Time Based
-    now = datetime.datetime.fromtimestamp(current_ts)
 
-    # Night Owl (2:00 - 5:00)
-    if 2 <= now.hour < 5 and "night_owl" not in existing_ids:
-        await _grant(user_id, "night_owl", unlocked)
+def new_state() -> Dict[str, int]:
+    return {col: 0 for col in ACHIEVEMENT_STATE_COLUMNS}
 
-    # Weekend Warrior
-    if now.weekday() in [5, 6]: # Sat, Sun
-        weekend_count = 0
-        for match in history:
-            m_time = datetime.datetime.fromtimestamp(match[1])
-            if m_time.weekday() in [5, 6]:
-                weekend_count += 1
 
-        if weekend_count >= 5 and "weekend_warrior" not in existing_ids:
-             await _grant(user_id, "weekend_warrior", unlocked)
+def update_state(state: Dict[str, int], is_win: bool, mode: int, timestamp: int) -> Dict[str, Any]:
+    """
+    Applies one finished match to the user's counters (in place).
+    Returns the facts about the match the rules need.
+    """
+    now = datetime.datetime.fromtimestamp(timestamp)
+    match = {
+        'is_win': is_win,
+        'mode': mode,
+        'hour': now.hour,
+        'weekend': now.weekday() in [5, 6],  # Sat, Sun
+        'losses_before': state['loss_streak']
+    }
+
+    state['games'] += 1
+    if is_win:
+        if mode in MODES:
+            state[f'wins_{mode}'] += 1
+        state['win_streak'] += 1
+        state['loss_streak'] = 0
+    else:
+        state['win_streak'] = 0
+        state['loss_streak'] += 1
+
+    # Daily counters restart on the first match of a new (local) day
+    day = now.date().toordinal()
+    if state['day'] != day:
+        state['day'] = day
+        state['daily_count'] = 0
+        state['daily_modes_won'] = 0
+    state['daily_count'] += 1
+    if is_win:
+        state['daily_modes_won'] |= 1 << mode
+
+    if match['weekend']:
+        state['weekend_count'] += 1
+    return match
+
+
+# Evaluated in this order against the state after the match; each is granted once.
+RULES: List[Tuple[str, Callable[[Dict[str, int], Dict[str, Any]], bool]]] = [
+    # First Match
+    ("rookie", lambda s, m: s['games'] == 1),
+    ("first_blood", lambda s, m: s['games'] == 1 and m['is_win']),
+    ("humble", lambda s, m: s['games'] == 1 and not m['is_win']),
+
+    # Counts
+    ("warmup", lambda s, m: s['games'] >= 5),
+    ("regular", lambda s, m: s['games'] >= 50),
+    ("veteran", lambda s, m: s['games'] >= 100),
+    ("legend", lambda s, m: s['games'] >= 500),
+
+    # Streaks
+    ("heating_up", lambda s, m: s['win_streak'] >= 3),
+    ("on_fire", lambda s, m: s['win_streak'] >= 5),
+    ("unstoppable", lambda s, m: s['win_streak'] >= 10),
+    # Win after >= 3 losses
+    ("breakthrough", lambda s, m: m['is_win'] and m['losses_before'] >= 3),
+
+    # Mode Specific
+    ("lone_wolf", lambda s, m: m['mode'] == 1 and s['wins_1'] >= 10),
+    ("king_1v1", lambda s, m: m['mode'] == 1 and s['wins_1'] >= 50),
+    ("perfect_duo", lambda s, m: m['mode'] == 2 and s['wins_2'] >= 10),
+    ("team_player", lambda s, m: m['mode'] == 3 and s['wins_3'] >= 10),
+
+    # Time Based
+    # Night Owl (2:00 - 5:00)
+    ("night_owl", lambda s, m: 2 <= m['hour'] < 5),
+    ("weekend_warrior", lambda s, m: m['weekend'] and s['weekend_count'] >= 5),
+    # No-Life: 10 games in one day
+    ("no_life", lambda s, m: s['daily_count'] >= 10),
+    # Versatile: Win in 1v1, 2v2, 3v3 in one day
+    ("versatile", lambda s, m: m['is_win'] and s['daily_modes_won'] & ALL_MODES_MASK == ALL_MODES_MASK),
+]
 
-    # No-Life (10 games in one day) & Versatile
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
-    today_matches = [m for m in history if m[1] >= today_start]
 
-    if len(today_matches) >= 10 and "no_life" not in existing_ids:
-        await _grant(user_id, "no_life", unlocked)
+def apply_match(state: Dict[str, int], is_win: bool, mode: int, timestamp: int) -> List[str]:
+    """Updates the counters with one match and returns the ids of newly unlocked achievements."""
+    match = update_state(state, is_win, mode, timestamp)
+    unlocked = []
+    for achievement_id, rule in RULES:
+        bit = 1 << ACHIEVEMENT_BITS[achievement_id]
+        if not state['unlocked'] & bit and rule(state, match):
+            state['unlocked'] |= bit
+            unlocked.append(achievement_id)
+    return unlocked
 
-    # Versatile: Win in 1v1, 2v2, 3v3 in one day
-    if is_win:
-        modes_won = set()
-        for m in today_matches:
-            if m[8] == 'WIN':
-                modes_won.add(m[2]) # game_mode
 
-        if {1, 2, 3}.issubset(modes_won) and "versatile" not in existing_ids:
-             await _grant(user_id, "versatile", unlocked)
+def _total_games(stats: Dict[str, int]) -> int:
+    return sum(stats.get(f"{n}v{n}_{s}") or 0 for n in MODES for s in ("W", "L"))
 
-    return unlocked
 
-async def _grant(user_id: int, achievement_id: str, unlocked_list: list) -> bool:
-    """Helper to add achievement and append to list if successful."""
-    if await add_user_achievement(user_id, achievement_id):
-        unlocked_list.append(ACHIEVEMENTS[achievement_id])
-        return True
-    return False
+async def check_achievements(user_id: int, current_match: Dict[str, Any]) -> List[Dict[str, str]]:
+    """
+    Checks and awards achievements for a user after a match.
+    current_match expects: {'result': 'WIN'/'LOSS', 'timestamp': int, 'game_mode': int}
+    Returns a list of unlocked achievement objects (name, description).
+    """
+    async with _user_locks.setdefault(user_id, asyncio.Lock()):
+        stored = await get_achievement_state(user_id)
+        if stored is None:
+            return []
+        state = {**new_state(), **stored}
+
+        # Leaderboard is written with the match itself, so counters more than this match
+        # behind it missed a match (a failed save below); they are rebuilt from history
+        stats = await get_user_leaderboard_stats(user_id)
+        if stats and _total_games(stats) > state['games'] + 1:
+            state = await rebuild_achievement_state(user_id, current_match['timestamp'])
+            if state is None:
+                return []
+
+        new_ids = apply_match(state, current_match['result'] == 'WIN', current_match['game_mode'],
+                              current_match['timestamp'])
+        # Counters and grants are written together, so a failed write grants nothing twice
+        if not await save_achievement_state(user_id, state, new_ids):
+            return []
+
+    return [ACHIEVEMENTS[achievement_id] for achievement_id in new_ids]
+
+
+def _build_states(totals, results, granted) -> Dict[str, Dict[str, int]]:
+    """Counters per user from match history, Leaderboard totals and granted achievements."""
+    states: Dict[str, Dict[str, int]] = {}
+    # Streaks and daily/weekend counters need timestamps, so they come from match history
+    for user_id, timestamp, mode, result in results:
+        update_state(states.setdefault(str(user_id), new_state()), result == 'WIN', mode, timestamp)
+
+    # Lifetime counts come from Leaderboard, which also has games from before match history existed
+    for user_id, w1, l1, w2, l2, w3, l3 in totals:
+        state = states.setdefault(str(user_id), new_state())
+        state['games'] = sum(v or 0 for v in (w1, l1, w2, l2, w3, l3))
+        state['wins_1'], state['wins_2'], state['wins_3'] = w1 or 0, w2 or 0, w3 or 0
+
+    # Nothing is granted retroactively; only what users already have is marked as unlocked
+    for user_id, achievement_id in granted:
+        if achievement_id in ACHIEVEMENT_BITS:
+            states.setdefault(str(user_id), new_state())['unlocked'] |= 1 << ACHIEVEMENT_BITS[achievement_id]
+    return states
+
+
+async def rebuild_achievement_state(user_id: int, before: int) -> Optional[Dict[str, int]]:
+    """
+    Recomputes one user's counters from match history as they were before the match
+    played at `before`. That match and any later one are left out, since each is
+    applied by its own check_achievements call. None on error.
+    """
+    data = await get_achievement_backfill_data(user_id)
+    if data is None:
+        return None
+    totals, results, granted = data
+
+    print(f"Rebuilding AchievementState for {user_id} from match history...")
+    state = _build_states(totals, [r for r in results if r[1] < before], granted).get(str(user_id), new_state())
+    # Leaderboard totals already include the left-out matches
+    for _, timestamp, mode, result in results:
+        if timestamp >= before:
+            state['games'] -= 1
+            if result == 'WIN' and mode in MODES:
+                state[f'wins_{mode}'] -= 1
+    return state
+
+
+async def backfill_achievement_state():
+    """One-time job: builds AchievementState from the full match history and granted achievements."""
+    done = await is_achievement_state_backfilled()
+    if done is None or done:
+        return
+
+    data = await get_achievement_backfill_data()
+    if data is None:
+        return
+
+    print("Backfilling AchievementState from match history...")
+    if await replace_achievement_states(_build_states(*data)):
+        print("AchievementState backfill complete.")
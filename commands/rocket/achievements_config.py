@@ -88,3 +88,13 @@ ACHIEVEMENTS = {
         "description": "Zagraj przynajmniej 5 meczy w sobotę lub niedzielę."
     }
 }
+
+# Bit of each achievement in AchievementState.unlocked.
+# Append only: a stored bit must keep meaning the same achievement.
+ACHIEVEMENT_BITS = {achievement_id: i for i, achievement_id in enumerate([
+    "first_blood", "rookie", "humble",
+    "warmup", "regular", "veteran", "legend",
+    "heating_up", "on_fire", "unstoppable", "breakthrough",
+    "lone_wolf", "king_1v1", "perfect_duo", "team_player",
+    "versatile", "no_life", "night_owl", "weekend_warrior"
+])}
@@ -1,6 +1,6 @@
 import discord
 from const import ROLE_ID_1V1_LEADER, ROLE_ID_2V2_LEADER, ROLE_ID_3V3_LEADER
-from database import get_all_winners, get_role_holders, update_role_holders
+from database import get_all_winners, get_winners_tie_group, get_role_holders, update_role_holders
 
 async def update_leader_role(guild: discord.Guild, team_size: int):
     """
@@ -23,11 +23,11 @@ async def update_leader_role(guild: discord.Guild, team_size: int):
         print(f"Role with ID {role_id} not found in guild {guild.name}")
         return
 
-    # Fetch all winners sorted by Wins DESC, Score DESC
-    all_winners = await get_all_winners(team_size)
+    # Fetch top winners sorted by Wins DESC, Score DESC (served from the in-memory ranking)
+    top_winners = await get_all_winners(team_size, limit=25)
 
     # If no winners exist, clear everything
-    if not all_winners:
+    if not top_winners:
         # Try to clear from DB holders
         old_holders = await get_role_holders(team_size)
         for uid in old_holders:
@@ -44,8 +44,8 @@ async def update_leader_role(guild: discord.Guild, team_size: int):
         return
 
     # 1. Determine New Leaders
-    max_wins = all_winners[0][1]
-    candidates = [row for row in all_winners if row[1] == max_wins]
+    max_wins = top_winners[0][1]
+    candidates = await get_winners_tie_group(team_size, max_wins)
     candidate_ids = [int(c[0]) for c in candidates]
 
     # Get incumbents from DB (persistent state)
@@ -86,8 +86,7 @@ async def update_leader_role(guild: discord.Guild, team_size: int):
     # B. Safety Sweep (Top 25)
     # Check top players to see if they hold the role erroneously (e.g. from before DB tracking)
     # This fixes the bug where "previous person dropped to top 2 but kept role" if DB was empty/desync.
-    top_candidates = all_winners[:25]
-    for row in top_candidates:
+    for row in top_winners:
         uid = int(row[0])
         if uid not in final_leader_ids:
             # We must check if they have the role.
@@ -1,25 +1,21 @@
 from enum import Enum
+import asyncio
+import time
+import uuid
 import discord
-import os
-import aiohttp
-from typing import Optional, List
+from typing import Optional, List, Dict, Any, Callable, Awaitable
 
 from commands.rocket.match_result_view import ResultView
-from commands.unbelievable_API.add_money import add_money_unbelievable
+from commands.rocket.match_state import MatchState
+from commands.rocket.message_editor import DebouncedEditor
+from commands.rocket.ranks import RANKS, ranks_compatible
+from commands.unbelievable_API.client import UNBELIEVABOAT, BALANCE_FRESH_SECONDS
+from commands.unbelievable_API.outbox import PAYOUTS
 from const import MATCH_CHANNEL_ID, ADMIN_USER_ID
+from database import save_open_match, delete_open_match, get_open_matches
 
-UNBELIEVABOAT_API_KEY = os.getenv("UNBELIEVABOAT_API_KEY")
-GUILD_ID = os.getenv("GUILD")
 MATCH_TIMEOUT_SECONDS = 1800  # 30 min
 
-RANK_ROLES = ["Brąz", "Srebro", "Złoto", "Platyna", "Diament", "Champion", "GC1", "GC2", "GC3", "SSL"]
-GC_RANKS = {
-    "GC1": ["GC1", "GC2"],
-    "GC2": ["GC1", "GC2", "GC3"],
-    "GC3": ["GC2", "GC3", "SSL"],
-    "SSL": ["GC3", "SSL"]
-}
-
 
 class MatchType(Enum):
     BO3 = "Best of 3"
@@ -28,59 +24,40 @@ class MatchType(Enum):
 
 def get_rank(member: discord.Member) -> Optional[str]:
     """Extract player's rank from their Discord roles."""
-    for role in member.roles:
-        if role.name in RANK_ROLES:
-            return role.name
-    return None
-
-
-async def get_user_balance(user_id: int) -> int:
-    """Fetch user balance from UnbelievaBoat API."""
-    url = f"https://unbelievaboat.com/api/v1/guilds/{GUILD_ID}/users/{user_id}"
-    headers = {"accept": "application/json", "Authorization": f"{UNBELIEVABOAT_API_KEY}"}
-
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as response:
-            if response.status == 200:
-                data = await response.json()
-                return data.get("bank", 0)
+    return RANKS.rank_of(member)
+
+
+async def get_user_balance(user_id: int, max_age: Optional[float] = BALANCE_FRESH_SECONDS) -> int:
+    """
+    Fetch user balance from UnbelievaBoat API.
+    Reuses a cached snapshot up to `max_age` seconds old (None: any snapshot, for display only).
+    """
+    data = await UNBELIEVABOAT.get_user(user_id, max_age=max_age)
+    if data:
+        return data.get("bank", 0)
     return 0
 
 
-async def take_bet(player: discord.Member, stake: int) -> bool:
+async def take_bet(player: discord.Member, stake: int, idempotency_key: str) -> bool:
     """Deduct stake from each player's balance. Returns True if successful."""
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "Authorization": f"{UNBELIEVABOAT_API_KEY}"
-    }
     # Note: UnbelievaBoat API PATCH adds/subtracts.
     # If we want to ensure deduction, we assume validation happened before.
     # However, if the user withdraws money mid-validation, this might fail or result in negative balance
     # depending on guild settings.
-    payload = {"bank": -stake}
-
-    url = f"https://unbelievaboat.com/api/v1/guilds/{GUILD_ID}/users/{player.id}"
-
-    async with aiohttp.ClientSession() as session:
-        async with session.patch(url, json=payload, headers=headers) as response:
-            try:
-                data = await response.json()
-            except:
-                return False
-
-            # If successful, data should contain user object.
-            # We can check if 'bank' is present.
-            if response.status == 200 and "bank" in data:
-                return True
-
-            print(f"Failed to take bet from {player.display_name}. Status: {response.status}, Data: {data}")
-            return False
+    # Recorded in the payout outbox first so every stake taken is traceable.
+    data = await PAYOUTS.execute_now(idempotency_key, player.id, 0, -stake, "bet")
+    if data is None:
+        print(f"Failed to take bet from {player.display_name}.")
+        return False
+    return True
 
 
 class MatchView(discord.ui.View):
-    def __init__(self, stake: int, match_type: MatchType, creator: discord.Member, team_size: int = 1):
-        super().__init__(timeout=MATCH_TIMEOUT_SECONDS)
+    def __init__(self, stake: int, match_type: MatchType, creator: discord.Member, team_size: int = 1,
+                 match_key: Optional[str] = None):
+        # Persistent view (registered again with bot.add_view after a restart), so the
+        # inactivity timeout is our own task armed from a stored deadline.
+        super().__init__(timeout=None)
         self.stake = stake
         self.match_type = match_type
         self.creator = creator
@@ -89,19 +66,106 @@ class MatchView(discord.ui.View):
         self.orange_team: List[discord.Member] = []
         self.message = None
         self.required_role = get_rank(creator)
-        self.match_started = False
+        # Seats are checked and taken under the lock; a joiner holds a reservation while
+        # their balance is checked and the stake is taken, so the lock is never held over HTTP.
+        self.state = MatchState.OPEN
+        self._lock = asyncio.Lock()
+        self._reservations: Dict[int, str] = {}  # user_id -> team color, seat held while paying
+        # Unique id of this lobby, used in payout idempotency keys
+        self.match_key = match_key or uuid.uuid4().hex
+        self._join_counts = {}  # user_id -> times joined (a player may leave and rejoin)
+        self.deadline = time.time() + MATCH_TIMEOUT_SECONDS
+        self._timeout_task: Optional[asyncio.Task] = None
+        # Joins/leaves in quick succession are coalesced into one embed edit
+        self._editor = DebouncedEditor(lambda: {'embed': self._create_match_embed()})
         # Note: take_bet is called in send_initial_message for the creator
 
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            'stake': self.stake,
+            'match_type': self.match_type.name,
+            'creator_id': self.creator.id,
+            'team_size': self.team_size,
+            'blue': [p.id for p in self.blue_team],
+            'orange': [p.id for p in self.orange_team],
+            'join_counts': {str(k): v for k, v in self._join_counts.items()},
+            'required_role': self.required_role
+        }
+
+    @classmethod
+    def from_state(cls, match_key: str, state: Dict[str, Any], users: Dict[int, discord.abc.User],
+                   message: discord.PartialMessage, deadline: float) -> 'MatchView':
+        """Rebuilds a lobby stored by save(). `users` maps every stored user id to a Member/User."""
+        view = cls(state['stake'], MatchType[state['match_type']], users[state['creator_id']], state['team_size'],
+                   match_key=match_key)
+        view.blue_team = [users[uid] for uid in state['blue']]
+        view.orange_team = [users[uid] for uid in state['orange']]
+        view._join_counts = {int(k): v for k, v in state['join_counts'].items()}
+        view.required_role = state['required_role']
+        view.message = message
+        view._editor.message = message
+        view.deadline = deadline
+        view._arm_timeout()
+        return view
+
+    async def save(self):
+        if self.message:
+            await save_open_match(self.match_key, 'lobby', self.message.channel.id, self.message.id,
+                                  self.to_state(), int(self.deadline))
+
+    def _arm_timeout(self):
+        if self._timeout_task:
+            self._timeout_task.cancel()
+        self._timeout_task = asyncio.create_task(self._expire_at(self.deadline))
+
+    def _touch(self):
+        """Any join/leave restarts the inactivity timeout, like discord.ui.View's own timeout."""
+        self.deadline = time.time() + MATCH_TIMEOUT_SECONDS
+        self._arm_timeout()
+
+    async def _expire_at(self, deadline: float):
+        await asyncio.sleep(max(0.0, deadline - time.time()))
+        try:
+            await self.on_timeout()
+        finally:
+            self.stop()
+
+    def _money_key(self, user: discord.Member, kind: str) -> str:
+        """Idempotency key for a bet/refund tied to the user's current stay in the lobby."""
+        return PAYOUTS.key(self.match_key, user.id, f"{kind}{self._join_counts.get(user.id, 0)}")
+
+    async def _take_stake(self, user: discord.Member) -> bool:
+        self._join_counts[user.id] = self._join_counts.get(user.id, 0) + 1
+        return await take_bet(user, self.stake, self._money_key(user, "bet"))
+
+    async def _refund_stake(self, user: discord.Member, key: Optional[str] = None) -> bool:
+        # Pass `key` when it was taken under the lock, before a rejoin could change the join count
+        key = key or self._money_key(user, "refund")
+        return await PAYOUTS.submit(key, user.id, 0, self.stake, "refund")
+
+    def _seats_taken(self, team_color: str) -> int:
+        team = self.blue_team if team_color == "blue" else self.orange_team
+        return len(team) + sum(1 for color in self._reservations.values() if color == team_color)
+
+    def _is_full(self) -> bool:
+        return len(self.blue_team) == self.team_size and len(self.orange_team) == self.team_size
+
     async def on_timeout(self):
         """Handle view timeout by refunding everyone and removing components."""
-        if self.match_started:
-            return
+        async with self._lock:
+            if self.state is not MatchState.OPEN:
+                return  # full lobbies are starting; players paying right now refund themselves
+            self.state = MatchState.CANCELLED
+            all_players = self.blue_team + self.orange_team
 
         # Refund everyone currently in the teams
-        all_players = self.blue_team + self.orange_team
         for player in all_players:
-            await add_money_unbelievable(player.id, 0, self.stake)
+            await self._refund_stake(player)
 
+        await delete_open_match(self.match_key)
+
+        # A late embed edit must not bring the lobby back over the cancel notice
+        self._editor.cancel()
         self.clear_items()
         if self.message:
             await self.message.edit(content="⏰ Mecz anulowany (timeout). Środki zwrócone.", view=None, embed=None)
@@ -109,7 +173,7 @@ class MatchView(discord.ui.View):
     async def send_initial_message(self, interaction: discord.Interaction):
         """Send the initial match invitation message."""
         # Take the bet from the creator here
-        if not await take_bet(self.creator, self.stake):
+        if not await self._take_stake(self.creator):
             await interaction.followup.send("Błąd pobierania stawki. Sprawdź swoje konto!", ephemeral=True)
             self.stop()
             return
@@ -117,6 +181,10 @@ class MatchView(discord.ui.View):
         embed = self._create_match_embed()
         channel = interaction.guild.get_channel(MATCH_CHANNEL_ID)
         self.message = await channel.send(embed=embed, view=self)
+        self._editor.message = self.message
+        self._editor.mark_sent(embed=embed)
+        self._arm_timeout()
+        await self.save()
 
     def _create_match_embed(self) -> discord.Embed:
         """Create the match information embed."""
@@ -146,43 +214,74 @@ class MatchView(discord.ui.View):
         """Generic handler for joining a team."""
         user = interaction.user
 
-        # Check if user is already in any team
-        if user in self.blue_team or user in self.orange_team:
-            await interaction.response.send_message("Już jesteś w meczu!", ephemeral=True)
+        # Reserve a seat: checks and the reservation happen atomically
+        async with self._lock:
+            if self.state is not MatchState.OPEN:
+                error = "Ten mecz jest już zamknięty."
+            # Already in a team, or paying for a seat right now
+            elif user in self.blue_team or user in self.orange_team or user.id in self._reservations:
+                error = "Już jesteś w meczu!"
+            # Team full, counting seats being paid for
+            elif self._seats_taken(team_color) >= self.team_size:
+                error = "Ta drużyna jest już pełna!"
+            elif not self._validate_user_rank(user):
+                error = "Nie możesz dołączyć, ponieważ Twoja ranga nie spełnia wymagań."
+            else:
+                error = None
+                self._reservations[user.id] = team_color
+
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
             return
 
-        target_team = self.blue_team if team_color == "blue" else self.orange_team
-
-        # Check if team is full
-        if len(target_team) >= self.team_size:
-            await interaction.response.send_message("Ta drużyna jest już pełna!", ephemeral=True)
+        # Slow part outside the lock: balance check and deducting the stake. Deferred first,
+        # since the API calls can take longer than Discord's 3 s to answer the interaction
+        try:
+            await interaction.response.defer(ephemeral=True)
+            if not await self._validate_user_balance(user):
+                error = "Masz za mało kasy!"
+            elif not await self._take_stake(user):
+                error = "Błąd pobierania stawki. Sprawdź swoje konto!"
+            else:
+                error = None
+        except BaseException:
+            self._reservations.pop(user.id, None)
+            raise
+
+        if error:
+            self._reservations.pop(user.id, None)
+            await interaction.followup.send(error, ephemeral=True)
             return
 
-        # Validate rank requirements
-        if not self._validate_user_rank(user):
-            await interaction.response.send_message(
-                "Nie możesz dołączyć, ponieważ Twoja ranga nie spełnia wymagań.", ephemeral=True)
+        # Turn the reservation into a seat
+        async with self._lock:
+            self._reservations.pop(user.id, None)
+            cancelled = self.state is not MatchState.OPEN
+            if cancelled:
+                refund_key = self._money_key(user, "refund")
+            else:
+                target_team = self.blue_team if team_color == "blue" else self.orange_team
+                target_team.append(user)
+                self._touch()
+                # Only the join that fills the last seat starts the match
+                full = self._is_full()
+                if full:
+                    self.state = MatchState.FULL
+
+        if cancelled:
+            # Lobby timed out while we were charging
+            await self._refund_stake(user, refund_key)
+            await interaction.followup.send("Mecz został anulowany. Środki zwrócone.", ephemeral=True)
             return
 
-        # Check if user has enough balance
-        if not await self._validate_user_balance(user):
-            await interaction.response.send_message("Masz za mało kasy!", ephemeral=True)
-            return
-
-        # Deduct stake
-        if not await take_bet(user, self.stake):
-            await interaction.response.send_message("Błąd pobierania stawki. Sprawdź swoje konto!", ephemeral=True)
-            return
-
-        # Add to team
-        target_team.append(user)
-
-        await interaction.response.send_message(f"Dołączyłeś do {team_color.capitalize()} Team!", ephemeral=True)
-        await self._update_message()
-
-        # Check if match is ready
-        if len(self.blue_team) == self.team_size and len(self.orange_team) == self.team_size:
-            await self.start_match()
+        try:
+            await self.save()
+            await interaction.followup.send(f"Dołączyłeś do {team_color.capitalize()} Team!", ephemeral=True)
+            await self._update_message()
+        finally:
+            # The match is FULL and everyone has paid: it has to start even if the reply failed
+            if full:
+                await self.start_match()
 
     @discord.ui.button(label="Dołącz do Blue", style=discord.ButtonStyle.primary, custom_id="join_blue")
     async def join_blue(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -196,36 +295,43 @@ class MatchView(discord.ui.View):
     async def leave_match(self, interaction: discord.Interaction, button: discord.ui.Button):
         user = interaction.user
 
-        if user not in self.blue_team and user not in self.orange_team:
-            await interaction.response.send_message("Nie jesteś w tym meczu.", ephemeral=True)
+        async with self._lock:
+            if self.state is not MatchState.OPEN:
+                error = "Mecz już się rozpoczyna, nie możesz go opuścić."
+            elif user not in self.blue_team and user not in self.orange_team:
+                error = "Nie jesteś w tym meczu."
+            else:
+                error = None
+                # Remove user
+                if user in self.blue_team:
+                    self.blue_team.remove(user)
+                else:
+                    self.orange_team.remove(user)
+                refund_key = self._money_key(user, "refund")
+                self._touch()
+
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
             return
 
-        # Remove user and refund
-        if user in self.blue_team:
-            self.blue_team.remove(user)
-        elif user in self.orange_team:
-            self.orange_team.remove(user)
-
-        await add_money_unbelievable(user.id, 0, self.stake)
+        # Refund queued first: the outbox key makes it idempotent, while a lobby saved
+        # without the player and no refund row would lose the stake
+        await self._refund_stake(user, refund_key)
+        await self.save()
         await interaction.response.send_message("Opuściłeś mecz. Środki zwrócone.", ephemeral=True)
 
         # If everyone left, maybe cancel? But for now just update embed.
         await self._update_message()
 
     async def _update_message(self):
-        """Update the match embed with current teams."""
+        """Schedule a (debounced) update of the match embed with current teams."""
         if self.message:
-            embed = self._create_match_embed()
-            await self.message.edit(embed=embed)
+            self._editor.message = self.message
+            self._editor.request()
 
     def _validate_user_rank(self, user: discord.Member) -> bool:
         """Check if user's rank meets the requirements."""
-        user_rank = get_rank(user)
-
-        if self.required_role in GC_RANKS:
-            return user_rank in GC_RANKS[self.required_role]
-        else:
-            return user_rank == self.required_role
+        return ranks_compatible(self.required_role, get_rank(user))
 
     async def _validate_user_balance(self, user: discord.Member) -> bool:
         """Check if user has sufficient balance for the match stake."""
@@ -234,34 +340,27 @@ class MatchView(discord.ui.View):
 
     async def start_match(self):
         """Start the match after enough players have joined."""
-        self.match_started = True
+        async with self._lock:
+            # FULL from the last join; OPEN when matchmaking fills the teams directly
+            if self.state not in (MatchState.OPEN, MatchState.FULL):
+                return
+            self.state = MatchState.STARTED
         self.stop() # Stop the view from listening to interactions and timeouts
+        if self._timeout_task:
+            self._timeout_task.cancel()
 
         # Create discussion thread
         thread = await self._create_match_thread()
 
-        # Remove buttons/view from invitation message
+        # Remove buttons/view from invitation message, showing the final teams
         self.clear_items()
-        await self.message.edit(view=None) # Or keep view with disabled buttons? Removing is cleaner.
+        self._editor.cancel()
+        await self.message.edit(embed=self._create_match_embed(), view=None)
 
-        # Add result submission view
-        # Passing teams to ResultView
-
-        # Create a nice Embed for the match result confirmation
-        embed = discord.Embed(
-            title="🏁 Wynik Meczu",
-            description=(
-                f"**Mecz {self.team_size}v{self.team_size}**\n"
-                f"Tryb: **{self.match_type.value}**\n\n"
-                "Kapitanowie drużyn proszeni są o kliknięcie poniższego przycisku, "
-                "aby zgłosić dokładny wynik spotkania."
-            ),
-            color=discord.Color.gold()
-        )
-        embed.set_footer(text="Upewnijcie się, że wpisujecie ten sam wynik!")
-
-        view = ResultView(self.blue_team, self.orange_team, self.stake, self.team_size, self.match_type.value)
-        await thread.send(embed=embed, view=view)
+        view = ResultView(self.blue_team, self.orange_team, self.stake, self.team_size, self.match_type.value,
+                          self.match_key)
+        # Replaces the lobby row, so a restart restores the result view instead
+        await view.send(thread)
 
     async def _create_match_thread(self):
         """Create a thread for match discussion."""
@@ -287,3 +386,54 @@ class MatchView(discord.ui.View):
         # Ping players? Mentions in message should ping them.
 
         return thread
+
+
+async def _resolve_users(bot, guild: discord.Guild, user_ids) -> Dict[int, discord.abc.User]:
+    """Members from cache or API; players who left the server fall back to plain users."""
+    users = {}
+    for user_id in set(user_ids):
+        member = guild.get_member(user_id)
+        if member is None:
+            try:
+                member = await guild.fetch_member(user_id)
+            except discord.NotFound:
+                member = await bot.fetch_user(user_id)
+        users[user_id] = member
+    return users
+
+
+async def restore_match_views(bot, notify: Optional[Callable[[str], Awaitable[None]]] = None) -> int:
+    """
+    Re-registers lobbies and unresolved result views stored in OpenMatches, so their
+    buttons keep working after a restart. Lobby timeouts are re-armed from the stored
+    deadline (an already expired lobby is refunded right away).
+    Returns the number of restored views.
+    """
+    restored = 0
+    for row in await get_open_matches():
+        state = row['state']
+        try:
+            channel = bot.get_channel(row['channel_id']) or await bot.fetch_channel(row['channel_id'])
+            message = channel.get_partial_message(row['message_id'])
+            user_ids = state['blue'] + state['orange'] + [state.get('creator_id', state['blue'][0])]
+            users = await _resolve_users(bot, channel.guild, user_ids)
+
+            if row['kind'] == 'lobby':
+                view = MatchView.from_state(row['match_key'], state, users, message, row['deadline'])
+                bot.add_view(view, message_id=row['message_id'])
+            elif state.get('resolved'):
+                # Stopped while settling: payouts are in the outbox, the rest needs a human look
+                await delete_open_match(row['match_key'])
+                if notify:
+                    await notify(f"⚠️ Mecz `{row['match_key']}` został przerwany w trakcie rozliczania (restart). "
+                                 f"Sprawdźcie wynik w {channel.mention}. <@{ADMIN_USER_ID}>")
+                continue
+            else:
+                view = ResultView.from_state(row['match_key'], state, users, message)
+                bot.add_view(view, message_id=row['message_id'])
+                if view.admin_message_id:
+                    bot.add_view(view.admin_view(), message_id=view.admin_message_id)
+            restored += 1
+        except (discord.HTTPException, KeyError) as e:
+            print(f"Could not restore match {row['match_key']}: {e!r}")
+    return restored
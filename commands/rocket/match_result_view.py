@@ -2,16 +2,22 @@ import asyncio
 import random
 import time
 import discord
-from commands.unbelievable_API.add_money import add_money_unbelievable
+from typing import Dict, Any, Optional, Tuple
+from commands.unbelievable_API.outbox import PAYOUTS
 from const import ADMIN_USER_ID, MATCH_LOGS_CHANNEL_ID
 from database import (
-    update_match_history,
     get_bonus_count,
     increment_bonus_count,
-    save_match_record
+    settle_match,
+    save_open_match,
+    delete_open_match
 )
 from commands.rocket.leader_roles import update_leader_role
 from commands.rocket.achievements import check_achievements
+from commands.rocket.match_state import MatchState
+from commands.rocket.message_editor import DebouncedEditor
+
+SETTLEMENT_CONCURRENCY = 3  # players settled in parallel
 
 
 class MatchScoreModal(discord.ui.Modal):
@@ -91,14 +97,16 @@ class MatchScoreModal(discord.ui.Modal):
         # Format report string: "2:1, 1:3"
         report_str = ", ".join([f"{b}:{o}" for b, o in scores])
 
-        if self.team_name == "Blue":
-            self.view_ref.blue_report = report_str
-            await interaction.response.send_message(f"✅ Zgłoszono wynik (Blue): **{report_str}**")
-        else:
-            self.view_ref.orange_report = report_str
-            await interaction.response.send_message(f"✅ Zgłoszono wynik (Orange): **{report_str}**")
+        outcome = await self.view_ref.submit_report(self.team_name, report_str)
+        if outcome is None:
+            await interaction.response.send_message("Mecz został już rozstrzygnięty!", ephemeral=True)
+            return
 
-        await self.view_ref.check_results(interaction)
+        await interaction.response.send_message(f"✅ Zgłoszono wynik ({self.team_name}): **{report_str}**")
+        await self.view_ref.save()
+        self.view_ref._update_message()
+
+        await self.view_ref.check_results(interaction, *outcome)
 
 
 class AdminResolutionModal(discord.ui.Modal):
@@ -153,7 +161,7 @@ class AdminResolutionModal(discord.ui.Modal):
                 await interaction.response.send_message("🚨 Wynik wskazuje na remis. Admin musi podać wynik rozstrzygający!", ephemeral=True)
                 return
 
-            if self.view_ref.resolved:
+            if not await self.view_ref.begin_settlement():
                 await interaction.response.send_message("Mecz został już rozstrzygnięty!", ephemeral=True)
                 return
 
@@ -175,7 +183,7 @@ class AdminResolutionView(discord.ui.View):
         super().__init__(timeout=None)
         self.result_view = result_view
 
-    @discord.ui.button(label="👮 Wymuś wynik (Admin)", style=discord.ButtonStyle.danger)
+    @discord.ui.button(label="👮 Wymuś wynik (Admin)", style=discord.ButtonStyle.danger, custom_id="match_force_result")
     async def force_result(self, interaction: discord.Interaction, button: discord.ui.Button):
         if interaction.user.id != ADMIN_USER_ID:
             await interaction.response.send_message("Brak uprawnień.", ephemeral=True)
@@ -185,18 +193,139 @@ class AdminResolutionView(discord.ui.View):
 
 
 class ResultView(discord.ui.View):
-    def __init__(self, blue_team, orange_team, stake, team_size, match_type):
+    def __init__(self, blue_team, orange_team, stake, team_size, match_type, match_key):
         super().__init__(timeout=None)
         self.blue_team = blue_team
         self.orange_team = orange_team
         self.stake = stake
         self.team_size = team_size
         self.match_type = match_type # Enum MatchType or string
+        self.match_key = match_key # Lobby id, used in payout idempotency keys
 
         # Reports format "2:1, 1:3"
         self.blue_report = None
         self.orange_report = None
-        self.resolved = False
+        # Reports and settlement are decided under the lock; messages and payouts run outside it
+        self.state = MatchState.STARTED
+        self._lock = asyncio.Lock()
+        self.message = None  # result message in the match thread
+        self.admin_message_id = None  # latest conflict message with the admin button
+        # Report status shown on the result message, edited through the same debounced editor as lobbies
+        self._editor = DebouncedEditor(lambda: {'embed': self.create_embed()})
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            'blue': [p.id for p in self.blue_team],
+            'orange': [p.id for p in self.orange_team],
+            'stake': self.stake,
+            'team_size': self.team_size,
+            'match_type': str(self.match_type),
+            'blue_report': self.blue_report,
+            'orange_report': self.orange_report,
+            'resolved': self.resolved,
+            'admin_message_id': self.admin_message_id
+        }
+
+    @classmethod
+    def from_state(cls, match_key: str, state: Dict[str, Any], users: Dict[int, Any], message) -> 'ResultView':
+        view = cls([users[uid] for uid in state['blue']], [users[uid] for uid in state['orange']],
+                   state['stake'], state['team_size'], state['match_type'], match_key)
+        view.blue_report = state['blue_report']
+        view.orange_report = state['orange_report']
+        if state['resolved']:
+            view.state = MatchState.SETTLED
+        elif view.blue_report or view.orange_report:
+            view.state = MatchState.REPORTED
+        view.admin_message_id = state['admin_message_id']
+        view.message = message
+        view._editor.message = message
+        return view
+
+    @property
+    def resolved(self) -> bool:
+        return self.state is MatchState.SETTLED
+
+    async def submit_report(self, team_name: str, report: str) -> Optional[Tuple[str, Optional[str], Optional[str]]]:
+        """
+        Records a captain's report and decides, atomically, what it leads to.
+        Returns (outcome, blue_report, orange_report) with outcome 'waiting', 'agreed' (this
+        caller settles the match), 'draw' or 'conflict' (reports were cleared), or None if the
+        match is already settled.
+        """
+        async with self._lock:
+            if self.state is MatchState.SETTLED:
+                return None
+            if team_name == "Blue":
+                self.blue_report = report
+            else:
+                self.orange_report = report
+            blue_report, orange_report = self.blue_report, self.orange_report
+
+            if not blue_report or not orange_report:
+                self.state = MatchState.REPORTED
+                return 'waiting', blue_report, orange_report
+
+            if blue_report == orange_report:
+                blue_wins, orange_wins = self._count_wins(self._parse_scores(blue_report))
+                if blue_wins != orange_wins:
+                    self.state = MatchState.SETTLED
+                    return 'agreed', blue_report, orange_report
+                outcome = 'draw'
+            else:
+                outcome = 'conflict'
+
+            # Both captains report again
+            self.blue_report = None
+            self.orange_report = None
+            self.state = MatchState.STARTED
+            return outcome, blue_report, orange_report
+
+    async def begin_settlement(self) -> bool:
+        """Claims the settlement (admin forced result). False if the match was already settled."""
+        async with self._lock:
+            if self.state is MatchState.SETTLED:
+                return False
+            self.state = MatchState.SETTLED
+            return True
+
+    def create_embed(self) -> discord.Embed:
+        embed = discord.Embed(
+            title="🏁 Wynik Meczu",
+            description=(
+                f"**Mecz {self.team_size}v{self.team_size}**\n"
+                f"Tryb: **{self.match_type}**\n\n"
+                "Kapitanowie drużyn proszeni są o kliknięcie poniższego przycisku, "
+                "aby zgłosić dokładny wynik spotkania."
+            ),
+            color=discord.Color.green() if self.resolved else discord.Color.gold()
+        )
+        # Only whether a team reported, so the other captain can't copy the score
+        embed.add_field(name="🔵 Blue", value="✅ Zgłoszono" if self.blue_report else "⏳ Oczekiwanie", inline=True)
+        embed.add_field(name="🟠 Orange", value="✅ Zgłoszono" if self.orange_report else "⏳ Oczekiwanie", inline=True)
+        if self.resolved:
+            embed.set_footer(text="Mecz rozliczony.")
+        else:
+            embed.set_footer(text="Upewnijcie się, że wpisujecie ten sam wynik!")
+        return embed
+
+    async def send(self, thread: discord.Thread):
+        """Posts the result message in the match thread and stores the view."""
+        embed = self.create_embed()
+        self.message = await thread.send(embed=embed, view=self)
+        self._editor.message = self.message
+        self._editor.mark_sent(embed=embed)
+        await self.save()
+
+    def _update_message(self):
+        self._editor.request()
+
+    async def save(self):
+        """Persists the view (see restore_match_views) so reports survive a restart."""
+        if self.message:
+            await save_open_match(self.match_key, 'result', self.message.channel.id, self.message.id, self.to_state())
+
+    def admin_view(self) -> 'AdminResolutionView':
+        return AdminResolutionView(self)
 
     def _get_captain(self, team_list):
         return team_list[0] if team_list else None
@@ -210,49 +339,44 @@ class ResultView(discord.ui.View):
             games.append((b, o))
         return games
 
-    async def check_results(self, interaction: discord.Interaction):
-        """Check if both captains submitted compatible results."""
-        if not self.blue_report or not self.orange_report:
+    @staticmethod
+    def _count_wins(games) -> Tuple[int, int]:
+        blue_wins = sum(1 for b, o in games if b > o)
+        orange_wins = sum(1 for b, o in games if o > b)
+        return blue_wins, orange_wins
+
+    async def check_results(self, interaction: discord.Interaction, outcome: str, blue_report: Optional[str],
+                            orange_report: Optional[str]):
+        """Acts on the outcome of submit_report (messages, settlement)."""
+        if outcome == 'waiting':
             return
 
-        if self.blue_report == self.orange_report:
-            score_str = self.blue_report
+        if outcome == 'agreed':
+            score_str = blue_report
             games = self._parse_scores(score_str)
-
-            blue_wins = 0
-            orange_wins = 0
-
-            for b, o in games:
-                if b > o: blue_wins += 1
-                elif o > b: orange_wins += 1
-
-            if blue_wins > orange_wins:
-                await self._handle_win(interaction, "blue", score_str, games, blue_wins, orange_wins)
-            elif orange_wins > blue_wins:
-                await self._handle_win(interaction, "orange", score_str, games, blue_wins, orange_wins)
-            else:
-                await interaction.channel.send("🚨 Remis w serii? Coś jest nie tak. Zgłoście wynik ponownie.")
-                self.blue_report = None
-                self.orange_report = None
+            blue_wins, orange_wins = self._count_wins(games)
+            winner = "blue" if blue_wins > orange_wins else "orange"
+            await self._handle_win(interaction, winner, score_str, games, blue_wins, orange_wins)
+        elif outcome == 'draw':
+            await interaction.channel.send("🚨 Remis w serii? Coś jest nie tak. Zgłoście wynik ponownie.")
         else:
             # Conflict
-            admin_view = AdminResolutionView(self)
-            await interaction.channel.send(
+            admin_view = self.admin_view()
+            admin_message = await interaction.channel.send(
                 f"🚨 **KONFLIKT!**\n"
-                f"🔵 Blue zgłasza: {self.blue_report}\n"
-                f"🟠 Orange zgłasza: {self.orange_report}\n"
+                f"🔵 Blue zgłasza: {blue_report}\n"
+                f"🟠 Orange zgłasza: {orange_report}\n"
                 f"Ustalcie poprawny wynik i wyślijcie ponownie lub zawołajcie admina <@{ADMIN_USER_ID}>.",
                 view=admin_view
             )
-            self.blue_report = None
-            self.orange_report = None
+            self.admin_message_id = admin_message.id
+            await self.save()
 
     async def _handle_win(self, interaction: discord.Interaction, winning_team_name, score_str, games, b_wins, o_wins):
-        """Process payout, db updates, and achievements."""
-        if self.resolved:
-            await interaction.followup.send("Mecz został już rozstrzygnięty!", ephemeral=True)
-            return
-        self.resolved = True
+        """Process payout, db updates, and achievements. The caller has moved the match to SETTLED."""
+        # Marked before settling: a restart mid-settlement is reported instead of settled twice
+        await self.save()
+        self._update_message()
 
         # Determine Teams
         if winning_team_name == "blue":
@@ -269,43 +393,28 @@ class ResultView(discord.ui.View):
         log_data = []
         payout_list = []
 
-        # Bonus Logic
-        bonus_awarded = False
-        bonus_amount = 0
-
-        # Check global limit
-        current_bonus_count = await get_bonus_count()
-        winners_count = len(winning_team)
-
-        # Only try if limit not reached
-        if current_bonus_count + winners_count <= 50:
-            # 15% chance for bonus
-            if random.random() < 0.15:
-                bonus_awarded = True
-                bonus_amount = int(self.stake * 0.5)
-                # Increment DB counter
-                await increment_bonus_count(winners_count)
-
-        total_payout = (self.stake * 2) + bonus_amount
-
-        # 1. Update DB: Save Match Record first
+        # 1. Update DB: Match record, participants and Leaderboard stats in one atomic write
         # Participants Data
         participants_data = []
         for p in self.blue_team:
             participants_data.append({
                 'user_id': p.id,
                 'team': 'Blue',
-                'result': 'WIN' if winning_team_name == 'blue' else 'LOSS'
+                'result': 'WIN' if winning_team_name == 'blue' else 'LOSS',
+                'goals_scored': total_blue_goals,
+                'goals_conceded': total_orange_goals
             })
         for p in self.orange_team:
             participants_data.append({
                 'user_id': p.id,
                 'team': 'Orange',
-                'result': 'WIN' if winning_team_name == 'orange' else 'LOSS'
+                'result': 'WIN' if winning_team_name == 'orange' else 'LOSS',
+                'goals_scored': total_orange_goals,
+                'goals_conceded': total_blue_goals
             })
 
         match_timestamp = int(time.time())
-        saved_match_id = await save_match_record(
+        saved_match_id = await settle_match(
             timestamp=match_timestamp,
             game_mode=self.team_size,
             stake=self.stake,
@@ -315,57 +424,101 @@ class ResultView(discord.ui.View):
             score_details=score_str,
             participants=participants_data
         )
+        if saved_match_id == -1:
+            # Nothing is paid without a match record; the row stays so the result can be retried
+            await self._settlement_failed(interaction, score_str)
+            return
 
-        # Common Achievement / Update Logic
-        async def process_player(player, is_winner, team_color):
-            # Money
-            old_balance = await get_user_balance(player.id)
-            if is_winner:
-                await add_money_unbelievable(player.id, 0, total_payout)
-                payout_list.append(player.mention)
-                new_balance = old_balance + total_payout
-                status_str = "WIN"
-            else:
-                new_balance = old_balance
-                status_str = "LOSS"
-
-            log_data.append({
-                "user": player,
-                "status": status_str,
-                "old": old_balance + self.stake, # Stake was deducted at start
-                "new": new_balance
-            })
+        await delete_open_match(self.match_key)
 
-            # Stats Update (Leaderboard)
-            # Goals for this player's team
-            if team_color == "blue":
-                gs = total_blue_goals
-                gc = total_orange_goals
-            else:
-                gs = total_orange_goals
-                gc = total_blue_goals
+        # Bonus Logic
+        bonus_awarded = False
+        bonus_amount = 0
+
+        # Check global limit
+        current_bonus_count = await get_bonus_count()
+        winners_count = len(winning_team)
 
-            await update_match_history(player.id, self.team_size, is_winner, gs, gc)
+        # Only try if limit not reached
+        if current_bonus_count + winners_count <= 50:
+            # 15% chance for bonus
+            if random.random() < 0.15:
+                bonus_awarded = True
+                bonus_amount = int(self.stake * 0.5)
+                # Increment DB counter
+                await increment_bonus_count(winners_count)
 
-            # Check Achievements
-            match_info = {
-                'result': 'WIN' if is_winner else 'LOSS',
-                'timestamp': match_timestamp,
-                'game_mode': self.team_size
-            }
-            new_achievements = await check_achievements(player.id, match_info)
+        total_payout = (self.stake * 2) + bonus_amount
 
-            if new_achievements:
-                # Announce
-                for ach in new_achievements:
-                    await interaction.channel.send(f"🏆 **{player.display_name}** zdobył osiągnięcie: **{ach['name']}** - {ach['description']}")
+        # Common Achievement / Update Logic
+        # Per-player work is independent, so it runs concurrently (bounded);
+        # results are applied in team order below to keep logs and announcements stable.
+        semaphore = asyncio.Semaphore(SETTLEMENT_CONCURRENCY)
+        submitted = {}  # user_id -> payout queued; only winners who got this far
+
+        async def process_player(player, is_winner):
+            async with semaphore:
+                # Money first, so a failing lookup below can't cost the winner their payout
+                paid = True
+                if is_winner:
+                    # Queued in the payout outbox; sent by the background worker
+                    paid = await PAYOUTS.submit(
+                        PAYOUTS.key(self.match_key, player.id, "payout"), player.id, 0, total_payout, "payout")
+                    submitted[player.id] = paid
+
+                # Display only: the snapshot written through by take_bet is good enough
+                old_balance = await get_user_balance(player.id, max_age=None)
+                if is_winner:
+                    new_balance = old_balance + total_payout
+                    status_str = "WIN"
+                else:
+                    new_balance = old_balance
+                    status_str = "LOSS"
+
+                # Check Achievements
+                match_info = {
+                    'result': 'WIN' if is_winner else 'LOSS',
+                    'timestamp': match_timestamp,
+                    'game_mode': self.team_size
+                }
+                new_achievements = await check_achievements(player.id, match_info)
+
+                return {
+                    "log": {
+                        "user": player,
+                        "status": status_str,
+                        "old": old_balance + self.stake, # Stake was deducted at start
+                        "new": new_balance
+                    },
+                    "paid": paid,
+                    "achievements": new_achievements
+                }
 
         # Process All Players
-        for p in self.blue_team:
-            await process_player(p, winning_team_name == "blue", "blue")
+        players = [(p, winning_team_name == "blue") for p in self.blue_team] + \
+                  [(p, winning_team_name == "orange") for p in self.orange_team]
+        results = await asyncio.gather(*(process_player(p, w) for p, w in players), return_exceptions=True)
 
-        for p in self.orange_team:
-            await process_player(p, winning_team_name == "orange", "orange")
+        for (player, is_winner), result in zip(players, results):
+            if is_winner:
+                payout_list.append(player.mention)
+
+            if isinstance(result, Exception):
+                print(f"Error settling player {player.display_name}: {result}")
+                if is_winner and not submitted.get(player.id):
+                    await interaction.channel.send(
+                        f"🚨 Nie udało się wypłacić {total_payout} 💰 dla {player.mention}. <@{ADMIN_USER_ID}>")
+                continue
+
+            log_data.append(result["log"])
+
+            if not result["paid"]:
+                await interaction.channel.send(
+                    f"🚨 Nie udało się wypłacić {total_payout} 💰 dla {player.mention}. <@{ADMIN_USER_ID}>")
+
+            # Announce
+            for ach in result["achievements"] or []:
+                await interaction.channel.send(f"🏆 **{player.display_name}** zdobył osiągnięcie: **{ach['name']}** - {ach['description']}")
 
         # Result Message
         winners_str = ", ".join(payout_list)
@@ -385,10 +538,32 @@ class ResultView(discord.ui.View):
             print(f"Post-match error: {e}")
 
         await asyncio.sleep(5)
+        await self._editor.flush()
         await interaction.channel.edit(archived=True, locked=True)
         self.stop()
 
-    @discord.ui.button(label="📝 Zgłoś Wynik", style=discord.ButtonStyle.success)
+    async def _settlement_failed(self, interaction: discord.Interaction, score_str: str):
+        """Reopens the match for reporting after the match record could not be written."""
+        async with self._lock:
+            self.state = MatchState.STARTED
+            self.blue_report = None
+            self.orange_report = None
+
+        admin_message = await interaction.channel.send(
+            f"🚨 Nie udało się zapisać wyniku meczu (**{score_str}**). Nikt nie dostał wypłaty.\n"
+            f"Zgłoście wynik ponownie lub poczekajcie na admina <@{ADMIN_USER_ID}>.",
+            view=self.admin_view()
+        )
+        self.admin_message_id = admin_message.id
+        await self.save()
+        self._update_message()
+
+        channel = interaction.guild.get_channel(MATCH_LOGS_CHANNEL_ID)
+        if channel:
+            await channel.send(f"🚨 Zapis meczu `{self.match_key}` ({score_str}) nie powiódł się. "
+                               f"Mecz czeka na ponowne rozliczenie w {interaction.channel.mention}. <@{ADMIN_USER_ID}>")
+
+    @discord.ui.button(label="📝 Zgłoś Wynik", style=discord.ButtonStyle.success, custom_id="match_report")
     async def report_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         try:
             user = interaction.user
@@ -399,6 +574,10 @@ class ResultView(discord.ui.View):
                 await interaction.response.send_message("Tylko kapitanowie drużyn mogą zgłaszać wynik!", ephemeral=True)
                 return
 
+            if self.resolved:
+                await interaction.response.send_message("Mecz został już rozstrzygnięty!", ephemeral=True)
+                return
+
             is_blue = (user == captain_blue)
             team_name = "Blue" if is_blue else "Orange"
 
@@ -412,14 +591,17 @@ class ResultView(discord.ui.View):
             print(f"Error in report_button: {e}")
             await interaction.response.send_message("Wystąpił błąd przy otwieraniu formularza. Spróbuj ponownie.", ephemeral=True)
 
-    @discord.ui.button(label="x", style=discord.ButtonStyle.grey)
+    @discord.ui.button(label="x", style=discord.ButtonStyle.grey, custom_id="match_close")
     async def delete_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         if interaction.user.id != ADMIN_USER_ID:
             await interaction.response.send_message("Nie masz uprawnień!", ephemeral=True)
             return
 
+        await delete_open_match(self.match_key)
+
         await interaction.response.send_message('Zamykanie...')
         await asyncio.sleep(3)
+        self._editor.cancel()
         await interaction.channel.edit(archived=True, locked=True)
         self.stop()
 
@@ -0,0 +1,22 @@
+from enum import Enum
+
+
+class MatchState(Enum):
+    """
+    Lifecycle of a match. Transitions happen only under the match's asyncio.Lock
+    (MatchView._lock for the lobby, ResultView._lock for the result); the slow calls
+    (balance checks, charges, refunds, Discord messages) run outside it.
+
+    OPEN -> FULL       last seat paid for (lobby)
+    OPEN -> CANCELLED  lobby timed out, everyone refunded
+    FULL -> STARTED    match thread created, ResultView takes over
+    STARTED -> REPORTED   one captain reported
+    REPORTED -> STARTED   reports conflicted or were a draw, both cleared
+    REPORTED -> SETTLED   both reports agree (or an admin forced a result); paid exactly once
+    """
+    OPEN = "open"
+    FULL = "full"
+    STARTED = "started"
+    REPORTED = "reported"
+    SETTLED = "settled"
+    CANCELLED = "cancelled"
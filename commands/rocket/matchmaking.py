@@ -0,0 +1,245 @@
+import asyncio
+import heapq
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+from commands.rocket.match import MatchView, MatchType
+from commands.rocket.ranks import ELIGIBLE, eligible_ranks, rank_index
+from const import MATCH_CHANNEL_ID
+from database import delete_open_match
+
+# Lower bounds of the stake bands. Players are matched within their band, and also with
+# the neighbouring bands once they have waited MATCHMAKING_WIDEN_SECONDS.
+STAKE_BANDS = [200, 500, 1000, 2500, 5000]
+MATCHMAKING_INTERVAL_SECONDS = 5
+MATCHMAKING_WIDEN_SECONDS = 120
+QUEUE_MAX_WAIT_SECONDS = 1800  # 30 min, same as a lobby
+
+BucketKey = Tuple[int, str, int, Optional[str]]  # (team_size, match type name, stake band, rank)
+
+
+def stake_band(stake: int) -> int:
+    return max(0, bisect_right(STAKE_BANDS, stake) - 1)
+
+
+class QueueEntry:
+    __slots__ = ("user", "stake", "team_size", "match_type", "rank", "band", "enqueued_at")
+
+    def __init__(self, user: discord.Member, stake: int, team_size: int, match_type: MatchType,
+                 rank: Optional[str], enqueued_at: Optional[float] = None):
+        self.user = user
+        self.stake = stake
+        self.team_size = team_size
+        self.match_type = match_type
+        self.rank = rank
+        self.band = stake_band(stake)
+        self.enqueued_at = time.monotonic() if enqueued_at is None else enqueued_at
+
+    @property
+    def key(self) -> BucketKey:
+        return self.team_size, self.match_type.name, self.band, self.rank
+
+
+def _split_teams(group: List[QueueEntry]) -> Tuple[List[QueueEntry], List[QueueEntry]]:
+    """Snake draft by rank (1-2-2-1...), so neither team gets all the higher ranks."""
+    ordered = sorted(group, key=lambda e: -1 if e.rank is None else rank_index(e.rank), reverse=True)
+    blue, orange = [], []
+    for i, entry in enumerate(ordered):
+        (blue if i % 4 in (0, 3) else orange).append(entry)
+    return blue, orange
+
+
+class MatchmakingQueue:
+    """
+    Players waiting for a match, bucketed by (team size, match type, stake band, rank).
+    Each bucket is FIFO, so the longest-waiting compatible players are found by merging
+    the heads of a handful of buckets instead of scanning the whole queue.
+
+    A background task forms groups every MATCHMAKING_INTERVAL_SECONDS and starts their
+    match thread directly. Stakes are taken when the match is formed, not on enqueue,
+    so the queue holds no money and needs no persistence.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[BucketKey, OrderedDict] = {}  # key -> user_id -> QueueEntry
+        self._by_user: Dict[int, BucketKey] = {}
+        self._bot = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._by_user)
+
+    def __contains__(self, user_id: int):
+        return user_id in self._by_user
+
+    def enqueue(self, entry: QueueEntry) -> bool:
+        """Returns False if the player is already queued."""
+        if entry.user.id in self._by_user:
+            return False
+        self._buckets.setdefault(entry.key, OrderedDict())[entry.user.id] = entry
+        self._by_user[entry.user.id] = entry.key
+        return True
+
+    def leave(self, user_id: int) -> Optional[QueueEntry]:
+        key = self._by_user.pop(user_id, None)
+        if key is None:
+            return None
+        bucket = self._buckets[key]
+        entry = bucket.pop(user_id)
+        if not bucket:
+            del self._buckets[key]
+        return entry
+
+    def _requeue(self, entry: QueueEntry):
+        """Puts a player back keeping their place (original enqueue time)."""
+        if self.enqueue(entry):
+            bucket = self._buckets[entry.key]
+            # Restore FIFO order inside the bucket
+            for user_id in [uid for uid, e in bucket.items() if e.enqueued_at > entry.enqueued_at]:
+                bucket.move_to_end(user_id)
+
+    def _compatible_keys(self, anchor: QueueEntry, now: float) -> List[BucketKey]:
+        ranks = eligible_ranks(anchor.rank)
+        bands = [anchor.band]
+        if now - anchor.enqueued_at >= MATCHMAKING_WIDEN_SECONDS:
+            bands += [anchor.band - 1, anchor.band + 1]
+        keys = [(anchor.team_size, anchor.match_type.name, band, rank) for band in bands for rank in ranks]
+        return [key for key in keys if key in self._buckets]
+
+    def expire(self, now: Optional[float] = None) -> List[QueueEntry]:
+        """Removes and returns players who waited longer than QUEUE_MAX_WAIT_SECONDS."""
+        now = time.monotonic() if now is None else now
+        expired = []
+        for bucket in list(self._buckets.values()):
+            for entry in list(bucket.values()):
+                if now - entry.enqueued_at < QUEUE_MAX_WAIT_SECONDS:
+                    break  # FIFO: the rest of the bucket waited less
+                expired.append(self.leave(entry.user.id))
+        return expired
+
+    def find_matches(self, now: Optional[float] = None) -> List[List[QueueEntry]]:
+        """
+        Takes every full group (2 x team size) out of the queue. Bucket heads are tried
+        as anchors from the longest waiting; a group is the anchor plus the longest
+        waiting players compatible with it (stake band, match type) and with each other (rank).
+        """
+        now = time.monotonic() if now is None else now
+        groups = []
+        formed = True
+        while formed:
+            formed = False
+            heads = sorted((next(iter(b.values())) for b in self._buckets.values()), key=lambda e: e.enqueued_at)
+            for anchor in heads:
+                if anchor.user.id not in self._by_user:
+                    continue  # already taken by a group in this pass
+
+                size = anchor.team_size * 2
+                candidates = heapq.merge(*(self._buckets[k].values() for k in self._compatible_keys(anchor, now)),
+                                         key=lambda e: e.enqueued_at)
+                # Every player must be allowed to play with every other one, not just with the
+                # anchor (GC1 and GC3 both fit a GC2 anchor but not each other), so the ranks
+                # still allowed are narrowed as the group grows
+                group, allowed = [anchor], ELIGIBLE[rank_index(anchor.rank)]
+                for entry in candidates:
+                    index = rank_index(entry.rank)
+                    if entry is anchor or not allowed >> index & 1:
+                        continue
+                    group.append(entry)
+                    allowed &= ELIGIBLE[index]
+                    if len(group) == size:
+                        break
+                if len(group) < size:
+                    continue
+
+                for entry in group:
+                    self.leave(entry.user.id)
+                groups.append(group)
+                formed = True
+        return groups
+
+    # --- Background matchmaker ---
+
+    def start(self, bot):
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(MATCHMAKING_INTERVAL_SECONDS)
+            try:
+                for entry in self.expire():
+                    await self._notify_expired(entry)
+                for group in self.find_matches():
+                    await self._start_match(group)
+            except Exception as e:
+                print(f"Matchmaking error: {e}")
+
+    @staticmethod
+    async def _notify_expired(entry: QueueEntry):
+        try:
+            await entry.user.send("⏰ Nie znaleziono meczu w ciągu 30 minut. Opuszczono kolejkę.")
+        except discord.HTTPException:
+            pass
+
+    async def _start_match(self, group: List[QueueEntry]):
+        """Charges every player and opens the match thread, or puts the group back on failure."""
+        anchor = group[0]
+        blue, orange = _split_teams(group)
+        # Nobody pays more than they queued for
+        stake = min(e.stake for e in group)
+
+        view = MatchView(stake, anchor.match_type, anchor.user, anchor.team_size)
+        view.required_role = anchor.rank
+
+        # Balances are checked again: the player may have spent the money while queued,
+        # and the API happily takes the bank negative
+        charged, failed = [], []
+        for entry in group:
+            ok = await view._validate_user_balance(entry.user) and await view._take_stake(entry.user)
+            (charged if ok else failed).append(entry)
+
+        if failed:
+            for entry in charged:
+                await view._refund_stake(entry.user)
+                self._requeue(entry)
+            for entry in failed:
+                try:
+                    await entry.user.send("Błąd pobierania stawki. Sprawdź swoje konto! Usunięto Cię z kolejki.")
+                except discord.HTTPException:
+                    pass
+            return
+
+        view.blue_team = [e.user for e in blue]
+        view.orange_team = [e.user for e in orange]
+        try:
+            channel = self._bot.get_channel(MATCH_CHANNEL_ID) or await self._bot.fetch_channel(MATCH_CHANNEL_ID)
+            view.message = await channel.send(embed=view._create_match_embed())
+            # Stored as a lobby first, so a restart before the thread exists still refunds on timeout
+            await view.save()
+            await view.start_match()
+        except Exception as e:
+            print(f"Error starting queued match {view.match_key}: {e}")
+            for entry in group:
+                await view._refund_stake(entry.user)
+            await delete_open_match(view.match_key)
+            for entry in group:
+                try:
+                    await entry.user.send("Nie udało się utworzyć meczu z kolejki. Środki zwrócone.")
+                except discord.HTTPException:
+                    pass
+
+MATCHMAKER = MatchmakingQueue()
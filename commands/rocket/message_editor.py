@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, Callable, Dict, Optional
+
+import discord
+
+EDIT_DEBOUNCE_SECONDS = 1.5
+
+
+def _snapshot(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v.to_dict() if isinstance(v, discord.Embed) else v for k, v in kwargs.items()}
+
+
+class DebouncedEditor:
+    """
+    Coalesces edits of one message. `request()` only marks the message stale; the edit
+    happens `delay` seconds later with whatever `render()` returns at that moment, so a
+    burst of changes costs one edit and the last edit always shows the latest state.
+    Edits whose rendered content equals the last one sent are skipped.
+    """
+
+    def __init__(self, render: Callable[[], Dict[str, Any]], delay: float = EDIT_DEBOUNCE_SECONDS):
+        self.render = render
+        self.delay = delay
+        self.message: Optional[discord.Message] = None
+        self._last_sent: Optional[Dict[str, Any]] = None
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_sent(self, **kwargs):
+        """Records what the message currently shows (e.g. right after sending it)."""
+        self._last_sent = _snapshot(kwargs)
+
+    def request(self):
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._dirty:
+            await asyncio.sleep(self.delay)
+            # Changes arriving during the edit set _dirty again and get one more round
+            self._dirty = False
+            await self._apply()
+
+    async def _apply(self):
+        if not self.message:
+            return
+        kwargs = self.render()
+        snapshot = _snapshot(kwargs)
+        if snapshot == self._last_sent:
+            return
+        try:
+            await self.message.edit(**kwargs)
+            self._last_sent = snapshot
+        except discord.HTTPException as e:
+            print(f"Error editing message {self.message.id}: {e}")
+
+    def cancel(self):
+        """Drops a pending edit (e.g. before the message is replaced or removed)."""
+        self._dirty = False
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def flush(self):
+        """Applies a pending edit right away."""
+        pending = self._dirty
+        self.cancel()
+        if pending:
+            await self._apply()
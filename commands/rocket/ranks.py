@@ -0,0 +1,91 @@
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+RANK_ROLES = ["Brąz", "Srebro", "Złoto", "Platyna", "Diament", "Champion", "GC1", "GC2", "GC3", "SSL"]
+GC_RANKS = {
+    "GC1": ["GC1", "GC2"],
+    "GC2": ["GC1", "GC2", "GC3"],
+    "GC3": ["GC2", "GC3", "SSL"],
+    "SSL": ["GC3", "SSL"]
+}
+
+# Rank indexes; players without a rank role get their own index at the end
+RANK_INDEX = {name: i for i, name in enumerate(RANK_ROLES)}
+NO_RANK = len(RANK_ROLES)
+_NAMES: List[Optional[str]] = [*RANK_ROLES, None]
+
+
+def rank_index(rank: Optional[str]) -> int:
+    return RANK_INDEX.get(rank, NO_RANK)
+
+
+def _build_eligibility() -> Tuple[int, ...]:
+    """ELIGIBLE[i] has bit j set if rank j may join a match set up for rank i."""
+    matrix = []
+    for required in _NAMES:
+        allowed = GC_RANKS.get(required, [required])
+        mask = 0
+        for rank in allowed:
+            mask |= 1 << rank_index(rank)
+        matrix.append(mask)
+    return tuple(matrix)
+
+
+ELIGIBLE = _build_eligibility()
+
+
+def ranks_compatible(required_role: Optional[str], user_rank: Optional[str]) -> bool:
+    """Whether a player of `user_rank` may play in a match set up for `required_role`."""
+    return bool(ELIGIBLE[rank_index(required_role)] >> rank_index(user_rank) & 1)
+
+
+def eligible_ranks(required_role: Optional[str]) -> List[Optional[str]]:
+    mask = ELIGIBLE[rank_index(required_role)]
+    return [name for i, name in enumerate(_NAMES) if mask >> i & 1]
+
+
+class RankResolver:
+    """
+    Member -> rank lookups from a role id -> rank map built once per guild and rebuilt
+    on role create/update/delete (see the listeners in events.py). Ranks are resolved
+    from the member object every time: interaction members aren't in the member cache,
+    so on_member_update can't be relied on to invalidate a per-member cache.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._role_ranks: Dict[int, Tuple[int, int]] = {}  # role_id -> (position, rank index)
+
+    def build(self, guilds):
+        self._role_ranks = {
+            role.id: (role.position, RANK_INDEX[role.name])
+            for guild in guilds
+            for role in guild.roles
+            if role.name in RANK_INDEX
+        }
+        self.ready = True
+
+    def rank_index_of(self, member) -> int:
+        if not isinstance(member, discord.Member):
+            return NO_RANK  # users who left the server (restored lobbies) have no roles
+
+        if not self.ready:
+            for role in member.roles:
+                if role.name in RANK_INDEX:
+                    return RANK_INDEX[role.name]
+            return NO_RANK
+
+        # Checks the few rank roles against the member (binary search on role ids) instead
+        # of building member.roles. Lowest positioned rank role wins, like the old scan.
+        best = None
+        for role_id, entry in self._role_ranks.items():
+            if (best is None or entry < best) and member.get_role(role_id):
+                best = entry
+        return best[1] if best else NO_RANK
+
+    def rank_of(self, member) -> Optional[str]:
+        return _NAMES[self.rank_index_of(member)]
+
+
+RANKS = RankResolver()
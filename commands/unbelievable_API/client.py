@@ -0,0 +1,220 @@
+import os
+import time
+import asyncio
+import aiohttp
+from typing import Optional, Dict, Any, Tuple
+from dotenv import load_dotenv
+
+from cache import TTLCache, MISSING
+
+load_dotenv()
+
+GUILD_ID = os.getenv('GUILD')
+UNBELIEVABOAT_API_KEY = os.getenv("UNBELIEVABOAT_API_KEY")
+API_BASE_URL = "https://unbelievaboat.com/api/v1"
+
+# UnbelievaBoat allows short bursts and then throttles per route; stay under it client-side.
+RATE_LIMIT_PER_SECOND = 5
+RATE_LIMIT_BURST = 10
+MAX_CONNECTIONS = 10
+REQUEST_TIMEOUT_SECONDS = 10
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 0.5
+
+# Balance snapshots are refreshed from every GET and PATCH response (PATCH returns the user object)
+BALANCE_CACHE_SIZE = 2000
+BALANCE_SNAPSHOT_TTL = 3600  # seconds a snapshot is kept at all
+BALANCE_FRESH_SECONDS = 30  # default max age when a decision depends on the balance
+
+# PATCH is not idempotent: only retry 429, where the request was certainly not applied.
+# A gateway error (502/503/504) doesn't prove the upstream never applied it, so the
+# caller gets it back as an unknown outcome.
+RETRY_STATUSES_PATCH = {429}
+RETRY_STATUSES_GET = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, up to `capacity` stored."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def block_until(self, deadline: float):
+        """Stops handing out tokens until `deadline` (monotonic time), e.g. after a 429."""
+        self._blocked_until = max(self._blocked_until, deadline)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class EndpointMetrics:
+    """Request count, failures and latency per endpoint."""
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, float]] = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool, retried: bool = False):
+        m = self._data.setdefault(endpoint, {"count": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0})
+        ms = seconds * 1000
+        m["count"] += 1
+        m["total_ms"] += ms
+        m["max_ms"] = max(m["max_ms"], ms)
+        if not ok:
+            m["errors"] += 1
+        if retried:
+            m["retries"] += 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            endpoint: {**m, "avg_ms": round(m["total_ms"] / m["count"], 1) if m["count"] else 0.0}
+            for endpoint, m in self._data.items()
+        }
+
+
+class UnbelievaBoatClient:
+    """
+    Shared UnbelievaBoat API client: one persistent session with a bounded
+    connection pool, a client-side token bucket, and retries with backoff on
+    429 (honouring Retry-After), plus transient 5xx responses for reads. Successful responses
+    are written through to a per-user balance snapshot cache.
+    """
+
+    def __init__(self, guild_id: Optional[str] = GUILD_ID, api_key: Optional[str] = UNBELIEVABOAT_API_KEY):
+        self.guild_id = guild_id
+        self.api_key = api_key
+        self.limiter = TokenBucket(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+        self.metrics = EndpointMetrics()
+        self.balances = TTLCache(BALANCE_CACHE_SIZE, BALANCE_SNAPSHOT_TTL)  # user_id -> (fetched_at, user object)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily so it binds to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS),
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS),
+                headers={"accept": "application/json", "Authorization": f"{self.api_key}"}
+            )
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _user_url(self, user_id: int) -> str:
+        return f"{API_BASE_URL}/guilds/{self.guild_id}/users/{user_id}"
+
+    @staticmethod
+    def _retry_delay(response_headers, data, attempt: int) -> float:
+        """Seconds to wait before retrying: Retry-After header, then body `retry_after` (ms), then backoff."""
+        header = response_headers.get("Retry-After") if response_headers else None
+        if header:
+            try:
+                return float(header)
+            except ValueError:
+                pass
+        if isinstance(data, dict) and "retry_after" in data:
+            try:
+                return float(data["retry_after"]) / 1000
+            except (TypeError, ValueError):
+                pass
+        return BACKOFF_BASE_SECONDS * (2 ** attempt)
+
+    def _apply_rate_limit_headers(self, headers):
+        # X-RateLimit-Reset is a unix timestamp in milliseconds
+        if headers.get("X-RateLimit-Remaining") == "0" and headers.get("X-RateLimit-Reset"):
+            try:
+                wait = int(headers["X-RateLimit-Reset"]) / 1000 - time.time()
+            except ValueError:
+                return
+            if wait > 0:
+                self.limiter.block_until(time.monotonic() + wait)
+
+    async def request(self, method: str, user_id: int, payload: Optional[dict] = None) -> Tuple[Optional[int], Any]:
+        """
+        Sends a request to the user endpoint. Returns (status, json_data);
+        status is None if the request never got a response.
+        """
+        endpoint = f"{method} /users"
+        retry_statuses = RETRY_STATUSES_GET if method == "GET" else RETRY_STATUSES_PATCH
+        status, data = None, None
+
+        for attempt in range(MAX_RETRIES + 1):
+            await self.limiter.acquire()
+            start = time.monotonic()
+            headers = None
+            try:
+                async with self._get_session().request(method, self._user_url(user_id), json=payload) as response:
+                    status = response.status
+                    headers = response.headers
+                    self._apply_rate_limit_headers(headers)
+                    try:
+                        data = await response.json(content_type=None)
+                    except (aiohttp.ContentTypeError, ValueError):
+                        data = None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Connection errors are only safe to retry for reads
+                print(f"UnbelievaBoat {endpoint} failed for {user_id}: {e!r}")
+                status, data = None, None
+
+            retryable = status in retry_statuses or (status is None and method == "GET")
+            will_retry = retryable and attempt < MAX_RETRIES
+            self.metrics.record(endpoint, time.monotonic() - start, ok=status == 200, retried=will_retry)
+
+            if not will_retry:
+                break
+
+            delay = self._retry_delay(headers, data, attempt)
+            if status == 429:
+                self.limiter.block_until(time.monotonic() + delay)
+            await asyncio.sleep(delay)
+
+        if status == 200 and isinstance(data, dict) and "bank" in data:
+            self.balances.set(int(user_id), (time.monotonic(), data))
+        return status, data
+
+    async def get_user(self, user_id: int, max_age: Optional[float] = 0) -> Optional[dict]:
+        """
+        Returns the user's balance object, or None on failure.
+        max_age: reuse a cached snapshot at most this many seconds old
+        (0 always fetches, None accepts any cached snapshot).
+        """
+        cached = self.balances.get(int(user_id))
+        if cached is not MISSING and max_age != 0:
+            fetched_at, data = cached
+            if max_age is None or time.monotonic() - fetched_at <= max_age:
+                return data
+
+        status, data = await self.request("GET", user_id)
+        if status == 200 and isinstance(data, dict):
+            return data
+        return None
+
+    async def update_balance(self, user_id: int, cash: int = 0, bank: int = 0) -> Optional[dict]:
+        """Adds (or removes, if negative) money. Returns the updated user object, or None on failure."""
+        status, data = await self.request("PATCH", user_id, {"cash": cash, "bank": bank})
+        if status == 200 and isinstance(data, dict) and "bank" in data:
+            return data
+        print(f"Failed to update balance for {user_id} (cash {cash}, bank {bank}). Status: {status}, Data: {data}")
+        return None
+
+
+UNBELIEVABOAT = UnbelievaBoatClient()
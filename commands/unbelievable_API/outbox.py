@@ -0,0 +1,169 @@
+import time
+import asyncio
+from typing import Optional, Callable, Awaitable
+
+from commands.unbelievable_API.client import UNBELIEVABOAT
+from database import (
+    enqueue_payout,
+    claim_pending_payouts,
+    finish_payouts,
+    mark_interrupted_payouts
+)
+
+OUTBOX_BATCH_SIZE = 10
+OUTBOX_POLL_SECONDS = 30
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_SECONDS = 5
+
+
+def _outcome(status: Optional[int]) -> str:
+    """Maps an UnbelievaBoat PATCH status to an outbox status."""
+    if status == 200:
+        return 'sent'
+    if status == 429:
+        return 'pending'  # Rejected before being applied, safe to send again
+    if status is None or status >= 500:
+        # Timeouts and 5xx, gateway errors included: may or may not have been applied,
+        # never resent automatically
+        return 'unknown'
+    return 'failed'
+
+
+class PayoutOutbox:
+    """
+    Durable queue of UnbelievaBoat balance changes. Every change is written to the
+    PayoutOutbox table under an idempotency key before it is sent, and a background
+    worker drains pending rows in batches with retries. On startup, rows that were
+    mid-request when the bot stopped are flagged for manual review instead of being
+    resent, so a payout is never applied twice.
+    """
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._notify: Optional[Callable[[str], Awaitable[None]]] = None
+
+    @staticmethod
+    def key(match_key: str, user_id: int, kind: str) -> str:
+        return f"{match_key}:{user_id}:{kind}"
+
+    async def submit(self, key: str, user_id: int, cash: int, bank: int, kind: str) -> bool:
+        """
+        Queues a credit (payout/refund) and returns without waiting for the API.
+        Falls back to a direct request if the outbox table is unavailable.
+        Returns False only if the change could be neither queued nor sent.
+        """
+        inserted = await enqueue_payout(key, user_id, cash, bank, kind)
+        if inserted is None:
+            print(f"Outbox unavailable, sending {key} directly.")
+            return await UNBELIEVABOAT.update_balance(user_id, cash, bank) is not None
+
+        self._wakeup.set()
+        return True
+
+    async def execute_now(self, key: str, user_id: int, cash: int, bank: int, kind: str) -> Optional[dict]:
+        """
+        Records a change and sends it immediately (used for bets, where the caller
+        needs the outcome). Returns the updated user object, or None on failure.
+        Failed bets are not retried later; unknown outcomes are reported for manual review.
+        """
+        inserted = await enqueue_payout(key, user_id, cash, bank, kind, status='sending')
+        if inserted is False:
+            print(f"Balance change {key} was already recorded, not sending again.")
+            return None
+
+        status, data = await UNBELIEVABOAT.request("PATCH", user_id, {"cash": cash, "bank": bank})
+        outcome = _outcome(status)
+        if outcome == 'pending':
+            outcome = 'failed'
+
+        if inserted:
+            await finish_payouts([{'key': key, 'status': outcome, 'error': None if outcome == 'sent' else f"HTTP {status}"}])
+
+        if outcome == 'sent' and isinstance(data, dict) and "bank" in data:
+            return data
+        print(f"Balance change {key} failed. Status: {status}, Data: {data}")
+        if outcome == 'unknown':
+            # The caller treats this as a failure, but the money may already have moved
+            await self._report(
+                f"🚨 Zmiana salda `{key}` ({kind}: {bank + cash} 💰 dla <@{user_id}>) ma nieznany wynik "
+                f"(HTTP {status}). Sprawdź saldo ręcznie."
+            )
+        return None
+
+    async def start(self, notify: Optional[Callable[[str], Awaitable[None]]] = None):
+        """Flags interrupted rows, replays pending ones and starts the background worker."""
+        if self._task and not self._task.done():
+            return
+        self._notify = notify
+
+        interrupted = await mark_interrupted_payouts()
+        for key, user_id, cash, bank, kind in interrupted:
+            await self._report(
+                f"⚠️ Wypłata `{key}` ({kind}: {bank + cash} 💰 dla <@{user_id}>) została przerwana. Sprawdź saldo ręcznie."
+            )
+
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _report(self, message: str):
+        print(message)
+        if self._notify:
+            try:
+                await self._notify(message)
+            except Exception as e:
+                print(f"Failed to send outbox notification: {e}")
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                processed = await self.drain_once()
+            except Exception as e:
+                print(f"Outbox worker error: {e}")
+                processed = 0
+
+            if processed < OUTBOX_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def drain_once(self) -> int:
+        """Sends one batch of due payouts. Returns how many were processed."""
+        rows = await claim_pending_payouts(OUTBOX_BATCH_SIZE)
+        if not rows:
+            return 0
+
+        async def send(row):
+            key, user_id, cash, bank, kind, attempts = row
+            status, _ = await UNBELIEVABOAT.request("PATCH", int(user_id), {"cash": cash, "bank": bank})
+            outcome = _outcome(status)
+            result = {'key': key, 'status': outcome, 'error': None if outcome == 'sent' else f"HTTP {status}"}
+
+            if outcome == 'pending':
+                if attempts >= OUTBOX_MAX_ATTEMPTS:
+                    result['status'] = 'failed'
+                else:
+                    result['retry_at'] = int(time.time()) + OUTBOX_BACKOFF_SECONDS * (2 ** attempts)
+
+            if result['status'] in ('failed', 'unknown'):
+                await self._report(
+                    f"🚨 Wypłata `{key}` ({kind}: {bank + cash} 💰 dla <@{user_id}>) nie powiodła się ({result['error']})."
+                )
+            return result
+
+        results = await asyncio.gather(*(send(row) for row in rows))
+        await finish_payouts(list(results))
+        return len(rows)
+
+
+PAYOUTS = PayoutOutbox()
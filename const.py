@@ -3,14 +3,24 @@ BLOCKED_WORDS = [
     'm4lo4tam!',
     'm40l4tam!',
     'steamcommunity.com/gift',
-    'steamecomnmunity.com/',
-    'sterncommunity',
     'gift 50$',
     '50$ gift',
     'is.gd/',
     'steam-shortlink.xyz'
 ]
 
+# Auto-replies in Events.on_message, matched in the same pass as BLOCKED_WORDS.
+# cooldown: seconds per channel, user_cooldown: seconds per user, channels: channel ids (empty = everywhere)
+AUTO_REPLIES = [
+    {
+        'pattern': 'ustawienia',
+        'reply': '[Ustawienia Edka](<https://www.youtube.com/watch?v=PeMm2dlzF3k>)',
+        'cooldown': 60,
+        'user_cooldown': 300,
+        'channels': []
+    },
+]
+
 LOG_CHANNEL_ID = 1053819227741638756
 MATCH_CHANNEL_ID = 1342099575732965376
 MATCH_LOGS_CHANNEL_ID = 1467480444202385549
@@ -1,8 +1,27 @@
 import os
+import asyncio
 import libsql_client
+import json
 import time
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional, Any
 
+from cache import TTLCache, MISSING
+from const import BLOCKED_WORDS
+from leaderboard_index import LEADERBOARD_INDEX
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_HEALTH_CHECK_INTERVAL = 60  # seconds
+DB_HEALTH_CHECK_TIMEOUT = 5  # seconds
+
+USER_CACHE_SIZE = 1000  # users
+USER_CACHE_TTL = 300  # seconds
+
+# Per-user read-through caches for /profile and achievement checks.
+# Invalidated on match settlement and when an achievement is added.
+_stats_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+_achievements_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
 def get_db_config():
     url = os.getenv("CONNECTION_URL")
     token = os.getenv("CONNECTION_TOKEN")
@@ -13,6 +32,160 @@ def get_db_config():
         url = url.replace("libsql://", "https://")
     return url, token
 
+
+class DatabasePool:
+    """
+    Bounded pool of long-lived libsql clients shared by every query in this module.
+    Each client keeps its HTTP session (and keep-alive connections) open, so queries
+    no longer pay a fresh handshake. Clients that fail while in use, or that stop
+    answering the periodic health check, are closed and replaced.
+    """
+
+    def __init__(self, url: str, token: Optional[str], size: int = DB_POOL_SIZE):
+        self.url = url
+        self.token = token
+        self.size = max(1, size)
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._health_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def _create_client(self):
+        return libsql_client.create_client(self.url, auth_token=self.token)
+
+    async def start(self):
+        for _ in range(self.size):
+            self._idle.put_nowait(self._create_client())
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrows a client for the duration of the `async with` block."""
+        if self._closed:
+            raise RuntimeError("Database pool is closed.")
+
+        client = await self._idle.get()
+        if client.closed:
+            client = await self._reconnect(client)
+        failed = False
+        try:
+            yield client
+        except Exception:
+            failed = True
+            raise
+        finally:
+            if self._closed:
+                # Pool shut down while the client was borrowed
+                await client.close()
+            else:
+                if failed and not await self._is_healthy(client):
+                    client = await self._reconnect(client)
+                self._idle.put_nowait(client)
+
+    async def execute(self, query: str, params: Optional[list] = None):
+        async with self.acquire() as client:
+            return await client.execute(query, params)
+
+    async def batch(self, statements: list):
+        """Runs statements in a single round trip inside one transaction."""
+        async with self.acquire() as client:
+            return await client.batch(statements)
+
+    async def _is_healthy(self, client) -> bool:
+        if client.closed:
+            return False
+        try:
+            await asyncio.wait_for(client.execute("SELECT 1"), timeout=DB_HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def _reconnect(self, client):
+        print("Database client unhealthy, reconnecting...")
+        try:
+            await client.close()
+        except Exception:
+            pass
+        return self._create_client()
+
+    async def _health_loop(self):
+        while not self._closed:
+            await asyncio.sleep(DB_HEALTH_CHECK_INTERVAL)
+            # Only idle clients are checked; busy ones are verified on failure in acquire()
+            for _ in range(self._idle.qsize()):
+                try:
+                    client = self._idle.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if not await self._is_healthy(client):
+                    client = await self._reconnect(client)
+                self._idle.put_nowait(client)
+
+    async def close(self):
+        self._closed = True
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+
+        while not self._idle.empty():
+            client = self._idle.get_nowait()
+            try:
+                await client.close()
+            except Exception as e:
+                print(f"Error closing database client: {e}")
+
+
+# Secondary indexes for the hot read paths (history, participants, leaderboards).
+# Bump INDEX_VERSION whenever this mapping changes so existing databases are updated on startup.
+INDEX_VERSION = 3
+INDEXES = {
+    # get_user_matches_history: WHERE mp.user_id = ? (covering, joins Matches by rowid)
+    "idx_participants_user": "MatchParticipants (user_id, match_id, result, team)",
+    # get_match_participants and the participants side of per-mode joins
+    "idx_participants_match": "MatchParticipants (match_id, user_id, team, result)",
+    # Per-mode match scans (earnings) and recent matches per mode
+    "idx_matches_mode": "Matches (game_mode, timestamp, stake)",
+    # get_leaderboard_data / get_all_winners: WHERE "NvN_W" > 0 ORDER BY "NvN_W" DESC
+    "idx_leaderboard_1v1": 'Leaderboard ("1v1_W", "1v1_L", user_id)',
+    "idx_leaderboard_2v2": 'Leaderboard ("2v2_W", "2v2_L", user_id)',
+    "idx_leaderboard_3v3": 'Leaderboard ("3v3_W", "3v3_L", user_id)',
+    # get_leaderboard_data: top earnings per mode
+    "idx_earnings_mode": "Earnings (game_mode, net, user_id)",
+    # claim_pending_payouts: oldest due rows first
+    "idx_outbox_status": "PayoutOutbox (status, next_attempt_at, created_at)",
+}
+
+_pool: Optional[DatabasePool] = None
+
+async def init_db_pool(url: Optional[str] = None, token: Optional[str] = None, size: int = DB_POOL_SIZE) -> Optional[DatabasePool]:
+    """Creates the shared database pool. Called once on bot startup."""
+    global _pool
+    if _pool:
+        return _pool
+
+    if not url:
+        url, token = get_db_config()
+        if not url: return None
+
+    _pool = DatabasePool(url, token, size)
+    await _pool.start()
+    return _pool
+
+async def close_db_pool():
+    """Closes every pooled client. Called on bot shutdown."""
+    global _pool
+    if _pool:
+        await _pool.close()
+        _pool = None
+    _stats_cache.clear()
+    _achievements_cache.clear()
+
+def get_pool() -> Optional[DatabasePool]:
+    return _pool
+
+def get_cache_stats() -> Dict[str, dict]:
+    """Returns size and hit/miss counters of the per-user caches."""
+    return {"stats": _stats_cache.stats(), "achievements": _achievements_cache.stats()}
+
 async def migrate_tables_to_text(client):
     """
     Migrates tables containing user_id from INTEGER to TEXT.
@@ -146,8 +319,8 @@ async def migrate_tables_to_text(client):
 
 async def init_system_tables():
     """Initializes the SystemConfig and new tables (Matches, Achievements) if they don't exist."""
-    url, token = get_db_config()
-    if not url: return
+    pool = get_pool()
+    if not pool: return
 
     queries = [
         """
@@ -203,10 +376,82 @@ async def init_system_tables():
             user_id TEXT,
             PRIMARY KEY(team_size, user_id)
         );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Earnings (
+            user_id TEXT,
+            game_mode INTEGER,
+            net INTEGER DEFAULT 0,
+            PRIMARY KEY(user_id, game_mode)
+        );
+        """,
+        """
+        INSERT INTO SystemConfig (key, value)
+        VALUES ('earnings_backfilled', 0)
+        ON CONFLICT(key) DO NOTHING;
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS PayoutOutbox (
+            idempotency_key TEXT PRIMARY KEY,
+            user_id TEXT,
+            cash INTEGER DEFAULT 0,
+            bank INTEGER DEFAULT 0,
+            kind TEXT,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at INTEGER DEFAULT 0,
+            created_at INTEGER,
+            updated_at INTEGER,
+            last_error TEXT
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS BlockedWords (
+            word TEXT PRIMARY KEY,
+            added_by TEXT,
+            added_at INTEGER
+        );
+        """,
+        """
+        INSERT INTO SystemConfig (key, value)
+        VALUES ('blocked_words_seeded', 0)
+        ON CONFLICT(key) DO NOTHING;
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS OpenMatches (
+            match_key TEXT PRIMARY KEY,
+            kind TEXT,
+            channel_id TEXT,
+            message_id TEXT,
+            state TEXT,
+            deadline INTEGER,
+            updated_at INTEGER
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS AchievementState (
+            user_id TEXT PRIMARY KEY,
+            games INTEGER DEFAULT 0,
+            wins_1 INTEGER DEFAULT 0,
+            wins_2 INTEGER DEFAULT 0,
+            wins_3 INTEGER DEFAULT 0,
+            win_streak INTEGER DEFAULT 0,
+            loss_streak INTEGER DEFAULT 0,
+            day INTEGER DEFAULT 0,
+            daily_count INTEGER DEFAULT 0,
+            daily_modes_won INTEGER DEFAULT 0,
+            weekend_count INTEGER DEFAULT 0,
+            unlocked INTEGER DEFAULT 0
+        );
+        """,
+        """
+        INSERT INTO SystemConfig (key, value)
+        VALUES ('achievement_state_backfilled', 0)
+        ON CONFLICT(key) DO NOTHING;
         """
     ]
 
-    async with libsql_client.create_client(url, auth_token=token) as client:
+    async with pool.acquire() as client:
         # Run migration first/early to ensure existing tables are updated
         await migrate_tables_to_text(client)
 
@@ -217,26 +462,71 @@ async def init_system_tables():
                 print(f"Error initializing table with query: {q[:50]}... -> {e}")
 
         # Migration for Leaderboard columns
-        goal_cols = ["1v1_GS", "1v1_GC", "2v2_GS", "2v2_GC", "3v3_GS", "3v3_GC"]
-        for col in goal_cols:
+        stat_cols = [f"{n}v{n}_{s}" for n in [1, 2, 3] for s in ["W", "L", "GS", "GC"]]
+        for col in stat_cols:
             try:
                 # Attempt to add column. Will fail if exists.
                 await client.execute(f'ALTER TABLE Leaderboard ADD COLUMN "{col}" INTEGER DEFAULT 0')
             except Exception:
                 pass
 
-async def update_match_history(user_id: int, team_size: int, is_win: bool, goals_scored: int = 0, goals_conceded: int = 0):
+        # Indexes depend on the Leaderboard columns above
+        await ensure_indexes(client)
+
+    await backfill_earnings()
+    await warm_leaderboard_index()
+    await seed_blocked_words(BLOCKED_WORDS)
+
+async def warm_leaderboard_index():
+    """Loads every player's wins/losses into the in-memory LEADERBOARD_INDEX."""
+    pool = get_pool()
+    if not pool: return
+
+    cols = [f"{n}v{n}_{s}" for n in [1, 2, 3] for s in ["W", "L"]]
+    cols_quoted = [f'"{c}"' for c in cols]
+    query = f"SELECT user_id, {', '.join(cols_quoted)} FROM Leaderboard"
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute(query)
+    except Exception as e:
+        print(f"Error warming leaderboard index: {e}")
+        return
+
+    for i, team_size in enumerate([1, 2, 3]):
+        LEADERBOARD_INDEX.load(team_size, [(row[0], row[1 + 2 * i], row[2 + 2 * i]) for row in res.rows])
+    LEADERBOARD_INDEX.ready = True
+
+async def ensure_indexes(client):
     """
-    Updates the match history for a user in the Leaderboard table.
-    Increments the win or loss count and updates goal stats.
+    Creates the secondary indexes in INDEXES when the stored index version is older
+    than INDEX_VERSION, dropping any of our indexes that are no longer listed.
     """
-    if team_size not in [1, 2, 3]:
-        print(f"Unsupported team size for stats: {team_size}")
-        return
+    try:
+        res = await client.execute("SELECT value FROM SystemConfig WHERE key = 'index_version'")
+        current_version = res.rows[0][0] if res.rows else 0
+        if current_version >= INDEX_VERSION:
+            return
+
+        print(f"Updating indexes from version {current_version} to {INDEX_VERSION}...")
+
+        res = await client.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")
+        for row in res.rows:
+            if row[0] not in INDEXES:
+                await client.execute(f'DROP INDEX IF EXISTS "{row[0]}"')
 
-    url, token = get_db_config()
-    if not url: return
+        for name, definition in INDEXES.items():
+            await client.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON {definition}')
 
+        await client.execute("""
+            INSERT INTO SystemConfig (key, value) VALUES ('index_version', ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, [INDEX_VERSION])
+    except Exception as e:
+        print(f"Error creating indexes: {e}")
+
+def _leaderboard_upsert(user_id: int, team_size: int, is_win: bool, goals_scored: int = 0, goals_conceded: int = 0):
+    """Builds the Leaderboard upsert statement (query, args) for one player's result."""
     # Cast user_id to str
     user_id = str(user_id)
 
@@ -255,14 +545,31 @@ async def update_match_history(user_id: int, team_size: int, is_win: bool, goals
             "{gs_col}" = "{gs_col}" + ?,
             "{gc_col}" = "{gc_col}" + ?
     """
+    return query, [user_id, goals_scored, goals_conceded, goals_scored, goals_conceded]
+
+async def update_match_history(user_id: int, team_size: int, is_win: bool, goals_scored: int = 0, goals_conceded: int = 0):
+    """
+    Updates the match history for a user in the Leaderboard table.
+    Increments the win or loss count and updates goal stats.
+    """
+    if team_size not in [1, 2, 3]:
+        print(f"Unsupported team size for stats: {team_size}")
+        return
+
+    pool = get_pool()
+    if not pool: return
+
+    query, args = _leaderboard_upsert(user_id, team_size, is_win, goals_scored, goals_conceded)
 
     try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
-            await client.execute(query, [user_id, goals_scored, goals_conceded, goals_scored, goals_conceded])
+        async with pool.acquire() as client:
+            await client.execute(query, args)
+        LEADERBOARD_INDEX.record_result(user_id, team_size, is_win)
+        _stats_cache.invalidate(str(user_id))
     except Exception as e:
         print(f"Error updating match history for user {user_id}: {e}")
 
-async def save_match_record(
+def _match_record_statements(
     timestamp: int,
     game_mode: int,
     stake: int,
@@ -271,50 +578,121 @@ async def save_match_record(
     orange_score_sets: int,
     score_details: str,
     participants: List[Dict[str, Any]]
-) -> int:
+) -> list:
     """
-    Saves a match record and its participants.
-    participants: List of dicts with keys 'user_id', 'team', 'result'
-    Returns match_id
+    Builds the Matches insert (first statement, RETURNING match_id), one insert per
+    participant and the matching Earnings updates.
     """
-    url, token = get_db_config()
-    if not url: return -1
-
     insert_match_sql = """
         INSERT INTO Matches (timestamp, game_mode, stake, winner_team, blue_score_sets, orange_score_sets, score_details)
         VALUES (?, ?, ?, ?, ?, ?, ?)
         RETURNING match_id
     """
 
+    # match_id is not known client-side inside a batch; the batch runs in one
+    # transaction, so the newest Matches row is the one inserted above.
     insert_participant_sql = """
         INSERT INTO MatchParticipants (match_id, user_id, team, result)
-        VALUES (?, ?, ?, ?)
+        VALUES ((SELECT MAX(match_id) FROM Matches), ?, ?, ?)
     """
 
-    try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
-            # Insert Match
-            match_res = await client.execute(insert_match_sql, [
-                timestamp, game_mode, stake, winner_team, blue_score_sets, orange_score_sets, score_details
-            ])
+    upsert_earnings_sql = """
+        INSERT INTO Earnings (user_id, game_mode, net)
+        VALUES (?, ?, ?)
+        ON CONFLICT(user_id, game_mode) DO UPDATE SET net = net + excluded.net
+    """
+
+    statements = [(insert_match_sql, [
+        timestamp, game_mode, stake, winner_team, blue_score_sets, orange_score_sets, score_details
+    ])]
+    for p in participants:
+        statements.append((insert_participant_sql, [str(p['user_id']), p['team'], p['result']]))
+        net = stake if p['result'] == 'WIN' else -stake
+        statements.append((upsert_earnings_sql, [str(p['user_id']), game_mode, net]))
+    return statements
+
+async def save_match_record(
+    timestamp: int,
+    game_mode: int,
+    stake: int,
+    winner_team: str,
+    blue_score_sets: int,
+    orange_score_sets: int,
+    score_details: str,
+    participants: List[Dict[str, Any]]
+) -> int:
+    """
+    Saves a match record and its participants atomically.
+    participants: List of dicts with keys 'user_id', 'team', 'result'
+    Returns match_id
+    """
+    pool = get_pool()
+    if not pool: return -1
 
-            match_id = match_res.rows[0][0] if match_res.rows else None
+    statements = _match_record_statements(
+        timestamp, game_mode, stake, winner_team, blue_score_sets, orange_score_sets, score_details, participants
+    )
 
-            if match_id:
-                for p in participants:
-                    await client.execute(insert_participant_sql, [
-                        match_id, str(p['user_id']), p['team'], p['result']
-                    ])
-                return match_id
-            return -1
+    try:
+        async with pool.acquire() as client:
+            results = await client.batch(statements)
+            match_res = results[0]
+            return match_res.rows[0][0] if match_res.rows else -1
     except Exception as e:
         print(f"Error saving match record: {e}")
         return -1
 
+async def settle_match(
+    timestamp: int,
+    game_mode: int,
+    stake: int,
+    winner_team: str,
+    blue_score_sets: int,
+    orange_score_sets: int,
+    score_details: str,
+    participants: List[Dict[str, Any]]
+) -> int:
+    """
+    Settles a finished match in a single atomic round trip: the match record,
+    its participants and every participant's Leaderboard stats.
+    Either everything is written or nothing is.
+    participants: List of dicts with keys 'user_id', 'team', 'result', 'goals_scored', 'goals_conceded'
+    Returns match_id (-1 on failure)
+    """
+    pool = get_pool()
+    if not pool: return -1
+
+    statements = _match_record_statements(
+        timestamp, game_mode, stake, winner_team, blue_score_sets, orange_score_sets, score_details, participants
+    )
+
+    if game_mode in [1, 2, 3]:
+        for p in participants:
+            statements.append(_leaderboard_upsert(
+                p['user_id'], game_mode, p['result'] == 'WIN',
+                p.get('goals_scored', 0), p.get('goals_conceded', 0)
+            ))
+    else:
+        print(f"Unsupported team size for stats: {game_mode}")
+
+    try:
+        async with pool.acquire() as client:
+            results = await client.batch(statements)
+    except Exception as e:
+        print(f"Error settling match: {e}")
+        return -1
+
+    for p in participants:
+        LEADERBOARD_INDEX.record_result(p['user_id'], game_mode, p['result'] == 'WIN')
+        _stats_cache.invalidate(str(p['user_id']))
+
+    match_res = results[0]
+    return match_res.rows[0][0] if match_res.rows else -1
+
 async def get_user_matches_history(user_id: int, limit: int = 10):
     """Fetches recent matches for a user."""
-    url, token = get_db_config()
-    if not url: return []
+    pool = get_pool()
+    if not pool: return []
 
     user_id = str(user_id)
 
@@ -329,7 +707,7 @@ async def get_user_matches_history(user_id: int, limit: int = 10):
     """
 
     try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
+        async with pool.acquire() as client:
             res = await client.execute(query, [user_id, limit])
             return res.rows
     except Exception as e:
@@ -338,13 +716,13 @@ async def get_user_matches_history(user_id: int, limit: int = 10):
 
 async def get_match_participants(match_id: int):
     """Fetches all participants for a given match."""
-    url, token = get_db_config()
-    if not url: return []
+    pool = get_pool()
+    if not pool: return []
 
     query = "SELECT user_id, team, result FROM MatchParticipants WHERE match_id = ?"
 
     try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
+        async with pool.acquire() as client:
             res = await client.execute(query, [match_id])
             return res.rows
     except Exception as e:
@@ -352,12 +730,17 @@ async def get_match_participants(match_id: int):
         return []
 
 async def get_user_leaderboard_stats(user_id: int):
-    """Fetches all stats for a user from Leaderboard."""
-    url, token = get_db_config()
-    if not url: return None
+    """Fetches all stats for a user from Leaderboard (cached per user)."""
+    pool = get_pool()
+    if not pool: return None
 
     user_id = str(user_id)
 
+    cached = _stats_cache.get(user_id)
+    if cached is not MISSING:
+        return cached
+    generation = _stats_cache.generation(user_id)
+
     # We need to select all relevant columns
     cols = [
         "1v1_W", "1v1_L", "1v1_GS", "1v1_GC",
@@ -369,7 +752,7 @@ async def get_user_leaderboard_stats(user_id: int):
     query = f"SELECT {', '.join(cols_quoted)} FROM Leaderboard WHERE user_id = ?"
 
     try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
+        async with pool.acquire() as client:
             res = await client.execute(query, [user_id])
             if res.rows:
                 row = res.rows[0]
@@ -377,7 +760,9 @@ async def get_user_leaderboard_stats(user_id: int):
                 stats = {}
                 for i, col in enumerate(cols):
                     stats[col] = row[i]
+                _stats_cache.set(user_id, stats, generation)
                 return stats
+            _stats_cache.set(user_id, None, generation)
             return None
     except Exception as e:
         print(f"Error fetching user stats: {e}")
@@ -385,8 +770,8 @@ async def get_user_leaderboard_stats(user_id: int):
 
 async def add_user_achievement(user_id: int, achievement_id: str):
     """Records a new achievement for a user. Returns True if newly added."""
-    url, token = get_db_config()
-    if not url: return False
+    pool = get_pool()
+    if not pool: return False
 
     user_id = str(user_id)
 
@@ -397,25 +782,34 @@ async def add_user_achievement(user_id: int, achievement_id: str):
     """
 
     try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
+        async with pool.acquire() as client:
             res = await client.execute(query, [user_id, achievement_id, int(time.time())])
-            return res.rows_affected > 0
+            if res.rows_affected > 0:
+                _achievements_cache.invalidate(user_id)
+                return True
+            return False
     except Exception as e:
         print(f"Error adding achievement: {e}")
         return False
 
 async def get_user_achievements(user_id: int):
-    """Fetches all achievements for a user."""
-    url, token = get_db_config()
-    if not url: return []
+    """Fetches all achievements for a user (cached per user)."""
+    pool = get_pool()
+    if not pool: return []
 
     user_id = str(user_id)
 
+    cached = _achievements_cache.get(user_id)
+    if cached is not MISSING:
+        return cached
+    generation = _achievements_cache.generation(user_id)
+
     query = "SELECT achievement_id, unlocked_at FROM UserAchievements WHERE user_id = ?"
 
     try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
+        async with pool.acquire() as client:
             res = await client.execute(query, [user_id])
+            _achievements_cache.set(user_id, res.rows, generation)
             return res.rows
     except Exception as e:
         print(f"Error fetching achievements: {e}")
@@ -425,13 +819,13 @@ async def get_role_holders(team_size: int) -> List[int]:
     """
     Fetches the list of user IDs who currently hold the leader role for a given team size.
     """
-    url, token = get_db_config()
-    if not url: return []
+    pool = get_pool()
+    if not pool: return []
 
     query = "SELECT user_id FROM RoleHolders WHERE team_size = ?"
 
     try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
+        async with pool.acquire() as client:
             res = await client.execute(query, [team_size])
             # Return as list of ints
             return [int(row[0]) for row in res.rows]
@@ -444,14 +838,14 @@ async def update_role_holders(team_size: int, user_ids: List[int]):
     Updates the list of role holders for a given team size.
     Replaces existing entries.
     """
-    url, token = get_db_config()
-    if not url: return
+    pool = get_pool()
+    if not pool: return
 
     delete_query = "DELETE FROM RoleHolders WHERE team_size = ?"
     insert_query = "INSERT INTO RoleHolders (team_size, user_id) VALUES (?, ?)"
 
     try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
+        async with pool.acquire() as client:
             # Delete old
             await client.execute(delete_query, [team_size])
 
@@ -463,66 +857,180 @@ async def update_role_holders(team_size: int, user_ids: List[int]):
 
 # --- Existing functions preserved below (get_leaderboard_data, get_all_winners, bonus stuff) ---
 
-async def get_leaderboard_data(team_size: int):
-    """
-    Retrieves the top 3 players by Wins and Top 3 by Earnings (Net Profit) for a given team size.
-    Earnings = Sum(Won Stakes) - Sum(Lost Stakes).
-    Returns a dictionary: {'wins': [...], 'earnings': [...]}
-    """
-    if team_size not in [1, 2, 3]:
-        return {'wins': [], 'earnings': []}
-
-    url, token = get_db_config()
-    if not url: return {'wins': [], 'earnings': []}
-
+def _top_wins_query(team_size: int, limit: int = 3) -> str:
     wins_col = f"{team_size}v{team_size}_W"
     losses_col = f"{team_size}v{team_size}_L"
 
-    # 1. Top Wins
-    query_wins = f"""
+    return f"""
         SELECT user_id, "{wins_col}", "{losses_col}", ("{wins_col}" * 3 - "{losses_col}") as score
         FROM Leaderboard
         WHERE "{wins_col}" > 0
         ORDER BY "{wins_col}" DESC, score DESC
-        LIMIT 3
+        LIMIT {int(limit)}
     """
 
-    # 2. Top Earnings
-    query_earnings = f"""
-        SELECT mp.user_id,
-               SUM(CASE WHEN mp.result = 'WIN' THEN m.stake ELSE -m.stake END) as earnings
-        FROM MatchParticipants mp
-        JOIN Matches m ON mp.match_id = m.match_id
-        WHERE m.game_mode = {team_size}
-        GROUP BY mp.user_id
-        HAVING earnings > 0
-        ORDER BY earnings DESC
-        LIMIT 3
+# Top Earnings (maintained incrementally by match settlement)
+_TOP_EARNINGS_SQL = """
+    SELECT user_id, net
+    FROM Earnings
+    WHERE game_mode = ? AND net > 0
+    ORDER BY net DESC
+    LIMIT 3
+"""
+
+async def get_leaderboard_data(team_size: int):
+    """
+    Retrieves the top 3 players by Wins and Top 3 by Earnings (Net Profit) for a given team size.
+    Earnings = Sum(Won Stakes) - Sum(Lost Stakes).
+    Returns a dictionary: {'wins': [...], 'earnings': [...]}
     """
+    if team_size not in [1, 2, 3]:
+        return {'wins': [], 'earnings': []}
+
+    pool = get_pool()
+    if not pool: return {'wins': [], 'earnings': []}
+
+    ranking = LEADERBOARD_INDEX.get(team_size)
 
     try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
-            res_wins = await client.execute(query_wins)
-            res_earnings = await client.execute(query_earnings)
+        async with pool.acquire() as client:
+            wins_rows = ranking.top(3) if ranking is not None else (await client.execute(_top_wins_query(team_size))).rows
+            res_earnings = await client.execute(_TOP_EARNINGS_SQL, [team_size])
 
             return {
-                'wins': res_wins.rows,
+                'wins': wins_rows,
                 'earnings': res_earnings.rows
             }
     except Exception as e:
         print(f"Error fetching leaderboard for {team_size}v{team_size}: {e}")
         return {'wins': [], 'earnings': []}
 
-async def get_all_winners(team_size: int):
+async def get_full_leaderboard() -> Dict[int, Dict[str, list]]:
+    """
+    Retrieves get_leaderboard_data() for 1v1, 2v2 and 3v3 in a single batched round trip.
+    Wins come from the in-memory ranking when it is warmed, so only earnings are queried.
+    Returns {team_size: {'wins': [...], 'earnings': [...]}}
     """
-    Retrieves ALL players sorted by wins (desc) and then score (desc).
+    modes = [1, 2, 3]
+    empty = {n: {'wins': [], 'earnings': []} for n in modes}
+
+    pool = get_pool()
+    if not pool: return empty
+
+    statements = [(_TOP_EARNINGS_SQL, [n]) for n in modes]
+    rankings = {n: LEADERBOARD_INDEX.get(n) for n in modes}
+    missing_wins = [n for n in modes if rankings[n] is None]
+    statements += [_top_wins_query(n) for n in missing_wins]
+
+    try:
+        async with pool.acquire() as client:
+            results = await client.batch(statements)
+    except Exception as e:
+        print(f"Error fetching full leaderboard: {e}")
+        return empty
+
+    wins_results = dict(zip(missing_wins, results[len(modes):]))
+    return {
+        n: {
+            'wins': rankings[n].top(3) if rankings[n] is not None else wins_results[n].rows,
+            'earnings': results[i].rows
+        }
+        for i, n in enumerate(modes)
+    }
+
+# Net earnings per user and mode recomputed from the raw match tables.
+_RECOMPUTE_EARNINGS_SQL = """
+    SELECT mp.user_id, m.game_mode,
+           SUM(CASE WHEN mp.result = 'WIN' THEN m.stake ELSE -m.stake END) as net
+    FROM MatchParticipants mp
+    JOIN Matches m ON mp.match_id = m.match_id
+    GROUP BY mp.user_id, m.game_mode
+"""
+
+async def rebuild_earnings() -> bool:
+    """Rebuilds the Earnings table from match history in one atomic batch."""
+    pool = get_pool()
+    if not pool: return False
+
+    statements = [
+        "DELETE FROM Earnings",
+        f"INSERT INTO Earnings (user_id, game_mode, net) {_RECOMPUTE_EARNINGS_SQL}",
+        "UPDATE SystemConfig SET value = 1 WHERE key = 'earnings_backfilled'"
+    ]
+
+    try:
+        async with pool.acquire() as client:
+            await client.batch(statements)
+            return True
+    except Exception as e:
+        print(f"Error rebuilding earnings: {e}")
+        return False
+
+async def backfill_earnings():
+    """One-time job: fills Earnings from existing match history if it was never done."""
+    pool = get_pool()
+    if not pool: return
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute("SELECT value FROM SystemConfig WHERE key = 'earnings_backfilled'")
+            if res.rows and res.rows[0][0]:
+                return
+    except Exception as e:
+        print(f"Error checking earnings backfill: {e}")
+        return
+
+    print("Backfilling Earnings from match history...")
+    if await rebuild_earnings():
+        print("Earnings backfill complete.")
+
+async def check_earnings_consistency() -> List[Any]:
+    """
+    Recomputes earnings from MatchParticipants/Matches and compares them with the Earnings table.
+    Returns rows (user_id, game_mode, expected_net, stored_net) that drifted; empty list if consistent.
+    """
+    pool = get_pool()
+    if not pool: return []
+
+    query = f"""
+        SELECT r.user_id, r.game_mode, r.net, COALESCE(e.net, 0)
+        FROM ({_RECOMPUTE_EARNINGS_SQL}) r
+        LEFT JOIN Earnings e ON e.user_id = r.user_id AND e.game_mode = r.game_mode
+        WHERE COALESCE(e.net, 0) != r.net
+        UNION ALL
+        SELECT e.user_id, e.game_mode, 0, e.net
+        FROM Earnings e
+        WHERE e.net != 0 AND NOT EXISTS (
+            SELECT 1 FROM MatchParticipants mp
+            JOIN Matches m ON mp.match_id = m.match_id
+            WHERE mp.user_id = e.user_id AND m.game_mode = e.game_mode
+        )
+    """
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute(query)
+            for user_id, game_mode, expected, stored in res.rows:
+                print(f"Earnings drift for {user_id} ({game_mode}v{game_mode}): expected {expected}, stored {stored}")
+            return res.rows
+    except Exception as e:
+        print(f"Error checking earnings consistency: {e}")
+        return []
+
+async def get_all_winners(team_size: int, limit: Optional[int] = None):
+    """
+    Retrieves ALL players (or the first `limit`) sorted by wins (desc) and then score (desc).
     Used for role assignment logic to find ties.
     """
     if team_size not in [1, 2, 3]:
         return []
 
-    url, token = get_db_config()
-    if not url: return []
+    ranking = LEADERBOARD_INDEX.get(team_size)
+    if ranking is not None:
+        return ranking.top(limit)
+
+    pool = get_pool()
+    if not pool: return []
 
     wins_col = f"{team_size}v{team_size}_W"
     losses_col = f"{team_size}v{team_size}_L"
@@ -534,24 +1042,45 @@ async def get_all_winners(team_size: int):
         WHERE "{wins_col}" > 0
         ORDER BY "{wins_col}" DESC, score DESC
     """
+    if limit:
+        query += f" LIMIT {int(limit)}"
 
     try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
+        async with pool.acquire() as client:
             res = await client.execute(query)
             return res.rows
     except Exception as e:
         print(f"Error fetching winners for {team_size}v{team_size}: {e}")
         return []
 
+async def get_winners_tie_group(team_size: int, wins: int):
+    """Retrieves all players with exactly `wins` wins, sorted by score (desc)."""
+    ranking = LEADERBOARD_INDEX.get(team_size)
+    if ranking is not None:
+        return ranking.tie_group(wins)
+
+    return [row for row in await get_all_winners(team_size) if row[1] == wins]
+
+async def get_user_rank(user_id: int, team_size: int) -> Optional[int]:
+    """Returns the user's 1-based position in the wins ranking, or None if unranked."""
+    ranking = LEADERBOARD_INDEX.get(team_size)
+    if ranking is not None:
+        return ranking.rank(user_id)
+
+    for i, row in enumerate(await get_all_winners(team_size), 1):
+        if str(row[0]) == str(user_id):
+            return i
+    return None
+
 async def get_bonus_count() -> int:
     """Fetches the number of lucky bonuses awarded so far."""
-    url, token = get_db_config()
-    if not url: return 50
+    pool = get_pool()
+    if not pool: return 50
 
     query = "SELECT value FROM SystemConfig WHERE key = 'lucky_bonus_count'"
 
     try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
+        async with pool.acquire() as client:
             res = await client.execute(query)
             if res.rows:
                 return res.rows[0][0]
@@ -562,13 +1091,370 @@ async def get_bonus_count() -> int:
 
 async def increment_bonus_count(amount: int):
     """Increments the lucky bonus counter."""
-    url, token = get_db_config()
-    if not url: return
+    pool = get_pool()
+    if not pool: return
 
     query = "UPDATE SystemConfig SET value = value + ? WHERE key = 'lucky_bonus_count'"
 
     try:
-        async with libsql_client.create_client(url, auth_token=token) as client:
+        async with pool.acquire() as client:
             await client.execute(query, [amount])
     except Exception as e:
         print(f"Error incrementing bonus count: {e}")
+
+# --- Payout outbox ---
+# Status flow: pending -> sending -> sent | pending (retry) | failed (rejected) | unknown (outcome not known)
+
+async def enqueue_payout(idempotency_key: str, user_id: int, cash: int, bank: int, kind: str, status: str = 'pending') -> Optional[bool]:
+    """
+    Records an intended balance change. A key that already exists is left untouched,
+    so enqueueing the same change twice never pays twice.
+    Returns True if newly recorded, False if the key already existed, None on error.
+    """
+    pool = get_pool()
+    if not pool: return None
+
+    now = int(time.time())
+    query = """
+        INSERT INTO PayoutOutbox (idempotency_key, user_id, cash, bank, kind, status, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(idempotency_key) DO NOTHING
+    """
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute(query, [idempotency_key, str(user_id), cash, bank, kind, status, now, now])
+            return res.rows_affected > 0
+    except Exception as e:
+        print(f"Error enqueueing payout {idempotency_key}: {e}")
+        return None
+
+async def claim_pending_payouts(limit: int) -> List[Any]:
+    """
+    Atomically moves up to `limit` due pending payouts to 'sending' and returns them
+    as rows (idempotency_key, user_id, cash, bank, kind, attempts).
+    """
+    pool = get_pool()
+    if not pool: return []
+
+    now = int(time.time())
+    query = """
+        UPDATE PayoutOutbox
+        SET status = 'sending', attempts = attempts + 1, updated_at = ?
+        WHERE idempotency_key IN (
+            SELECT idempotency_key FROM PayoutOutbox
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, created_at
+            LIMIT ?
+        )
+        RETURNING idempotency_key, user_id, cash, bank, kind, attempts
+    """
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute(query, [now, now, limit])
+            return res.rows
+    except Exception as e:
+        print(f"Error claiming payouts: {e}")
+        return []
+
+async def finish_payouts(results: List[Dict[str, Any]]):
+    """
+    Stores the outcome of sent payouts in one batch.
+    results: List of dicts with keys 'key', 'status', 'error' and optional 'retry_at'
+    """
+    pool = get_pool()
+    if not pool or not results: return
+
+    now = int(time.time())
+    query = """
+        UPDATE PayoutOutbox
+        SET status = ?, last_error = ?, next_attempt_at = ?, updated_at = ?
+        WHERE idempotency_key = ?
+    """
+    statements = [
+        (query, [r['status'], r.get('error'), r.get('retry_at', 0), now, r['key']])
+        for r in results
+    ]
+
+    try:
+        async with pool.acquire() as client:
+            await client.batch(statements)
+    except Exception as e:
+        print(f"Error finishing payouts: {e}")
+
+async def mark_interrupted_payouts() -> List[Any]:
+    """
+    Marks payouts left in 'sending' (the bot stopped mid-request) as 'unknown' so they
+    are not replayed blindly. Returns rows (idempotency_key, user_id, cash, bank, kind).
+    """
+    pool = get_pool()
+    if not pool: return []
+
+    query = """
+        UPDATE PayoutOutbox
+        SET status = 'unknown', last_error = 'interrupted', updated_at = ?
+        WHERE status = 'sending'
+        RETURNING idempotency_key, user_id, cash, bank, kind
+    """
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute(query, [int(time.time())])
+            return res.rows
+    except Exception as e:
+        print(f"Error marking interrupted payouts: {e}")
+        return []
+
+# --- Blocklist ---
+
+async def seed_blocked_words(words: List[str]):
+    """One-time job: copies the built-in list from const.py into BlockedWords."""
+    pool = get_pool()
+    if not pool: return
+
+    now = int(time.time())
+    query = "INSERT INTO BlockedWords (word, added_by, added_at) VALUES (?, NULL, ?) ON CONFLICT(word) DO NOTHING"
+    statements = [(query, [word.lower(), now]) for word in words]
+    statements.append("UPDATE SystemConfig SET value = 1 WHERE key = 'blocked_words_seeded'")
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute("SELECT value FROM SystemConfig WHERE key = 'blocked_words_seeded'")
+            if res.rows and res.rows[0][0]:
+                return
+            await client.batch(statements)
+    except Exception as e:
+        print(f"Error seeding blocked words: {e}")
+
+async def get_blocked_words() -> Optional[List[str]]:
+    """Returns every blocked phrase, or None on error (callers keep their current list)."""
+    pool = get_pool()
+    if not pool: return None
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute("SELECT word FROM BlockedWords ORDER BY added_at, word")
+            return [row[0] for row in res.rows]
+    except Exception as e:
+        print(f"Error fetching blocked words: {e}")
+        return None
+
+async def add_blocked_word(word: str, added_by: int) -> Optional[bool]:
+    """Returns True if added, False if it was already on the list, None on error."""
+    pool = get_pool()
+    if not pool: return None
+
+    query = "INSERT INTO BlockedWords (word, added_by, added_at) VALUES (?, ?, ?) ON CONFLICT(word) DO NOTHING"
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute(query, [word.lower(), str(added_by), int(time.time())])
+            return res.rows_affected > 0
+    except Exception as e:
+        print(f"Error adding blocked word {word!r}: {e}")
+        return None
+
+async def remove_blocked_word(word: str) -> Optional[bool]:
+    """Returns True if removed, False if it was not on the list, None on error."""
+    pool = get_pool()
+    if not pool: return None
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute("DELETE FROM BlockedWords WHERE word = ?", [word.lower()])
+            return res.rows_affected > 0
+    except Exception as e:
+        print(f"Error removing blocked word {word!r}: {e}")
+        return None
+
+# --- Open matches (lobby/result views restored after a restart) ---
+
+async def save_open_match(match_key: str, kind: str, channel_id: int, message_id: int, state: Dict[str, Any],
+                          deadline: Optional[int] = None) -> bool:
+    """
+    Stores the state of an open lobby ('lobby') or unresolved result ('result') view.
+    One row per match: saving the result view replaces the lobby row.
+    """
+    pool = get_pool()
+    if not pool: return False
+
+    query = """
+        INSERT INTO OpenMatches (match_key, kind, channel_id, message_id, state, deadline, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(match_key) DO UPDATE SET
+            kind = excluded.kind, channel_id = excluded.channel_id, message_id = excluded.message_id,
+            state = excluded.state, deadline = excluded.deadline, updated_at = excluded.updated_at
+    """
+
+    try:
+        async with pool.acquire() as client:
+            await client.execute(query, [match_key, kind, str(channel_id), str(message_id), json.dumps(state),
+                                         deadline, int(time.time())])
+            return True
+    except Exception as e:
+        print(f"Error saving open match {match_key}: {e}")
+        return False
+
+async def delete_open_match(match_key: str):
+    pool = get_pool()
+    if not pool: return
+
+    try:
+        async with pool.acquire() as client:
+            await client.execute("DELETE FROM OpenMatches WHERE match_key = ?", [match_key])
+    except Exception as e:
+        print(f"Error deleting open match {match_key}: {e}")
+
+async def get_open_matches() -> List[Dict[str, Any]]:
+    """Returns every stored open match as dicts (state already decoded)."""
+    pool = get_pool()
+    if not pool: return []
+
+    query = "SELECT match_key, kind, channel_id, message_id, state, deadline FROM OpenMatches ORDER BY updated_at"
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute(query)
+    except Exception as e:
+        print(f"Error fetching open matches: {e}")
+        return []
+
+    matches = []
+    for row in res.rows:
+        try:
+            state = json.loads(row[4])
+        except (TypeError, ValueError):
+            print(f"Skipping open match {row[0]} with unreadable state.")
+            continue
+        matches.append({
+            'match_key': row[0],
+            'kind': row[1],
+            'channel_id': int(row[2]),
+            'message_id': int(row[3]),
+            'state': state,
+            'deadline': row[5]
+        })
+    return matches
+
+# --- Achievement state (per-user counters, see commands/rocket/achievements.py) ---
+
+ACHIEVEMENT_STATE_COLUMNS = [
+    "games", "wins_1", "wins_2", "wins_3", "win_streak", "loss_streak",
+    "day", "daily_count", "daily_modes_won", "weekend_count", "unlocked"
+]
+
+def _achievement_state_upsert(user_id: int, state: Dict[str, int]):
+    cols = ", ".join(ACHIEVEMENT_STATE_COLUMNS)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in ACHIEVEMENT_STATE_COLUMNS)
+    query = f"""
+        INSERT INTO AchievementState (user_id, {cols})
+        VALUES (?, {", ".join("?" for _ in ACHIEVEMENT_STATE_COLUMNS)})
+        ON CONFLICT(user_id) DO UPDATE SET {updates}
+    """
+    return query, [str(user_id), *(state.get(c, 0) for c in ACHIEVEMENT_STATE_COLUMNS)]
+
+async def get_achievement_state(user_id: int) -> Optional[Dict[str, int]]:
+    """Returns the user's counters ({} if they have none yet), or None on error."""
+    pool = get_pool()
+    if not pool: return None
+
+    query = f"SELECT {', '.join(ACHIEVEMENT_STATE_COLUMNS)} FROM AchievementState WHERE user_id = ?"
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute(query, [str(user_id)])
+    except Exception as e:
+        print(f"Error fetching achievement state for {user_id}: {e}")
+        return None
+
+    if not res.rows:
+        return {}
+    return dict(zip(ACHIEVEMENT_STATE_COLUMNS, res.rows[0]))
+
+async def save_achievement_state(user_id: int, state: Dict[str, int], new_achievements: List[str]) -> bool:
+    """Writes the user's counters and their newly unlocked achievements in one atomic batch."""
+    pool = get_pool()
+    if not pool: return False
+
+    now = int(time.time())
+    statements = [_achievement_state_upsert(user_id, state)]
+    for achievement_id in new_achievements:
+        statements.append((
+            "INSERT INTO UserAchievements (user_id, achievement_id, unlocked_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id, achievement_id) DO NOTHING",
+            [str(user_id), achievement_id, now]
+        ))
+
+    try:
+        async with pool.acquire() as client:
+            await client.batch(statements)
+    except Exception as e:
+        print(f"Error saving achievement state for {user_id}: {e}")
+        return False
+
+    if new_achievements:
+        _achievements_cache.invalidate(str(user_id))
+    return True
+
+async def is_achievement_state_backfilled() -> Optional[bool]:
+    pool = get_pool()
+    if not pool: return None
+
+    try:
+        async with pool.acquire() as client:
+            res = await client.execute("SELECT value FROM SystemConfig WHERE key = 'achievement_state_backfilled'")
+            return bool(res.rows and res.rows[0][0])
+    except Exception as e:
+        print(f"Error checking achievement state backfill: {e}")
+        return None
+
+async def get_achievement_backfill_data(user_id: Optional[int] = None):
+    """
+    Returns (totals, results, achievements): lifetime (user_id, 1v1_W, 1v1_L, 2v2_W, ...) from
+    Leaderboard, every (user_id, timestamp, game_mode, result) in play order, and every
+    (user_id, achievement_id). Only `user_id`'s rows if given. None on error.
+    """
+    pool = get_pool()
+    if not pool: return None
+
+    cols = [f"{n}v{n}_{s}" for n in [1, 2, 3] for s in ["W", "L"]]
+    cols_quoted = [f'"{c}"' for c in cols]
+    where = "WHERE user_id = ?" if user_id is not None else ""
+    args = [str(user_id)] if user_id is not None else []
+    totals_query = f"SELECT user_id, {', '.join(cols_quoted)} FROM Leaderboard {where}"
+
+    results_query = f"""
+        SELECT mp.user_id, m.timestamp, m.game_mode, mp.result
+        FROM MatchParticipants mp
+        JOIN Matches m ON mp.match_id = m.match_id
+        {"WHERE mp.user_id = ?" if user_id is not None else ""}
+        ORDER BY m.timestamp, m.match_id
+    """
+
+    try:
+        async with pool.acquire() as client:
+            totals = await client.execute(totals_query, args)
+            results = await client.execute(results_query, args)
+            achievements = await client.execute(f"SELECT user_id, achievement_id FROM UserAchievements {where}", args)
+            return totals.rows, results.rows, achievements.rows
+    except Exception as e:
+        print(f"Error fetching match results: {e}")
+        return None
+
+async def replace_achievement_states(states: Dict[Any, Dict[str, int]]) -> bool:
+    """Rebuilds AchievementState from `states` (user_id -> counters) in one atomic batch."""
+    pool = get_pool()
+    if not pool: return False
+
+    statements = ["DELETE FROM AchievementState"]
+    statements += [_achievement_state_upsert(user_id, state) for user_id, state in states.items()]
+    statements.append("UPDATE SystemConfig SET value = 1 WHERE key = 'achievement_state_backfilled'")
+
+    try:
+        async with pool.acquire() as client:
+            await client.batch(statements)
+            return True
+    except Exception as e:
+        print(f"Error rebuilding achievement state: {e}")
+        return False
@@ -5,7 +5,13 @@ from dotenv import load_dotenv
 import asyncio
 
 from commands.unbany.tickets import TicketButton
-from database import init_system_tables, get_bonus_count
+from commands.rocket.achievements import backfill_achievement_state
+from commands.rocket.match import restore_match_views
+from commands.rocket.matchmaking import MATCHMAKER
+from commands.unbelievable_API.client import UNBELIEVABOAT
+from commands.unbelievable_API.outbox import PAYOUTS
+from const import MATCH_LOGS_CHANNEL_ID
+from database import init_system_tables, get_bonus_count, init_db_pool, close_db_pool, check_earnings_consistency
 
 load_dotenv()
 
@@ -23,16 +29,40 @@ intents.guilds = True
 intents.members = True
 
 bot = commands.Bot(command_prefix="_", intents=intents, chunk_guilds_at_startup=False)
+views_restored = False
 
 
 @bot.event
 async def on_ready():
     await init_system_tables()
+    # Achievement counters for players who played before AchievementState existed
+    await backfill_achievement_state()
+
+    # Blocklist is stored in the database (editable with /blocklist_add and /blocklist_remove)
+    events = bot.get_cog("Events")
+    if events:
+        await events.reload_blocked_words()
+
+    # Replay payouts queued before a restart and start draining new ones
+    await PAYOUTS.start(notify=notify_match_logs)
+
+    # Bring back open lobbies and unresolved results (on_ready also fires after reconnects)
+    global views_restored
+    if not views_restored:
+        views_restored = True
+        restored = await restore_match_views(bot, notify=notify_match_logs)
+        print(f"Restored match views: {restored}")
+
+    MATCHMAKER.start(bot)
 
     # Print Bonus Limit Status
     bonus_count = await get_bonus_count()
     print(f"Lucky Bonus Limit: {bonus_count}/50")
 
+    # Verify the materialized Earnings table against match history
+    drift = await check_earnings_consistency()
+    print(f"Earnings consistency: {'OK' if not drift else f'{len(drift)} rows drifted'}")
+
     await bot.change_presence(activity=discord.CustomActivity(name="Rakietowe 1v1, 2v2, 3v3"))
     print(f"Logged as {bot.user}")
     await bot.tree.sync(guild=GUILD)
@@ -48,6 +78,12 @@ async def on_ready():
         await channel.send(embed=embed, view=TicketButton())
 
 
+async def notify_match_logs(message: str):
+    channel = bot.get_channel(MATCH_LOGS_CHANNEL_ID)
+    if channel:
+        await channel.send(message)
+
+
 async def load_extensions():
     await bot.load_extension("events")
     await bot.load_extension("slash_commands")
@@ -55,8 +91,15 @@ async def load_extensions():
 
 async def main():
     async with bot:
-        await load_extensions()
-        await bot.start(TOKEN)
+        await init_db_pool()
+        try:
+            await load_extensions()
+            await bot.start(TOKEN)
+        finally:
+            await MATCHMAKER.stop()
+            await PAYOUTS.stop()
+            await UNBELIEVABOAT.close()
+            await close_db_pool()
 
 
 asyncio.run(main())
@@ -1,52 +1,254 @@
+import asyncio
+from typing import Dict, FrozenSet, Iterable, List
+
 import discord
 from discord.ext import commands
-from const import BLOCKED_WORDS, LOG_CHANNEL_ID, ADMIN_USER_ID
+
+from cache import TTLCache, MISSING
+from commands.mod.auto_reply import AutoReplyCooldowns, triggers_for_channel
+from commands.mod.duplicate_detector import DuplicateDetector
+from commands.mod.scam_detection import ScamDetector
+from commands.rocket.ranks import RANKS
+from const import AUTO_REPLIES, BLOCKED_WORDS, LOG_CHANNEL_ID, ADMIN_USER_ID
+from database import get_blocked_words
+
+# Users banned (or being banned) recently. Their further messages are only deleted.
+BANNED_CACHE_SIZE = 1000
+BANNED_CACHE_TTL = 3600  # seconds
+
+# The ban itself deletes the user's messages from this window in every channel
+SCAM_PURGE_SECONDS = 3600
+
+# Channels whose name contains this are never scanned (resolved to ids at ready/channel events)
+SKIP_CHANNEL_NAME = 'logi'
 
 
 class Events(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        # Immutable snapshot, replaced as a whole when the list changes, so on_message
+        # never sees a half-built matcher and never touches the database.
+        # Starts from the built-in list until reload_blocked_words() reads the BlockedWords table.
+        # Auto-reply triggers are compiled into the same matcher.
+        self.scam_detector = ScamDetector(BLOCKED_WORDS, triggers=AUTO_REPLIES)
+        self.reply_cooldowns = AutoReplyCooldowns(AUTO_REPLIES)
+        # Same link message from many accounts within a minute -> deleted and reported to admins
+        self.duplicate_detector = DuplicateDetector(min_users=4, window=60)
+        self.banned_users = TTLCache(BANNED_CACHE_SIZE, BANNED_CACHE_TTL)
+        self._ban_locks: Dict[int, asyncio.Lock] = {}
+        self._raid_messages: Dict[int, List[discord.Message]] = {}  # user_id -> flagged messages during the ban
+        self.skip_channel_ids: FrozenSet[int] = frozenset()
+
+    def rebuild_blocked_words(self, words: Iterable[str]):
+        self.scam_detector = ScamDetector(words, triggers=AUTO_REPLIES)
+
+    def _refresh_skip_channels(self):
+        self.skip_channel_ids = frozenset(
+            channel.id
+            for guild in self.bot.guilds
+            for channel in [*guild.channels, *guild.threads]
+            if SKIP_CHANNEL_NAME in channel.name
+        )
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self._refresh_skip_channels()
+        RANKS.build(self.bot.guilds)
+
+    # Role id -> rank map used for match joins and matchmaking (commands/rocket/ranks.py)
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role):
+        RANKS.build(self.bot.guilds)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if before.name != after.name or before.position != after.position:
+            RANKS.build(self.bot.guilds)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        RANKS.build(self.bot.guilds)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        self._refresh_skip_channels()
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        if before.name != after.name:
+            self._refresh_skip_channels()
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        self._refresh_skip_channels()
+
+    @commands.Cog.listener()
+    async def on_thread_create(self, thread: discord.Thread):
+        if SKIP_CHANNEL_NAME in thread.name:
+            self.skip_channel_ids = self.skip_channel_ids | {thread.id}
+
+    @commands.Cog.listener()
+    async def on_thread_update(self, before: discord.Thread, after: discord.Thread):
+        if before.name != after.name:
+            self._refresh_skip_channels()
+
+    async def reload_blocked_words(self) -> bool:
+        """Recompiles the matcher from the database. Keeps the current one if the read fails."""
+        words = await get_blocked_words()
+        if words is None:
+            return False
+        self.rebuild_blocked_words(words)
+        return True
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         # Skip processing for logs channels, bot messages
-        if message.author.bot or 'logi' in str(message.channel):
+        if message.author.bot or message.channel.id in self.skip_channel_ids:
             return
 
-        if 'ustawienia' in str(message.content):
-            await message.reply('[Ustawienia Edka](<https://www.youtube.com/watch?v=PeMm2dlzF3k>)')
+        # Attachment-only and short ASCII messages can't match any rule
+        content = message.content
+        if not content or not self.scam_detector.might_match(content):
+            return
 
-        # Check for blocked words
-        message_content = message.content.lower()
-        if any(blocked_word in message_content for blocked_word in BLOCKED_WORDS):
+        # One pass for blocked words, lookalike domains (normalized against leetspeak/homoglyphs)
+        # and auto-reply triggers
+        scam, triggers = self.scam_detector.scan(content)
+        if scam:
             await self._handle_blocked_message(message)
+            return
+
+        for trigger in triggers_for_channel(triggers, message.channel.id):
+            if self.reply_cooldowns.take(trigger, message.channel.id, message.author.id):
+                await message.reply(trigger['reply'])
+
+        # Scam waves not on the list yet: near-identical messages from several accounts
+        flagged = self.duplicate_detector.observe(message.author.id, content, message)
+        if flagged:
+            await self._handle_duplicate_messages(flagged)
+
+    @commands.Cog.listener()
+    async def on_member_ban(self, guild: discord.Guild, user: discord.User):
+        # Manual bans don't necessarily purge, so no purge time is recorded
+        if self.banned_users.get(user.id) is MISSING:
+            self.banned_users.set(user.id, None)
+
+    @commands.Cog.listener()
+    async def on_member_unban(self, guild: discord.Guild, user: discord.User):
+        self.banned_users.invalidate(user.id)
 
     async def _handle_blocked_message(self, message: discord.Message):
+        user_id = message.author.id
+
+        # A compromised account spams many channels at once: only the first message
+        # runs the ban pipeline. The rest wait for it on the user's lock, then see
+        # whether the ban already purged them.
+        if self.banned_users.get(user_id) is MISSING:
+            self._raid_messages.setdefault(user_id, []).append(message)
+            async with self._ban_locks.setdefault(user_id, asyncio.Lock()):
+                if self.banned_users.get(user_id) is MISSING:
+                    try:
+                        purged_at = await self._ban_for_scam(message)
+                    except discord.HTTPException as e:
+                        # Don't retry (and re-DM) on every message; they are just deleted
+                        print(f"Error banning {user_id} for scam: {e}")
+                        purged_at = None
+                    self.banned_users.set(user_id, purged_at)
+                    # Waiters still hold the lock object; newcomers now hit the cache
+                    self._ban_locks.pop(user_id, None)
+                    self._raid_messages.pop(user_id, None)
+
+        # Messages sent before a purging ban are already gone
+        purged_at = self.banned_users.get(user_id)
+        if purged_at not in (None, MISSING) and message.created_at <= purged_at:
+            return
+        await self._delete_quietly(message)
+
+    async def _handle_duplicate_messages(self, flagged: List[discord.Message]):
+        """
+        Near-identical link messages from several accounts. Unlike blocklist hits they can
+        be innocent (one link shared around), so they are only deleted and reported; an
+        admin decides about bans. The log gets one embed when a wave is first detected.
+        """
+        for message in flagged:
+            await self._delete_quietly(message)
+
+        if len(flagged) < 2:
+            return  # later messages of an already reported wave
         log_channel = self.bot.get_channel(LOG_CHANNEL_ID)
+        if log_channel:
+            await log_channel.send(f"<@{ADMIN_USER_ID}>", embed=self._duplicate_wave_embed(flagged))
 
-        # Check if user is already banned
+    @staticmethod
+    def _duplicate_wave_embed(flagged: List[discord.Message]) -> discord.Embed:
+        authors = list(dict.fromkeys(f"{m.author.mention} (`{m.author.id}`)" for m in flagged))
+        channels = list(dict.fromkeys(m.channel.mention for m in flagged))
+        embed = discord.Embed(
+            title="⚠️ Powtarzająca się wiadomość - usunięto",
+            description=f"`{flagged[0].content[:1000]}`",
+            color=discord.Color.orange()
+        )
+        embed.add_field(name="Autorzy", value="\n".join(authors)[:1024], inline=True)
+        embed.add_field(name="Kanały", value=", ".join(channels)[:1024], inline=True)
+        embed.set_footer(text="Sprawdź, czy to scam - nikt nie został zbanowany automatycznie.")
+        return embed
+
+    @staticmethod
+    async def _delete_quietly(message: discord.Message):
         try:
-            await message.guild.fetch_ban(message.author)
             await message.delete()
-            return
         except discord.NotFound:
-            pass  # User not banned -> continue processing
-
-        # Delete message and notify channel
-        await message.delete()
-        await message.channel.send(f'{message.author.mention} banned.')
+            pass
 
-        # Log
-        await log_channel.send(f'🚨 {message.author.mention} scam: `{message.content}`')
+    async def _ban_for_scam(self, message: discord.Message):
+        """
+        Bans the author and lets Discord purge their recent messages in every channel,
+        then posts one summary embed to the log channel.
+        Returns the time up to which messages were purged, or None if nothing was.
+        """
+        # Check if user is already banned (e.g. by hand, before this cache saw it)
+        try:
+            await message.guild.fetch_ban(message.author)
+            return None
+        except discord.NotFound:
+            pass  # User not banned -> continue processing
 
-        # Send DM to user
+        # DM has to go out before the ban, while we still share the server
         try:
             await self._send_ban_dm(message)
+            dm_sent = True
         except discord.Forbidden:
-            await log_channel.send(f'⚠️ Nie udało się wysłać DM do {message.author.mention}.')
+            dm_sent = False
 
-        # Ban the user
-        await message.guild.ban(message.author, reason=f'Rakietowy scam: {message.content}')
+        # One call instead of a delete per channel
+        await message.guild.ban(
+            message.author,
+            reason=f'Rakietowy scam: {message.content}',
+            delete_message_seconds=SCAM_PURGE_SECONDS
+        )
+        purged_at = discord.utils.utcnow()
+
+        await message.channel.send(f'{message.author.mention} banned.')
+
+        flagged = self._raid_messages.pop(message.author.id, [message])
+        log_channel = self.bot.get_channel(LOG_CHANNEL_ID)
+        if log_channel:
+            await log_channel.send(embed=self._raid_summary_embed(message, flagged, dm_sent))
+        return purged_at
+
+    @staticmethod
+    def _raid_summary_embed(message: discord.Message, flagged: List[discord.Message], dm_sent: bool) -> discord.Embed:
+        channels = list(dict.fromkeys(m.channel.mention for m in flagged))
+        embed = discord.Embed(
+            title="🚨 Scam - ban",
+            description=f"{message.author.mention} (`{message.author.id}`)\n`{message.content[:1000]}`",
+            color=discord.Color.red()
+        )
+        embed.add_field(name="Wiadomości", value=str(len(flagged)), inline=True)
+        embed.add_field(name="Kanały", value=", ".join(channels)[:1024], inline=True)
+        embed.add_field(name="DM", value="wysłany" if dm_sent else "⚠️ nie udało się wysłać", inline=True)
+        embed.set_footer(text=f"Usunięto wiadomości z ostatnich {SCAM_PURGE_SECONDS // 60} min.")
+        return embed
 
     async def _send_ban_dm(self, message: discord.Message):
         await message.author.send(
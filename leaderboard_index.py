@@ -0,0 +1,106 @@
+import bisect
+from typing import Dict, List, Optional, Tuple
+
+# Row format matches the Leaderboard SQL queries: (user_id, wins, losses, score)
+LeaderboardRow = Tuple[str, int, int, int]
+
+
+class RankedLeaderboard:
+    """
+    In-memory ranking of one team size, ordered like the Leaderboard SQL
+    (wins DESC, then score = wins * 3 - losses DESC). Only players with at least
+    one win are ranked, same as `WHERE "NvN_W" > 0`.
+
+    Rank and tie-group lookups are binary searches over a sorted key list;
+    top-k is a slice. Updates re-position a single player.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int, str]] = []  # (-wins, -score, user_id), sorted
+        self._stats: Dict[str, Tuple[int, int]] = {}  # user_id -> (wins, losses)
+
+    @staticmethod
+    def _key(user_id: str, wins: int, losses: int) -> Tuple[int, int, str]:
+        return -wins, -(wins * 3 - losses), user_id
+
+    @staticmethod
+    def _row(key: Tuple[int, int, str]) -> LeaderboardRow:
+        neg_wins, neg_score, user_id = key
+        wins = -neg_wins
+        score = -neg_score
+        return user_id, wins, wins * 3 - score, score
+
+    def load(self, rows: List[Tuple[str, int, int]]):
+        """Replaces the index contents with (user_id, wins, losses) rows."""
+        self._stats = {str(user_id): (wins or 0, losses or 0) for user_id, wins, losses in rows}
+        self._keys = sorted(
+            self._key(user_id, wins, losses)
+            for user_id, (wins, losses) in self._stats.items()
+            if wins > 0
+        )
+
+    def set_stats(self, user_id, wins: int, losses: int):
+        user_id = str(user_id)
+        old = self._stats.get(user_id)
+        if old and old[0] > 0:
+            old_key = self._key(user_id, *old)
+            i = bisect.bisect_left(self._keys, old_key)
+            if i < len(self._keys) and self._keys[i] == old_key:
+                del self._keys[i]
+
+        self._stats[user_id] = (wins, losses)
+        if wins > 0:
+            bisect.insort(self._keys, self._key(user_id, wins, losses))
+
+    def record_result(self, user_id, is_win: bool):
+        wins, losses = self._stats.get(str(user_id), (0, 0))
+        if is_win:
+            wins += 1
+        else:
+            losses += 1
+        self.set_stats(user_id, wins, losses)
+
+    def top(self, k: Optional[int] = None) -> List[LeaderboardRow]:
+        keys = self._keys if k is None else self._keys[:k]
+        return [self._row(key) for key in keys]
+
+    def rank(self, user_id) -> Optional[int]:
+        """1-based position of the user, or None if they have no wins."""
+        user_id = str(user_id)
+        stats = self._stats.get(user_id)
+        if not stats or stats[0] <= 0:
+            return None
+        return bisect.bisect_left(self._keys, self._key(user_id, *stats)) + 1
+
+    def tie_group(self, wins: int) -> List[LeaderboardRow]:
+        """All players with exactly `wins` wins, ordered by score DESC."""
+        start = bisect.bisect_left(self._keys, (-wins,))
+        end = bisect.bisect_left(self._keys, (-wins + 1,))
+        return [self._row(key) for key in self._keys[start:end]]
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class LeaderboardIndex:
+    """Per team size rankings, warmed from the Leaderboard table on startup."""
+
+    def __init__(self):
+        self.ready = False
+        self.modes: Dict[int, RankedLeaderboard] = {n: RankedLeaderboard() for n in [1, 2, 3]}
+
+    def load(self, team_size: int, rows: List[Tuple[str, int, int]]):
+        self.modes[team_size].load(rows)
+
+    def record_result(self, user_id, team_size: int, is_win: bool):
+        if self.ready and team_size in self.modes:
+            self.modes[team_size].record_result(user_id, is_win)
+
+    def get(self, team_size: int) -> Optional[RankedLeaderboard]:
+        """Returns the ranking for a team size, or None until the index is warmed."""
+        if not self.ready:
+            return None
+        return self.modes.get(team_size)
+
+
+LEADERBOARD_INDEX = LeaderboardIndex()
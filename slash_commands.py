@@ -6,15 +6,21 @@ from discord.ext import commands
 
 from commands.gemini.ask_gemini import handle_gemini_command
 from commands.mod.change_presence import PresenceType, change_presence
-from commands.rocket.match import MatchView, get_user_balance, MatchType
+from commands.rocket.match import MatchView, get_user_balance, MatchType, get_rank
+from commands.rocket.matchmaking import MATCHMAKER, QueueEntry
 from commands.shop.remove_rank import check_and_remove_role
 from commands.unbelievable_API.add_money import add_money_unbelievable
+from commands.unbelievable_API.client import UNBELIEVABOAT
 from const import EDEK_USER_ID
 from database import (
-    get_leaderboard_data,
+    get_full_leaderboard,
     get_user_leaderboard_stats,
     get_user_matches_history,
-    get_user_achievements
+    get_user_achievements,
+    get_user_rank,
+    add_blocked_word,
+    remove_blocked_word,
+    get_cache_stats
 )
 from commands.rocket.achievements_config import ACHIEVEMENTS
 
@@ -66,6 +72,48 @@ class SlashCommands(commands.Cog):
         await match_view.send_initial_message(interaction)
         await interaction.followup.send(f'Utworzono mecz {team_size}v{team_size}!', ephemeral=True)
 
+    @app_commands.command(name="queue", description="Dołącz do kolejki - bot sam dobierze przeciwników.")
+    @app_commands.describe(
+        stake="Maksymalna stawka meczu (min. 200)",
+        match_type="Tryb gry (BO3 lub One Game)",
+        team_size="Rozmiar drużyny (1v1, 2v2, 3v3)"
+    )
+    @app_commands.choices(team_size=[
+        app_commands.Choice(name="1v1", value=1),
+        app_commands.Choice(name="2v2", value=2),
+        app_commands.Choice(name="3v3", value=3)
+    ])
+    @app_commands.guilds(discord.Object(id=GUILD_ID))
+    async def queue_join(self, interaction: discord.Interaction, stake: int, match_type: MatchType, team_size: int = 1):
+        if stake < 200:
+            await interaction.response.send_message("Minimalna stawka to 200.", ephemeral=True)
+            return
+
+        if interaction.user.id in MATCHMAKER:
+            await interaction.response.send_message("Już jesteś w kolejce! Użyj /queue_leave, aby ją opuścić.", ephemeral=True)
+            return
+
+        user_balance = await get_user_balance(interaction.user.id)
+
+        if user_balance < stake:
+            await interaction.response.send_message("Masz za mało kasy!", ephemeral=True)
+            return
+
+        MATCHMAKER.enqueue(QueueEntry(interaction.user, stake, team_size, match_type, get_rank(interaction.user)))
+        await interaction.response.send_message(
+            f"Dołączyłeś do kolejki {team_size}v{team_size} (stawka do {stake} 💰). "
+            f"Graczy w kolejce: {len(MATCHMAKER)}. Gdy mecz będzie gotowy, zostaniesz oznaczony w wątku.",
+            ephemeral=True
+        )
+
+    @app_commands.command(name="queue_leave", description="Opuść kolejkę meczową.")
+    @app_commands.guilds(discord.Object(id=GUILD_ID))
+    async def queue_leave(self, interaction: discord.Interaction):
+        if MATCHMAKER.leave(interaction.user.id):
+            await interaction.response.send_message("Opuściłeś kolejkę.", ephemeral=True)
+        else:
+            await interaction.response.send_message("Nie jesteś w kolejce.", ephemeral=True)
+
     @app_commands.command(name="return_role", description="Zwróć rangę kupioną w serwerowym sklepie za 50% ceny.")
     @app_commands.guilds(discord.Object(id=GUILD_ID))
     async def return_role(self, interaction: discord.Interaction, role: str):
@@ -114,6 +162,81 @@ class SlashCommands(commands.Cog):
 
         await interaction.followup.send('Wszystkie zaproszenia zostały usunięte.', ephemeral=True)
 
+    @app_commands.command(name='blocklist_add', description="Dodaje frazę do listy scamów (ban za wiadomość).")
+    @app_commands.guilds(discord.Object(id=GUILD_ID))
+    @app_commands.default_permissions(administrator=True)
+    async def blocklist_add(self, interaction: Interaction, phrase: str):
+        await interaction.response.defer(ephemeral=True)
+        phrase = phrase.strip()
+        if not phrase:
+            await interaction.followup.send('Fraza nie może być pusta.', ephemeral=True)
+            return
+
+        added = await add_blocked_word(phrase, interaction.user.id)
+        if added is None:
+            await interaction.followup.send('Coś poszło nie tak. Spróbuj ponownie!', ephemeral=True)
+            return
+
+        await self._reload_blocklist()
+        if added:
+            await interaction.followup.send(f'Dodano `{phrase}` do listy scamów.', ephemeral=True)
+        else:
+            await interaction.followup.send(f'`{phrase}` już jest na liście.', ephemeral=True)
+
+    @app_commands.command(name='blocklist_remove', description="Usuwa frazę z listy scamów.")
+    @app_commands.guilds(discord.Object(id=GUILD_ID))
+    @app_commands.default_permissions(administrator=True)
+    async def blocklist_remove(self, interaction: Interaction, phrase: str):
+        await interaction.response.defer(ephemeral=True)
+        removed = await remove_blocked_word(phrase.strip())
+        if removed is None:
+            await interaction.followup.send('Coś poszło nie tak. Spróbuj ponownie!', ephemeral=True)
+            return
+
+        await self._reload_blocklist()
+        if removed:
+            await interaction.followup.send(f'Usunięto `{phrase}` z listy scamów.', ephemeral=True)
+        else:
+            await interaction.followup.send(f'`{phrase}` nie ma na liście.', ephemeral=True)
+
+    @app_commands.command(name='blocklist', description="Wyświetla listę scamów.")
+    @app_commands.guilds(discord.Object(id=GUILD_ID))
+    @app_commands.default_permissions(administrator=True)
+    async def blocklist(self, interaction: Interaction):
+        events = self.bot.get_cog("Events")
+        phrases = events.scam_detector.phrases if events else ()
+        listing = "\n".join(f"`{p}`" for p in phrases) or "Lista jest pusta."
+        await interaction.response.send_message(listing[:2000], ephemeral=True)
+
+    @app_commands.command(name='cache_stats', description="Wyświetla statystyki cache statystyk i osiągnięć.")
+    @app_commands.guilds(discord.Object(id=GUILD_ID))
+    @app_commands.default_permissions(administrator=True)
+    async def cache_stats(self, interaction: Interaction):
+        lines = []
+        for name, stats in get_cache_stats().items():
+            lookups = stats['hits'] + stats['misses']
+            hit_rate = f"{stats['hits'] / lookups:.0%}" if lookups else "-"
+            lines.append(f"{name}: {stats['size']} wpisów, {stats['hits']} trafień, "
+                         f"{stats['misses']} chybień (hit rate {hit_rate})")
+        await interaction.response.send_message("```\n" + "\n".join(lines) + "\n```", ephemeral=True)
+
+    @app_commands.command(name='api_stats', description="Wyświetla statystyki zapytań do UnbelievaBoat.")
+    @app_commands.guilds(discord.Object(id=GUILD_ID))
+    @app_commands.default_permissions(administrator=True)
+    async def api_stats(self, interaction: Interaction):
+        lines = [
+            f"{endpoint}: {m['count']} zapytań, {m['errors']} błędów, {m['retries']} ponowień, "
+            f"śr. {m['avg_ms']} ms, max {m['max_ms']:.0f} ms"
+            for endpoint, m in sorted(UNBELIEVABOAT.metrics.summary().items())
+        ]
+        listing = "\n".join(lines) or "Brak zapytań od startu bota."
+        await interaction.response.send_message(f"```\n{listing[:1990]}\n```", ephemeral=True)
+
+    async def _reload_blocklist(self):
+        events = self.bot.get_cog("Events")
+        if events:
+            await events.reload_blocked_words()
+
     @app_commands.command(name='ask', description='Zadaj pytanie sztucznej inteligencji.')
     @app_commands.guilds(discord.Object(id=GUILD_ID))
     async def ask_ai(self, interaction: Interaction, question: str):
@@ -131,8 +254,10 @@ class SlashCommands(commands.Cog):
         )
         embed.set_footer(text="Statystyki odświeżane po każdym meczu.")
 
+        leaderboard = await get_full_leaderboard()
+
         for team_size in [1, 2, 3]:
-            data = await get_leaderboard_data(team_size)
+            data = leaderboard[team_size]
             wins_list = data['wins']
             earnings_list = data['earnings']
 
@@ -233,9 +358,12 @@ class SlashCommands(commands.Cog):
             diff = gs - gc
             diff_str = f"+{diff}" if diff > 0 else str(diff)
 
+            rank = await get_user_rank(user.id, mode)
+            rank_str = f"\nRanking: #{rank}" if rank else ""
+
             embed.add_field(
                 name=f"{mode}v{mode}",
-                value=f"W/L: {w}/{l} ({mode_wr}%)\nGole: {gs}:{gc} ({diff_str})",
+                value=f"W/L: {w}/{l} ({mode_wr}%)\nGole: {gs}:{gc} ({diff_str}){rank_str}",
                 inline=True
             )
 
@@ -0,0 +1,90 @@
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+from const import BLOCKED_WORDS
+from events import Events
+
+# Replays a synthetic message stream through Events.on_message and reports the
+# per-message cost, next to the checks on_message used to run on every message.
+# Run from the repo root:
+#   python -m tests.bench_on_message
+
+MESSAGE_COUNT = 20000
+LOG_CHANNEL = SimpleNamespace(id=1, name="logi-serwera")
+CHAT_CHANNEL = SimpleNamespace(id=2, name="ogolny")
+
+SHORT = ["gg", "xd", "ok", "nice", "ggwp", "kto gra?", "hej", ":)", "<:pog:1234>"]
+SENTENCES = [
+    "ktoś chętny na 2v2 o 500 dzisiaj wieczorem?",
+    "ale mecz, ostatni gol w dogrywce był niesamowity",
+    "link do zapisów na turniej: discord.gg/rakieta",
+    "Ｃｏ ｔｏ ｚａ ｓｅｒｗｅｒ",
+    "jutro turniej 3v3, zapisy na kanale meczowym",
+]
+
+
+class _Channel(SimpleNamespace):
+    def __str__(self):
+        return self.name
+
+
+def _stream(rng):
+    messages = []
+    for i in range(MESSAGE_COUNT):
+        roll = rng.random()
+        channel = _Channel(**vars(LOG_CHANNEL if roll < 0.1 else CHAT_CHANNEL))
+        if roll < 0.3:
+            content = ""  # attachment/sticker only
+        elif roll < 0.65:
+            content = rng.choice(SHORT)
+        else:
+            content = rng.choice(SENTENCES) + " " + str(rng.randrange(1000))
+        messages.append(SimpleNamespace(author=SimpleNamespace(bot=False, id=rng.randrange(500)), channel=channel, content=content))
+    return messages
+
+
+def _legacy_check(message, words):
+    # What on_message did for every message before the pre-filter
+    if message.author.bot or 'logi' in str(message.channel):
+        return False
+    if 'ustawienia' in str(message.content):
+        pass
+    content = message.content.lower()
+    return any(word in content for word in words)
+
+
+async def _replay(cog, messages):
+    for message in messages:
+        await cog.on_message(message)
+
+
+def run():
+    messages = _stream(random.Random(99))
+    bot = SimpleNamespace(guilds=[SimpleNamespace(channels=[LOG_CHANNEL, CHAT_CHANNEL], threads=[])])
+    cog = Events(bot)
+    cog._refresh_skip_channels()
+    words = [w.lower() for w in BLOCKED_WORDS]
+
+    start = time.perf_counter()
+    for message in messages:
+        _legacy_check(message, words)
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    asyncio.run(_replay(cog, messages))
+    current = time.perf_counter() - start
+
+    skipped = sum(
+        1 for m in messages
+        if m.channel.id in cog.skip_channel_ids or not m.content
+        or not cog.scam_detector.might_match(m.content)
+    )
+    print(f"messages: {MESSAGE_COUNT}, rejected by pre-filter: {skipped} ({skipped / MESSAGE_COUNT:.0%})")
+    print(f"old substring checks: {legacy / MESSAGE_COUNT * 1e6:.2f} us/msg (no normalization, no duplicate detection)")
+    print(f"on_message:           {current / MESSAGE_COUNT * 1e6:.2f} us/msg (incl. coroutine overhead)")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,64 @@
+import random
+import string
+import timeit
+
+from commands.mod.aho_corasick import AhoCorasick, compile_patterns
+from const import BLOCKED_WORDS
+
+# Micro-benchmark: Aho-Corasick automaton and compile_patterns() (what Events uses)
+# vs the `any(word in content ...)` loop Events.on_message used before. Run from the repo root:
+#   python -m tests.bench_scam_matcher
+
+MESSAGE_COUNT = 2000
+PATTERN_COUNTS = [10, 100, 1000]
+
+
+def _random_word(rng, low=4, high=14):
+    return "".join(rng.choice(string.ascii_lowercase + string.digits + "./$!") for _ in range(rng.randint(low, high)))
+
+
+def _patterns(rng, count):
+    patterns = list(BLOCKED_WORDS)
+    while len(patterns) < count:
+        patterns.append(_random_word(rng, 6, 24))
+    return patterns[:count]
+
+
+def _messages(rng, patterns):
+    messages = []
+    for i in range(MESSAGE_COUNT):
+        words = [_random_word(rng, 1, 9) for _ in range(rng.randint(1, 40))]
+        if i % 50 == 0:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(patterns))
+        messages.append(" ".join(words))
+    return messages
+
+
+def run():
+    rng = random.Random(1234)
+    print(f"{'patterns':>8} | {'loop us/msg':>12} | {'automaton us/msg':>16} | {'compiled us/msg':>15} | {'speedup':>7}")
+
+    for count in PATTERN_COUNTS:
+        patterns = _patterns(rng, count)
+        messages = _messages(rng, patterns)
+        matcher = AhoCorasick(patterns)
+        compiled = compile_patterns(patterns)
+
+        # Both approaches must agree before timing them
+        for m in messages:
+            expected = any(p in m for p in patterns)
+            assert (matcher.search(m) is not None) == expected
+            assert (compiled.search(m) is not None) == expected
+
+        loop = min(timeit.repeat(lambda: [any(p in m for p in patterns) for m in messages], number=1, repeat=5))
+        automaton = min(timeit.repeat(lambda: [matcher.search(m) for m in messages], number=1, repeat=5))
+        best = min(timeit.repeat(lambda: [compiled.search(m) for m in messages], number=1, repeat=5))
+
+        loop_us = loop / MESSAGE_COUNT * 1e6
+        automaton_us = automaton / MESSAGE_COUNT * 1e6
+        best_us = best / MESSAGE_COUNT * 1e6
+        print(f"{count:>8} | {loop_us:>12.2f} | {automaton_us:>16.2f} | {best_us:>15.2f} | {loop_us / best_us:>6.1f}x")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,21 @@
+import os
+import tempfile
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+async def db_pool():
+    """database.py pool on a fresh local SQLite file (libsql_client supports file: URLs)."""
+    db_path = os.path.join(tempfile.mkdtemp(), "test.db")
+    pool = await database.init_db_pool(f"file:{db_path}", size=1)
+    # init_system_tables() warms the global leaderboard index from this database
+    index_ready = database.LEADERBOARD_INDEX.ready
+    try:
+        yield pool
+    finally:
+        database.LEADERBOARD_INDEX.ready = index_ready
+        await database.close_db_pool()
+        os.remove(db_path)
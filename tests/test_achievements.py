@@ -0,0 +1,93 @@
+import datetime
+from unittest import mock
+
+import database
+from commands.rocket.achievements import apply_match, new_state, check_achievements, backfill_achievement_state
+from commands.rocket.achievements_config import ACHIEVEMENTS, ACHIEVEMENT_BITS
+
+# Local-time timestamps, like the rules themselves
+SATURDAY = int(datetime.datetime(2026, 10, 17, 18, 0).timestamp())
+MONDAY = int(datetime.datetime(2026, 10, 19, 18, 0).timestamp())
+
+
+def _unlocked(state):
+    return {a for a, bit in ACHIEVEMENT_BITS.items() if state['unlocked'] >> bit & 1}
+
+
+def test_streaks_and_first_match():
+    state = new_state()
+    assert apply_match(state, False, 1, MONDAY) == ["rookie", "humble"]
+    apply_match(state, False, 1, MONDAY + 1)
+    apply_match(state, False, 1, MONDAY + 2)
+    assert apply_match(state, True, 1, MONDAY + 3) == ["breakthrough"]
+    assert apply_match(state, True, 1, MONDAY + 4) == ["warmup"]
+    assert apply_match(state, True, 1, MONDAY + 5) == ["heating_up"]
+    assert state['win_streak'] == 3 and state['loss_streak'] == 0
+
+
+def test_weekend_count_is_not_capped_by_history():
+    state = new_state()
+    for i in range(4):
+        apply_match(state, True, 1, SATURDAY + i)
+    for i in range(60):
+        apply_match(state, True, 1, MONDAY + i)
+    assert "weekend_warrior" not in _unlocked(state)
+    assert "weekend_warrior" in apply_match(state, False, 1, SATURDAY + 7 * 86400)
+
+
+def test_daily_counters_reset_per_day():
+    state = new_state()
+    apply_match(state, True, 1, MONDAY)
+    apply_match(state, True, 2, MONDAY + 1)
+    assert "versatile" not in apply_match(state, True, 3, MONDAY + 86400)
+    assert state['daily_count'] == 1
+    assert "versatile" in apply_match(state, True, 1, MONDAY + 86401) + apply_match(state, True, 2, MONDAY + 86402)
+
+
+async def test_backfill_then_incremental_updates(db_pool):
+    await database.init_system_tables()
+    for i in range(9):
+        await database.settle_match(SATURDAY + i, 1, 100, 'Blue', 1, 0, '1:0',
+                                    [{'user_id': 1, 'team': 'Blue', 'result': 'WIN'}])
+    await database.add_user_achievement(1, "rookie")
+    # Games from before match history existed are only in Leaderboard
+    for _ in range(3):
+        await database.update_match_history(3, 1, True)
+    await database.update_match_history(3, 2, False)
+
+    await backfill_achievement_state()
+    state = await database.get_achievement_state(1)
+    assert state['games'] == 9 and state['win_streak'] == 9 and state['weekend_count'] == 9
+    legacy = await database.get_achievement_state(3)
+    assert legacy['games'] == 4 and legacy['wins_1'] == 3 and legacy['win_streak'] == 0
+
+    await database.settle_match(SATURDAY + 9, 1, 100, 'Blue', 1, 0, '1:0',
+                                [{'user_id': 1, 'team': 'Blue', 'result': 'WIN'}])
+    unlocked = await check_achievements(1, {'result': 'WIN', 'timestamp': SATURDAY + 9, 'game_mode': 1})
+    names = {a['name'] for a in unlocked}
+    # Everything reachable is granted now, except what the user already had
+    assert "🐣 Debiutant" not in names
+    assert {"🚀 Nie do zatrzymania", "🐺 Samotny Wilk", "🧟 No-Life", "📅 Weekendowy Wojownik"} <= names
+    assert await check_achievements(2, {'result': 'LOSS', 'timestamp': MONDAY, 'game_mode': 2})
+
+    granted = {row[0] for row in await database.get_user_achievements(1)}
+    assert {"unstoppable", "lone_wolf", "rookie"} <= granted
+
+
+async def test_counters_rebuilt_after_failed_save(db_pool):
+    await database.init_system_tables()
+    win = [{'user_id': 1, 'team': 'Blue', 'result': 'WIN'}]
+    for i in range(3):
+        await database.settle_match(MONDAY + i, 1, 100, 'Blue', 1, 0, '1:0', win)
+        match = {'result': 'WIN', 'timestamp': MONDAY + i, 'game_mode': 1}
+        if i == 1:
+            with mock.patch("commands.rocket.achievements.save_achievement_state", mock.AsyncMock(return_value=False)):
+                assert await check_achievements(1, match) == []
+            assert (await database.get_achievement_state(1))['games'] == 1
+        else:
+            unlocked = await check_achievements(1, match)
+
+    # The lost match is counted again from history, and the streak it started is kept
+    state = await database.get_achievement_state(1)
+    assert state['games'] == 3 and state['wins_1'] == 3 and state['win_streak'] == 3
+    assert ACHIEVEMENTS["heating_up"] in unlocked
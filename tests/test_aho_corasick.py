@@ -0,0 +1,40 @@
+import random
+
+from commands.mod.aho_corasick import AhoCorasick, SubstringMatcher, compile_patterns, AUTOMATON_MIN_PATTERNS
+
+
+def _naive_find_all(patterns, text):
+    found = []
+    for p in set(patterns):
+        start = text.find(p)
+        while start != -1:
+            found.append((start + len(p) - 1, p))
+            start = text.find(p, start + 1)
+    return sorted(found)
+
+
+def test_find_all_matches_naive_search():
+    rng = random.Random(42)
+    alphabet = "ab$!."
+    for _ in range(200):
+        patterns = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))) for _ in range(rng.randint(1, 15))]
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        automaton = AhoCorasick(patterns)
+
+        assert sorted(automaton.find_all(text)) == _naive_find_all(patterns, text)
+        assert (automaton.search(text) is not None) == any(p in text for p in patterns)
+        assert automaton.matches(text) == SubstringMatcher(patterns).matches(text) == {p for p in patterns if p in text}
+
+
+def test_overlapping_and_unicode_patterns():
+    automaton = AhoCorasick(["he", "she", "his", "hers", "łódź"])
+    assert sorted(p for _, p in automaton.find_all("ushers")) == ["he", "hers", "she"]
+    assert automaton.search("witaj w łodzi") is None
+    assert automaton.search("witaj w łódź") == "łódź"
+    assert AhoCorasick([]).search("anything") is None
+
+
+def test_compile_patterns_picks_backend():
+    assert isinstance(compile_patterns(["a", "b"]), SubstringMatcher)
+    many = [f"word{i}" for i in range(AUTOMATON_MIN_PATTERNS)]
+    assert isinstance(compile_patterns(many), AhoCorasick)
@@ -0,0 +1,18 @@
+from cache import TTLCache, MISSING
+
+
+def test_set_after_invalidation_is_dropped():
+    cache = TTLCache(2, 60)
+    generation = cache.generation("a")
+    cache.invalidate("a")  # e.g. a settlement while the read was in flight
+    cache.set("a", "stale", generation)
+    assert cache.get("a") is MISSING
+
+    generation = cache.generation("a")
+    cache.set("a", "fresh", generation)
+    assert cache.get("a") == "fresh"
+
+    generation = cache.generation("b")
+    cache.clear()
+    cache.set("b", "stale", generation)
+    assert cache.get("b") is MISSING
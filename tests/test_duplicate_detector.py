@@ -0,0 +1,50 @@
+from commands.mod.duplicate_detector import DuplicateDetector, simhash
+
+SCAM = "Hey, I'm leaving CS2, giving away my skins here{}: https://steam-trade.example/offer/a1"
+
+
+def test_flags_wave_from_distinct_users():
+    detector = DuplicateDetector(min_users=3, window=60)
+
+    assert detector.observe(1, SCAM.format(""), "m1", now=0) == []
+    assert detector.observe(1, SCAM.format(","), "m1b", now=1) == []  # same user again
+    assert detector.observe(2, SCAM.format(""), "m2", now=2) == []
+    assert sorted(detector.observe(3, SCAM.format("..."), "m3", now=3)) == ["m1b", "m2", "m3"]
+    assert detector.observe(4, SCAM.format(""), "m4", now=4) == ["m4"]
+
+
+def test_different_links_on_one_host_are_not_duplicates():
+    detector = DuplicateDetector(min_users=3, window=60)
+    for uid, replay in enumerate(["3f1c2a", "9b8e7d", "5a4b3c", "0d9e8f"]):
+        text = f"here is my replay https://ballchasing.com/replay/{replay}-4e21-bd0c-77aa"
+        assert detector.observe(uid, text, uid, now=uid) == []
+    for uid, clip in enumerate(["dQw4w9WgXcQ", "9bZkp7q19f0", "kJQP7kiw5Fk", "RgKAFK5djSk"]):
+        assert detector.observe(uid, f"zobaczcie moj gol z meczu https://youtu.be/{clip}", uid, now=10) == []
+
+
+def test_window_and_filters():
+    detector = DuplicateDetector(min_users=3, window=60)
+
+    assert detector.observe(1, SCAM.format("x"), "m1", now=0) == []
+    assert detector.observe(2, SCAM.format("y"), "m2", now=100) == []
+    assert detector.observe(3, SCAM.format("z"), "m3", now=110) == []  # m1 is outside the window
+
+    # Same text without a link, or too short, is ignored
+    for uid in range(10):
+        assert detector.observe(uid, "gg wp wszystkim, dobry mecz", uid, now=200) == []
+        assert detector.observe(uid, "https://x.com", uid, now=200) == []
+
+
+def test_memory_is_bounded():
+    detector = DuplicateDetector(min_users=3, window=60, max_clusters=50)
+    for i in range(1000):
+        detector.observe(i, f"unique message number {i} {i * 7919} https://site{i}.example", now=i / 100)
+    assert len(detector) <= 50
+    assert len(detector._bands) <= 50 * 4
+
+
+def test_simhash_is_stable_for_near_duplicates():
+    a = simhash("free nitro for everyone click the link now quick".split())
+    b = simhash("free nitro for everyone click the link now quickly".split())
+    c = simhash("kto gra 2v2 o pięćset na kanale meczowym dzisiaj wieczorem".split())
+    assert (a ^ b).bit_count() < (a ^ c).bit_count()
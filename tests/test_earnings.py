@@ -0,0 +1,30 @@
+import database
+
+
+async def test_earnings_stay_consistent(db_pool):
+    await database.init_system_tables()
+
+    blue_wins = [
+        {'user_id': 1, 'team': 'Blue', 'result': 'WIN'},
+        {'user_id': 2, 'team': 'Orange', 'result': 'LOSS'},
+    ]
+    orange_wins = [
+        {'user_id': 1, 'team': 'Blue', 'result': 'LOSS'},
+        {'user_id': 2, 'team': 'Orange', 'result': 'WIN'},
+    ]
+    await database.settle_match(1, 1, 500, 'Blue', 1, 0, '3:1', blue_wins)
+    await database.settle_match(2, 1, 200, 'Orange', 0, 1, '0:2', orange_wins)
+    await database.save_match_record(3, 2, 300, 'Blue', 1, 0, '1:0', blue_wins)
+
+    data = await database.get_leaderboard_data(1)
+    assert [tuple(r) for r in data['earnings']] == [('1', 300)]
+    assert await database.check_earnings_consistency() == []
+
+    # Simulate drift, then repair it from history
+    async with database.get_pool().acquire() as client:
+        await client.execute("UPDATE Earnings SET net = 0 WHERE user_id = '2' AND game_mode = 2")
+    drift = await database.check_earnings_consistency()
+    assert [tuple(r) for r in drift] == [('2', 2, -300, 0)]
+
+    await database.rebuild_earnings()
+    assert await database.check_earnings_consistency() == []
@@ -0,0 +1,56 @@
+import random
+from unittest import mock
+
+import database
+from leaderboard_index import LeaderboardIndex, RankedLeaderboard
+
+
+def _sql_order(stats):
+    # Same ordering as the Leaderboard SQL: wins DESC, score DESC (user_id breaks remaining ties)
+    rows = [(uid, w, l, w * 3 - l) for uid, (w, l) in stats.items() if w > 0]
+    return sorted(rows, key=lambda r: (-r[1], -r[3], r[0]))
+
+
+def test_ranking_matches_sql_order():
+    rng = random.Random(7)
+    ranking = RankedLeaderboard()
+    ranking.load([("0", 0, 3), ("1", 2, 1)])
+    stats = {"0": (0, 3), "1": (2, 1)}
+
+    for _ in range(500):
+        uid = str(rng.randrange(30))
+        is_win = rng.random() < 0.5
+        ranking.record_result(uid, is_win)
+        w, l = stats.get(uid, (0, 0))
+        stats[uid] = (w + 1, l) if is_win else (w, l + 1)
+
+    expected = _sql_order(stats)
+    assert ranking.top() == expected
+    assert ranking.top(3) == expected[:3]
+
+    for position, row in enumerate(expected, 1):
+        assert ranking.rank(row[0]) == position
+
+    max_wins = expected[0][1]
+    assert ranking.tie_group(max_wins) == [r for r in expected if r[1] == max_wins]
+
+
+def test_players_without_wins_are_unranked():
+    ranking = RankedLeaderboard()
+    ranking.record_result("5", False)
+    assert ranking.rank("5") is None
+    assert ranking.top() == []
+
+    ranking.record_result("5", True)
+    assert ranking.rank("5") == 1
+    assert ranking.top() == [("5", 1, 1, 2)]
+
+
+async def test_empty_warmed_index_is_used_without_sql():
+    index = LeaderboardIndex()
+    index.ready = True  # warmed, but nobody has played yet
+    with mock.patch("database.LEADERBOARD_INDEX", index), \
+            mock.patch("database.get_pool", side_effect=AssertionError("queried the database")):
+        assert await database.get_all_winners(1) == []
+        assert await database.get_user_rank(1, 1) is None
+        assert await database.get_winners_tie_group(1, 1) == []
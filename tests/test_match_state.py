@@ -0,0 +1,128 @@
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from commands.rocket.match import MatchView, MatchType
+from commands.rocket.match_result_view import ResultView
+from commands.rocket.match_state import MatchState
+
+
+class FakeResponse:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, content, **kwargs):
+        self.messages.append(content)
+
+    async def defer(self, **kwargs):
+        pass
+
+
+def _user(user_id):
+    return SimpleNamespace(id=user_id, mention=f"<@{user_id}>", name=str(user_id), display_name=str(user_id))
+
+
+def _interaction(user):
+    response = FakeResponse()
+    return SimpleNamespace(user=user, response=response, followup=SimpleNamespace(send=response.send_message))
+
+
+async def test_join_burst_does_not_overfill_or_double_charge():
+    charged = []
+
+    async def slow_take_bet(player, stake, key):
+        await asyncio.sleep(0.01)
+        charged.append(key)
+        return True
+
+    async def balance(user_id, max_age=None):
+        await asyncio.sleep(0.01)
+        return 10_000
+
+    view = MatchView(100, MatchType.ONE_GAME, _user(1), team_size=1)
+    with mock.patch("commands.rocket.match.take_bet", slow_take_bet), \
+            mock.patch("commands.rocket.match.get_user_balance", balance), \
+            mock.patch.object(MatchView, "save", mock.AsyncMock()), \
+            mock.patch.object(MatchView, "start_match", mock.AsyncMock()) as start_match:
+        twice = _user(2)
+        interactions = [_interaction(twice), _interaction(twice), _interaction(_user(3)), _interaction(_user(4))]
+        await asyncio.gather(*(view._handle_join(i, "orange") for i in interactions))
+
+    assert [p.id for p in view.orange_team] == [2]
+    assert len(charged) == 1
+    assert view.state is MatchState.FULL
+    start_match.assert_awaited_once()
+    assert sorted(i.response.messages[0] for i in interactions[1:]) == ["Już jesteś w meczu!",
+                                                                         "Ta drużyna jest już pełna!",
+                                                                         "Ta drużyna jest już pełna!"]
+
+
+async def test_full_lobby_starts_even_if_the_reply_fails():
+    view = MatchView(100, MatchType.ONE_GAME, _user(1), team_size=1)
+    interaction = _interaction(_user(2))
+    interaction.followup = SimpleNamespace(send=mock.AsyncMock(side_effect=RuntimeError("interaction expired")))
+    with mock.patch("commands.rocket.match.take_bet", mock.AsyncMock(return_value=True)), \
+            mock.patch("commands.rocket.match.get_user_balance", mock.AsyncMock(return_value=10_000)), \
+            mock.patch.object(MatchView, "save", mock.AsyncMock()), \
+            mock.patch.object(MatchView, "start_match", mock.AsyncMock()) as start_match:
+        with pytest.raises(RuntimeError):
+            await view._handle_join(interaction, "orange")
+
+    start_match.assert_awaited_once()
+
+
+async def test_concurrent_reports_settle_once():
+    view = ResultView([_user(1)], [_user(2)], 100, 1, "One game", "key")
+    outcomes = await asyncio.gather(view.submit_report("Blue", "3:1"), view.submit_report("Orange", "3:1"))
+    assert sorted(o[0] for o in outcomes) == ["agreed", "waiting"]
+    assert view.state is MatchState.SETTLED
+    assert await view.submit_report("Blue", "1:3") is None
+    assert not await view.begin_settlement()
+
+
+async def test_conflict_clears_reports():
+    view = ResultView([_user(1)], [_user(2)], 100, 1, "One game", "key")
+    assert (await view.submit_report("Blue", "3:1"))[0] == "waiting"
+    assert view.state is MatchState.REPORTED
+    assert await view.submit_report("Orange", "1:3") == ("conflict", "3:1", "1:3")
+    assert view.state is MatchState.STARTED and view.blue_report is None
+
+
+async def test_failed_settlement_pays_nothing_and_reopens():
+    view = ResultView([_user(1)], [_user(2)], 100, 1, "One game", "key")
+    assert await view.begin_settlement()
+    channel = mock.Mock(send=mock.AsyncMock(return_value=SimpleNamespace(id=5)), mention="#mecz")
+    interaction = SimpleNamespace(channel=channel, guild=mock.Mock(get_channel=mock.Mock(return_value=None)))
+
+    with mock.patch("commands.rocket.match_result_view.settle_match", mock.AsyncMock(return_value=-1)), \
+            mock.patch("commands.rocket.match_result_view.delete_open_match", mock.AsyncMock()) as delete, \
+            mock.patch("commands.rocket.match_result_view.PAYOUTS") as payouts, \
+            mock.patch.object(ResultView, "save", mock.AsyncMock()):
+        await view._handle_win(interaction, "blue", "3:1", [(3, 1)], 1, 0)
+
+    payouts.submit.assert_not_called()
+    delete.assert_not_awaited()
+    assert view.state is MatchState.STARTED and view.admin_message_id == 5
+
+
+async def test_winner_is_paid_even_if_lookups_fail():
+    view = ResultView([_user(1)], [_user(2)], 100, 1, "One game", "key")
+    assert await view.begin_settlement()
+    channel = mock.Mock(send=mock.AsyncMock(), edit=mock.AsyncMock())
+    interaction = SimpleNamespace(channel=channel, guild=mock.Mock(get_channel=mock.Mock(return_value=None)))
+
+    with mock.patch("commands.rocket.match_result_view.settle_match", mock.AsyncMock(return_value=1)), \
+            mock.patch("commands.rocket.match_result_view.delete_open_match", mock.AsyncMock()), \
+            mock.patch("commands.rocket.match_result_view.get_bonus_count", mock.AsyncMock(return_value=50)), \
+            mock.patch("commands.rocket.match_result_view.update_leader_role", mock.AsyncMock()), \
+            mock.patch("commands.rocket.match.get_user_balance", mock.AsyncMock(side_effect=RuntimeError)), \
+            mock.patch("commands.rocket.match_result_view.PAYOUTS") as payouts, \
+            mock.patch("commands.rocket.match_result_view.asyncio.sleep", mock.AsyncMock()), \
+            mock.patch.object(ResultView, "save", mock.AsyncMock()):
+        payouts.submit = mock.AsyncMock(return_value=True)
+        await view._handle_win(interaction, "blue", "3:1", [(3, 1)], 1, 0)
+
+    payouts.submit.assert_awaited_once()
+    assert not any("Nie udało się wypłacić" in call.args[0] for call in channel.send.await_args_list)
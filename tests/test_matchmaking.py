@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import discord
+
+from commands.rocket.match import MatchView, MatchType
+from commands.rocket.matchmaking import MatchmakingQueue, QueueEntry, MATCHMAKING_WIDEN_SECONDS, _split_teams
+
+
+def _entry(user_id, stake=500, team_size=1, rank="GC1", at=0.0, match_type=MatchType.BO3):
+    return QueueEntry(SimpleNamespace(id=user_id), stake, team_size, match_type, rank, enqueued_at=at)
+
+
+def test_pairs_compatible_players_oldest_first():
+    queue = MatchmakingQueue()
+    queue.enqueue(_entry(1, rank="GC1", at=0))
+    queue.enqueue(_entry(2, rank="SSL", at=1))  # not compatible with GC1
+    queue.enqueue(_entry(3, rank="GC2", at=2))
+    queue.enqueue(_entry(4, rank="GC2", at=3))
+    assert not queue.enqueue(_entry(1, at=5))
+
+    groups = queue.find_matches(now=10)
+    assert [[e.user.id for e in g] for g in groups] == [[1, 3]]
+    assert 2 in queue and 4 in queue and 1 not in queue
+
+
+def test_separates_team_size_type_and_stake_band_until_widened():
+    queue = MatchmakingQueue()
+    queue.enqueue(_entry(1, stake=500, at=0))
+    queue.enqueue(_entry(2, stake=1000, at=1))
+    queue.enqueue(_entry(3, stake=500, team_size=2, at=2))
+    queue.enqueue(_entry(4, stake=500, match_type=MatchType.ONE_GAME, at=3))
+    assert queue.find_matches(now=10) == []
+
+    groups = queue.find_matches(now=MATCHMAKING_WIDEN_SECONDS + 1)
+    assert [[e.user.id for e in g] for g in groups] == [[1, 2]]
+
+
+def test_group_ranks_compatible_with_each_other():
+    queue = MatchmakingQueue()
+    queue.enqueue(_entry(1, team_size=2, rank="GC2", at=0))
+    queue.enqueue(_entry(2, team_size=2, rank="GC1", at=1))
+    queue.enqueue(_entry(3, team_size=2, rank="GC3", at=2))
+    queue.enqueue(_entry(4, team_size=2, rank="GC3", at=3))
+    # Everyone fits the GC2 anchor, but GC1 can't play with GC3
+    assert queue.find_matches(now=10) == []
+
+    queue.enqueue(_entry(5, team_size=2, rank="GC3", at=4))
+    groups = queue.find_matches(now=10)
+    assert [sorted(e.user.id for e in g) for g in groups] == [[1, 3, 4, 5]]
+    assert 2 in queue
+
+
+def test_full_teams_and_leave():
+    queue = MatchmakingQueue()
+    for uid in range(1, 7):
+        queue.enqueue(_entry(uid, team_size=3, rank="GC2", at=uid))
+    queue.leave(6)
+    assert queue.find_matches(now=10) == []
+
+    queue.enqueue(_entry(7, team_size=3, rank="GC3", at=7))
+    groups = queue.find_matches(now=10)
+    assert len(groups) == 1 and len(queue) == 0
+
+    blue, orange = _split_teams(groups[0])
+    assert len(blue) == len(orange) == 3
+    assert blue[0].rank == "GC3"
+
+
+async def test_start_match_refunds_group_on_failure():
+    queue = MatchmakingQueue()
+    group = [_entry(1, at=0), _entry(2, at=1)]
+    for entry in group:
+        entry.user.send = mock.AsyncMock()
+    channel = mock.Mock(send=mock.AsyncMock(side_effect=discord.HTTPException(mock.Mock(status=500), "boom")))
+    queue._bot = mock.Mock(get_channel=mock.Mock(return_value=channel))
+
+    with mock.patch.object(MatchView, "_validate_user_balance", mock.AsyncMock(side_effect=[True, False])), \
+            mock.patch.object(MatchView, "_take_stake", mock.AsyncMock(return_value=True)) as take, \
+            mock.patch.object(MatchView, "_refund_stake", mock.AsyncMock(return_value=True)) as refund:
+        # Player 2 can no longer afford it: not charged, player 1 refunded and requeued
+        await queue._start_match(group)
+        assert take.await_count == 1 and refund.await_count == 1
+        assert 1 in queue and 2 not in queue
+
+    queue.leave(1)
+    with mock.patch.object(MatchView, "_validate_user_balance", mock.AsyncMock(return_value=True)), \
+            mock.patch.object(MatchView, "_take_stake", mock.AsyncMock(return_value=True)), \
+            mock.patch.object(MatchView, "_refund_stake", mock.AsyncMock(return_value=True)) as refund, \
+            mock.patch("commands.rocket.matchmaking.delete_open_match", mock.AsyncMock()):
+        # Everyone charged, then posting the match fails: everyone refunded
+        await queue._start_match(group)
+        assert refund.await_count == 2
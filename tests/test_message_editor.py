@@ -0,0 +1,61 @@
+import asyncio
+
+import discord
+
+from commands.rocket.message_editor import DebouncedEditor
+
+
+class FakeMessage:
+    id = 1
+
+    def __init__(self):
+        self.edits = []
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(0.01)
+        self.edits.append(kwargs['embed'].title)
+
+
+async def test_burst_is_coalesced_into_latest_state():
+    state = {'title': 'a'}
+    editor = DebouncedEditor(lambda: {'embed': discord.Embed(title=state['title'])}, delay=0.02)
+    editor.message = FakeMessage()
+    editor.mark_sent(embed=discord.Embed(title='a'))
+
+    for title in 'bcd':
+        state['title'] = title
+        editor.request()
+    await asyncio.sleep(0.1)
+    assert editor.message.edits == ['d']
+
+    # Unchanged render -> no edit
+    editor.request()
+    await asyncio.sleep(0.1)
+    assert editor.message.edits == ['d']
+
+
+async def test_change_during_edit_gets_another_round():
+    state = {'title': 'b'}
+    editor = DebouncedEditor(lambda: {'embed': discord.Embed(title=state['title'])}, delay=0.02)
+    editor.message = FakeMessage()
+    editor.request()
+    await asyncio.sleep(0.025)  # edit of 'b' in flight
+    state['title'] = 'c'
+    editor.request()
+    await asyncio.sleep(0.1)
+    assert editor.message.edits == ['b', 'c']
+
+
+async def test_flush_and_cancel():
+    state = {'title': 'b'}
+    editor = DebouncedEditor(lambda: {'embed': discord.Embed(title=state['title'])}, delay=10)
+    editor.message = FakeMessage()
+    editor.request()
+    await editor.flush()
+    assert editor.message.edits == ['b']
+
+    state['title'] = 'c'
+    editor.request()
+    editor.cancel()
+    await asyncio.sleep(0.05)
+    assert editor.message.edits == ['b']
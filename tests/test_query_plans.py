@@ -0,0 +1,86 @@
+import database
+
+# Runs the real read functions from database.py against a local SQLite file
+# (libsql_client supports file: URLs), records every SELECT they issue and
+# checks with EXPLAIN QUERY PLAN that none of them falls back to a full scan.
+
+
+class RecordingClient:
+    def __init__(self, client, recorded):
+        self.client = client
+        self.recorded = recorded
+
+    async def execute(self, query, params=None):
+        if query.lstrip().upper().startswith("SELECT"):
+            self.recorded.append((query, params))
+        return await self.client.execute(query, params)
+
+    async def batch(self, statements):
+        return await self.client.batch(statements)
+
+    async def close(self):
+        await self.client.close()
+
+    @property
+    def closed(self):
+        return self.client.closed
+
+
+def _full_scans(plan_rows):
+    # Row format: id, parent, notused, detail
+    # "SCAN <table>" (with or without an index) visits every row; "SEARCH" does not.
+    return [r[3] for r in plan_rows if r[3].startswith("SCAN") and "CONSTANT ROW" not in r[3]]
+
+
+async def _seed(pool):
+    participants = [
+        {'user_id': 1, 'team': 'Blue', 'result': 'WIN', 'goals_scored': 3, 'goals_conceded': 1},
+        {'user_id': 2, 'team': 'Orange', 'result': 'LOSS', 'goals_scored': 1, 'goals_conceded': 3},
+    ]
+    for i in range(20):
+        await database.settle_match(1000 + i, (i % 3) + 1, 200, 'Blue', 1, 0, '3:1', participants)
+    await database.add_user_achievement(1, "rookie")
+    await database.update_role_holders(1, [1])
+
+
+async def test_hot_queries_use_indexes(db_pool):
+    pool = db_pool
+    recorded = []
+
+    original_create = pool._create_client
+    pool._create_client = lambda: RecordingClient(original_create(), recorded)
+    # Replace the client created by start() with a recording one
+    await (await pool._idle.get()).close()
+    pool._idle.put_nowait(pool._create_client())
+
+    index_ready = database.LEADERBOARD_INDEX.ready
+    try:
+        await database.init_system_tables()
+        await _seed(pool)
+
+        # Exercise the SQL fallbacks rather than the in-memory ranking
+        database.LEADERBOARD_INDEX.ready = False
+        recorded.clear()
+        await database.get_user_matches_history(1, limit=10)
+        await database.get_match_participants(1)
+        await database.get_user_leaderboard_stats(1)
+        await database.get_user_achievements(1)
+        await database.get_role_holders(1)
+        await database.get_bonus_count()
+        for team_size in [1, 2, 3]:
+            await database.get_leaderboard_data(team_size)
+            await database.get_all_winners(team_size)
+
+        assert recorded, "No queries were recorded"
+
+        failures = []
+        async with pool.acquire() as client:
+            for query, params in recorded:
+                res = await client.execute(f"EXPLAIN QUERY PLAN {query}", params)
+                scans = _full_scans(res.rows)
+                if scans:
+                    failures.append(f"{' '.join(query.split())[:80]}... -> {scans}")
+
+        assert not failures, "Full table scans found:\n" + "\n".join(failures)
+    finally:
+        database.LEADERBOARD_INDEX.ready = index_ready
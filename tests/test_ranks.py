@@ -0,0 +1,16 @@
+from commands.rocket.ranks import RANK_ROLES, GC_RANKS, ranks_compatible, eligible_ranks
+
+
+def _old_validate(required_role, user_rank):
+    # Rule MatchView._validate_user_rank used before the bitmask matrix
+    if required_role in GC_RANKS:
+        return user_rank in GC_RANKS[required_role]
+    return user_rank == required_role
+
+
+def test_matrix_matches_old_rule():
+    ranks = [*RANK_ROLES, None]
+    for required in ranks:
+        for user_rank in ranks:
+            assert ranks_compatible(required, user_rank) == _old_validate(required, user_rank), (required, user_rank)
+        assert eligible_ranks(required) == [r for r in ranks if _old_validate(required, r)]
@@ -0,0 +1,64 @@
+from commands.mod.auto_reply import AutoReplyCooldowns
+from commands.mod.scam_detection import ScamDetector, normalize, edit_distance
+from const import BLOCKED_WORDS
+
+
+def test_normalize_folds_obfuscation():
+    assert normalize("ＳＴＥＡＭ") == "steam"  # fullwidth
+    assert normalize("ѕtеаm") == "steam"  # Cyrillic homoglyphs
+    assert normalize("st​eam") == "steam"  # zero-width space
+    assert normalize("m4lol4tami") == normalize("malolatami")
+    assert normalize("gift 50$") == normalize("GIFT 5O$")
+
+
+def test_edit_distance_is_bounded():
+    assert edit_distance("steamcommunity", "sterncommunity", 3) == 2
+    assert edit_distance("kitten", "sitting", 5) == 3
+    assert edit_distance("a" * 5, "b" * 30, 3) == 4
+
+
+def test_detector_catches_variants_and_lookalikes():
+    detector = ScamDetector(BLOCKED_WORDS)
+
+    for text in [
+        "free skins steamcommunity.com/gift/123",
+        "ЅТЕАМCOMMUNITY.COM/GIFT",
+        "50$ g​ift for you",
+        "M4L0L4TAMI",
+        "claim at steamecomnmunity.com/xyz",
+        "sterncommunity",
+        "https://steamcommunity.ru/login",
+        "discorcl.com/nitro",
+        "https://steamcommunity.com.trade-offer.ru/gift",
+        "https://login.stearncommunity.com/",
+    ]:
+        assert detector.check(text), text
+
+    for text in [
+        "gramy 2v2?",
+        "mój profil: https://steamcommunity.com/id/edek",
+        "https://www.steamcommunity.com/",
+        "https://go.steampowered.com",
+        "https://m.steamcommunity.com/id/x",
+        "discord.gg/abc jest na kanale",
+        "discords i steam",
+        "ustawienia edka",
+    ]:
+        assert detector.check(text) is None, text
+
+
+def test_scan_finds_scams_and_triggers_in_one_pass():
+    trigger = {'pattern': 'ustawienia', 'reply': 'link', 'cooldown': 60, 'user_cooldown': 300, 'channels': []}
+    detector = ScamDetector(BLOCKED_WORDS, triggers=[trigger])
+
+    assert detector.scan("jakie masz UST4WIENIA?") == (None, [trigger])
+    scam, triggers = detector.scan("ustawienia tutaj: steamcommunity.com/gift")
+    assert scam and triggers == [trigger]
+    assert detector.check("ustawienia") is None
+
+    cooldowns = AutoReplyCooldowns([trigger])
+    assert cooldowns.take(trigger, channel_id=1, user_id=10, now=0)
+    assert not cooldowns.take(trigger, channel_id=1, user_id=11, now=30)  # channel cooldown
+    assert not cooldowns.take(trigger, channel_id=2, user_id=10, now=90)  # user cooldown
+    assert cooldowns.take(trigger, channel_id=2, user_id=11, now=90)
+    assert cooldowns.take(trigger, channel_id=1, user_id=12, now=100)